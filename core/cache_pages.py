@@ -0,0 +1,81 @@
+"""
+Cache partagé (Redis) des pages et des données coûteuses à recalculer.
+
+Les clés sont regroupées en espaces versionnés : ``cle_cache('cours', ...)``
+intègre la version courante de l'espace 'cours', et ``invalider_espace('cours')``
+l'incrémente, ce qui rend obsolètes d'un coup toutes les clés de l'espace sans
+avoir à les énumérer (elles expirent ensuite d'elles-mêmes). Les signaux de
+core/signals.py invalident les espaces à l'enregistrement des modèles.
+"""
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.views.decorators.cache import cache_page
+
+DUREE_VERSION = 30 * 24 * 3600
+
+
+def _parametre(nom, defaut):
+    return getattr(settings, nom, defaut)
+
+
+def _cle_version(espace):
+    return f"espace:{espace}"
+
+
+def version_espace(espace):
+    version = cache.get(_cle_version(espace))
+    if version is None:
+        version = 1
+        cache.add(_cle_version(espace), version, DUREE_VERSION)
+    return version
+
+
+def invalider_espace(*espaces):
+    for espace in espaces:
+        try:
+            cache.incr(_cle_version(espace))
+        except ValueError:
+            # Clé absente (expirée ou jamais lue) : toute nouvelle version convient
+            cache.set(_cle_version(espace), 2, DUREE_VERSION)
+
+
+def cle_cache(espaces, *parties):
+    """Clé dépendant des versions des espaces donnés (un nom ou une liste de noms)"""
+    if isinstance(espaces, str):
+        espaces = [espaces]
+    versions = ':'.join(f"{espace}.{version_espace(espace)}" for espace in espaces)
+    return ':'.join([versions, *map(str, parties)])
+
+
+def donnees_en_cache(espaces, parties, calculer, duree=None):
+    """Valeur en cache sous cle_cache(espaces, *parties), calculée au premier accès"""
+    cle = cle_cache(espaces, *parties)
+    valeur = cache.get(cle)
+    if valeur is None:
+        valeur = calculer()
+        cache.set(cle, valeur, duree or _parametre('CACHE_DUREE_DONNEES', 600))
+    return valeur
+
+
+def cache_page_anonyme(duree=None, espace='pages'):
+    """
+    cache_page réservé aux visiteurs non connectés (pages publiques) : un
+    utilisateur connecté voit toujours une page fraîche et personnalisée, et
+    une page portant un message flash n'est jamais mise en cache. À ne pas
+    utiliser sur une page contenant un formulaire ({% csrf_token %}) : le
+    jeton et le cookie CSRF d'un visiteur seraient servis aux suivants.
+    """
+    def decorateur(vue):
+        @wraps(vue)
+        def vue_cachee(request, *args, **kwargs):
+            if request.user.is_authenticated or len(get_messages(request)):
+                return vue(request, *args, **kwargs)
+            prefixe = cle_cache(espace)
+            return cache_page(
+                duree or _parametre('CACHE_DUREE_PAGES', 900), key_prefix=prefixe
+            )(vue)(request, *args, **kwargs)
+        return vue_cachee
+    return decorateur
@@ -0,0 +1,68 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from cours.models import Choice, Cours, CoursCoursEleves, EmploiDuTemps, Evaluation, Question, Quiz
+from cours.instantane_quiz import espace_quiz
+from cours.statistiques import espace_professeur
+from repetiteur_ia.models import SessionRevisionProgrammee
+
+from .cache_pages import invalider_espace
+
+@receiver(post_save, sender=Cours)
+@receiver(post_delete, sender=Cours)
+@receiver(post_save, sender=Quiz)
+@receiver(post_delete, sender=Quiz)
+def invalider_cache_cours(sender, instance, **kwargs):
+    """Listes de matières, cours récents et statistiques qui comptent cours et quiz"""
+    try:
+        invalider_espace('cours')
+    except Exception as e:
+        print(f"❌ Erreur invalidation cache cours: {e}")
+
+@receiver(post_save, sender=CoursCoursEleves)
+@receiver(post_delete, sender=CoursCoursEleves)
+@receiver(post_save, sender=EmploiDuTemps)
+@receiver(post_delete, sender=EmploiDuTemps)
+@receiver(post_save, sender=SessionRevisionProgrammee)
+@receiver(post_delete, sender=SessionRevisionProgrammee)
+def invalider_cache_eleve(sender, instance, **kwargs):
+    """Données d'accueil et de tableau de bord propres à un élève"""
+    try:
+        invalider_espace(f'eleve:{instance.eleve_id}')
+    except Exception as e:
+        print(f"❌ Erreur invalidation cache élève {instance.eleve_id}: {e}")
+
+@receiver(post_save, sender=CoursCoursEleves)
+@receiver(post_delete, sender=CoursCoursEleves)
+@receiver(post_save, sender=Evaluation)
+@receiver(post_delete, sender=Evaluation)
+def invalider_statistiques_cours(sender, instance, **kwargs):
+    """Statistiques par cours (listes de cours) et statistiques du professeur du cours"""
+    try:
+        espaces = ['statistiques_cours']
+        professeur_id = Cours.objects.filter(pk=instance.cours_id).values_list('professeur_id', flat=True).first()
+        if professeur_id:
+            espaces.append(espace_professeur(professeur_id))
+        invalider_espace(*espaces)
+    except Exception as e:
+        print(f"❌ Erreur invalidation statistiques du cours {instance.cours_id}: {e}")
+
+@receiver(post_save, sender=Quiz)
+@receiver(post_delete, sender=Quiz)
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+@receiver(post_save, sender=Choice)
+@receiver(post_delete, sender=Choice)
+def invalider_contenu_quiz(sender, instance, **kwargs):
+    """Instantané du quiz modifié (contenu affiché et grille de correction)"""
+    try:
+        if sender is Quiz:
+            quiz_id = instance.pk
+        elif sender is Question:
+            quiz_id = instance.quiz_id
+        else:
+            quiz_id = Question.objects.filter(pk=instance.question_id).values_list('quiz_id', flat=True).first()
+        if quiz_id:
+            invalider_espace(espace_quiz(quiz_id))
+    except Exception as e:
+        print(f"❌ Erreur invalidation du contenu du quiz: {e}")
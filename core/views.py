@@ -1,23 +1,34 @@
 from django.shortcuts import render
 
+from .cache_pages import cache_page_anonyme
+
+# Pages publiques : servies depuis le cache partagé pour les visiteurs non connectés
+
+@cache_page_anonyme()
 def index(request):
     return render(request, 'index.html')
 
+@cache_page_anonyme()
 def about(request):
     return render(request, 'about.html')
 
+@cache_page_anonyme()
 def features(request):
     return render(request, 'features.html')
 
+@cache_page_anonyme()
 def how_it_works(request):
     return render(request, 'how_it_works.html')
 
+@cache_page_anonyme()
 def pricing(request):
     return render(request, 'paiement/abonnements.html')
 
+@cache_page_anonyme()
 def tech(request):
     return render(request, 'tech.html')
 
+# Pas de cache : le formulaire porte un jeton CSRF propre à chaque visiteur
 def contact(request):
     return render(request, 'contact.html')
 
@@ -26,4 +37,3 @@ def login(request):
 
 def signup(request):
     return render(request, 'signup.html')
-
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Cours, CoursCoursEleves, EmploiDuTemps, Quiz, Evaluation, Question, Choice
+from .models import Cours, CoursCoursEleves, EmploiDuTemps, Quiz, Evaluation, Question, Choice, EleveStats, QuizStats
 
 class ChoiceInline(admin.TabularInline):
     model = Choice
@@ -45,3 +45,14 @@ class ChoiceAdmin(admin.ModelAdmin):
 class EvaluationAdmin(admin.ModelAdmin):
     list_display = ("cours", "eleve", "note", "date_creation")
 
+
+@admin.register(EleveStats)
+class EleveStatsAdmin(admin.ModelAdmin):
+    list_display = ("eleve", "quiz_termines", "score_moyen", "points_total", "meilleur_score", "date_maj")
+    readonly_fields = ("quiz_termines", "somme_scores", "points_total", "meilleur_score", "date_maj")
+
+
+@admin.register(QuizStats)
+class QuizStatsAdmin(admin.ModelAdmin):
+    list_display = ("quiz", "tentatives", "tentatives_terminees", "score_moyen", "taux_completion", "date_maj")
+    readonly_fields = ("tentatives", "tentatives_terminees", "somme_scores", "meilleur_score", "date_maj")
@@ -0,0 +1,72 @@
+"""
+Instantané sérialisé du contenu d'un quiz : questions, choix, points et ordre.
+
+Le contenu d'un quiz publié change rarement : il est lu une fois (trois
+requêtes) puis servi depuis le cache partagé aux vues de passage, de détail
+et de résultats, ainsi qu'au moteur de correction (grille dérivée du même
+instantané). L'instantané est versionné par l'espace de cache 'quiz:<id>' :
+core/signals.py incrémente la version à chaque enregistrement ou suppression
+du quiz, d'une question ou d'un choix, et l'instantané suivant est
+reconstruit à la première lecture.
+"""
+from django.utils import timezone
+
+from core.cache_pages import donnees_en_cache, version_espace
+from .models import Choice, Question, Quiz
+
+DUREE_INSTANTANE = 24 * 3600
+
+
+def espace_quiz(quiz_id):
+    return f"quiz:{quiz_id}"
+
+
+def _construire_instantane(quiz_id):
+    quiz = Quiz.objects.filter(pk=quiz_id).values(
+        'id', 'titre', 'description', 'duree', 'points_max', 'est_actif'
+    ).first()
+    questions = list(
+        Question.objects.filter(quiz_id=quiz_id).order_by('ordre', 'id')
+        .values('id', 'ordre', 'texte', 'points', 'explication')
+    )
+    par_id = {}
+    for question in questions:
+        question.update(choix=[], correctes=[], multiple=False)
+        par_id[question['id']] = question
+
+    choix = (
+        Choice.objects.filter(question__quiz_id=quiz_id).order_by('ordre', 'id')
+        .values('id', 'question_id', 'texte', 'ordre', 'est_correcte')
+    )
+    for ligne in choix:
+        question = par_id[ligne.pop('question_id')]
+        question['choix'].append(ligne)
+        if ligne['est_correcte']:
+            question['correctes'].append(ligne['id'])
+
+    for question in questions:
+        question['multiple'] = len(question['correctes']) > 1
+
+    return {
+        'quiz': quiz,
+        'version': version_espace(espace_quiz(quiz_id)),
+        'date': timezone.now(),
+        'questions': questions,
+        'index': {question['id']: position for position, question in enumerate(questions)},
+        'nombre_questions': len(questions),
+        'points_max': sum(question['points'] for question in questions),
+    }
+
+
+def instantane_quiz(quiz_id):
+    """Instantané du contenu du quiz, depuis le cache partagé"""
+    return donnees_en_cache(
+        espace_quiz(quiz_id), ('instantane', quiz_id),
+        lambda: _construire_instantane(quiz_id), DUREE_INSTANTANE,
+    )
+
+
+def question_instantane(instantane, question_id):
+    """Question de l'instantané par identifiant, ou None"""
+    position = instantane['index'].get(question_id)
+    return None if position is None else instantane['questions'][position]
@@ -0,0 +1,64 @@
+# cours/management/commands/reconcilier_stats_quiz.py
+import math
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from cours.models import EleveStats, QuizStats
+
+CHAMPS = {
+    EleveStats: ('eleve_id', ['quiz_termines', 'somme_scores', 'points_total', 'meilleur_score']),
+    QuizStats: ('quiz_id', ['tentatives', 'tentatives_terminees', 'somme_scores', 'meilleur_score']),
+}
+
+
+def _egal(a, b):
+    return math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-6)
+
+
+class Command(BaseCommand):
+    help = 'Recalcule les statistiques matérialisées EleveStats / QuizStats depuis les tentatives et corrige les écarts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Affiche les écarts sans les corriger')
+
+    def handle(self, *args, **options):
+        for modele, (cle, champs) in CHAMPS.items():
+            corriges, crees = self._reconcilier(modele, cle, champs, options['dry_run'])
+            nom = modele._meta.verbose_name_plural
+            if corriges or crees:
+                self.stdout.write(self.style.WARNING(
+                    f"⚠️ {nom} : {corriges} ligne(s) en écart, {crees} ligne(s) manquante(s)"
+                    + (" (non corrigées)" if options['dry_run'] else " corrigées")
+                ))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"✅ {nom} : aucune dérive"))
+
+    def _reconcilier(self, modele, cle, champs, dry_run):
+        with transaction.atomic():
+            attendues = modele.calculer()
+            existantes = {getattr(ligne, cle): ligne for ligne in modele.objects.select_for_update()}
+            maintenant = timezone.now()
+
+            a_corriger = []
+            for objet_id, ligne in existantes.items():
+                valeurs = attendues.get(objet_id, {})
+                if all(_egal(getattr(ligne, champ), valeurs.get(champ, 0)) for champ in champs):
+                    continue
+                for champ in champs:
+                    setattr(ligne, champ, valeurs.get(champ, 0))
+                ligne.date_maj = maintenant
+                a_corriger.append(ligne)
+
+            a_creer = [
+                modele(**{cle: objet_id}, **valeurs)
+                for objet_id, valeurs in attendues.items()
+                if objet_id not in existantes
+            ]
+
+            if not dry_run:
+                modele.objects.bulk_update(a_corriger, champs + ['date_maj'], batch_size=500)
+                modele.objects.bulk_create(a_creer, batch_size=500)
+
+        return len(a_corriger), len(a_creer)
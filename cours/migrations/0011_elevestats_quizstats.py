@@ -0,0 +1,47 @@
+# Generated by Django 4.2 on 2026-10-17 10:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cours', '0010_questionsession_quizattempt_questionattempt_and_more'),
+        ('utilisateurs', '0005_parent_notifications_evaluations_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EleveStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quiz_termines', models.PositiveIntegerField(default=0)),
+                ('somme_scores', models.FloatField(default=0)),
+                ('points_total', models.IntegerField(default=0)),
+                ('meilleur_score', models.FloatField(default=0)),
+                ('date_maj', models.DateTimeField(auto_now=True)),
+                ('eleve', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to='utilisateurs.eleve')),
+            ],
+            options={
+                'verbose_name': 'Statistiques élève',
+                'verbose_name_plural': 'Statistiques élèves',
+            },
+        ),
+        migrations.CreateModel(
+            name='QuizStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tentatives', models.PositiveIntegerField(default=0)),
+                ('tentatives_terminees', models.PositiveIntegerField(default=0)),
+                ('somme_scores', models.FloatField(default=0)),
+                ('meilleur_score', models.FloatField(default=0)),
+                ('date_maj', models.DateTimeField(auto_now=True)),
+                ('quiz', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to='cours.quiz')),
+            ],
+            options={
+                'verbose_name': 'Statistiques quiz',
+                'verbose_name_plural': 'Statistiques quiz',
+            },
+        ),
+    ]
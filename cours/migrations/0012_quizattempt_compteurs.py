@@ -0,0 +1,23 @@
+# Generated by Django 4.2 on 2026-10-17 11:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cours', '0011_elevestats_quizstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quizattempt',
+            name='nombre_questions',
+            field=models.PositiveIntegerField(default=0, verbose_name='Nombre de questions'),
+        ),
+        migrations.AddField(
+            model_name='quizattempt',
+            name='nombre_reponses',
+            field=models.PositiveIntegerField(default=0, verbose_name='Questions répondues'),
+        ),
+    ]
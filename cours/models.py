@@ -2,9 +2,11 @@ from django.utils import timezone
 from django.conf import settings
 from django.db import models
 from django.urls import reverse
-from django.core.exceptions import ValidationError
+from django.core.exceptions import ObjectDoesNotExist, ValidationError
+from django.db import IntegrityError, transaction
 import os
-from django.db.models import Avg
+from django.db.models import Avg, Count, F, Max, Q, Sum
+from django.db.models.functions import Coalesce, Greatest
 
 class Cours(models.Model):
     # Liste des matières disponibles
@@ -350,20 +352,16 @@ class Quiz(models.Model):
         return self.attempts.count()
     
     def get_average_score(self):
-        """Retourne la moyenne des scores"""
-        avg = self.attempts.filter(statut='termine').aggregate(Avg('score'))['score__avg']
-        return round(avg, 2) if avg else 0
+        """Retourne la moyenne des scores (statistiques précalculées)"""
+        return QuizStats.pour(self).score_moyen
     
     def get_best_score(self):
-        """Retourne le meilleur score"""
-        best = self.attempts.filter(statut='termine').order_by('-score').first()
-        return best.score if best else 0
+        """Retourne le meilleur score (statistiques précalculées)"""
+        return QuizStats.pour(self).meilleur_score
     
     def get_completion_rate(self):
-        """Retourne le taux de complétion"""
-        total_attempts = self.attempts.count()
-        completed_attempts = self.attempts.filter(statut='termine').count()
-        return round((completed_attempts / total_attempts * 100) if total_attempts > 0 else 0, 2)
+        """Retourne le taux de complétion (statistiques précalculées)"""
+        return QuizStats.pour(self).taux_completion
     
     def get_questions_with_choices(self):
         """Retourne les questions avec leurs choix"""
@@ -500,6 +498,8 @@ class QuizAttempt(models.Model):
     statut = models.CharField(max_length=20, choices=STATUT_CHOICES, default='en_cours')
     duree_secondes = models.IntegerField(default=0, verbose_name="Durée (secondes)")
     temps_restant = models.IntegerField(null=True, blank=True, verbose_name="Temps restant (secondes)")
+    nombre_questions = models.PositiveIntegerField(default=0, verbose_name="Nombre de questions")
+    nombre_reponses = models.PositiveIntegerField(default=0, verbose_name="Questions répondues")
 
     class Meta:
         verbose_name = "Tentative de quiz"
@@ -512,11 +512,21 @@ class QuizAttempt(models.Model):
     def __str__(self):
         return f"{self.eleve} - {self.quiz} ({self.score}%)"
 
+    def save(self, *args, **kwargs):
+        creation = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if creation:
+                QuizStats.enregistrer_debut(self)
+
     def calculer_score(self):
         """Calcule le score final"""
-        reponses = self.reponses.all()
-        points_obtenus = sum(reponse.points_obtenus for reponse in reponses)
-        points_max = sum(reponse.question.points for reponse in reponses)
+        totaux = self.reponses.aggregate(
+            points_obtenus=Coalesce(Sum('points_obtenus'), 0),
+            points_max=Coalesce(Sum('question__points'), 0),
+        )
+        points_obtenus = totaux['points_obtenus']
+        points_max = totaux['points_max']
         
         self.points_obtenus = points_obtenus
         self.points_max = points_max
@@ -524,17 +534,28 @@ class QuizAttempt(models.Model):
         self.save()
 
     def terminer(self):
-        """Termine la tentative de quiz"""
-        self.date_fin = timezone.now()
-        self.statut = 'termine'
-        
-        # Calculer la durée en secondes
-        if self.date_debut and self.date_fin:
-            duree = self.date_fin - self.date_debut
-            self.duree_secondes = int(duree.total_seconds())
-        
-        self.calculer_score()
-        self.save()
+        """Termine la tentative de quiz et met à jour les statistiques élève et quiz"""
+        with transaction.atomic():
+            # Ligne verrouillée : une tentative n'est comptée qu'une fois dans les statistiques
+            statut_enregistre = QuizAttempt.objects.select_for_update().values_list(
+                'statut', flat=True
+            ).get(pk=self.pk)
+            deja_terminee = statut_enregistre == 'termine'
+
+            self.date_fin = timezone.now()
+            self.statut = 'termine'
+            
+            # Calculer la durée en secondes
+            if self.date_debut and self.date_fin:
+                duree = self.date_fin - self.date_debut
+                self.duree_secondes = int(duree.total_seconds())
+            
+            self.calculer_score()
+            self.save()
+
+            if not deja_terminee:
+                EleveStats.enregistrer_tentative(self)
+                QuizStats.enregistrer_tentative(self)
 
     def get_duree_formatee(self):
         """Retourne la durée formatée (mm:ss)"""
@@ -554,6 +575,9 @@ class QuizAttempt(models.Model):
 
     def get_progression(self):
         """Retourne la progression du quiz"""
+        if self.nombre_questions:
+            # Compteurs tenus par moteur_quiz : pas de requête
+            return int(min(self.nombre_reponses, self.nombre_questions) / self.nombre_questions * 100)
         total_questions = self.quiz.questions.count()
         questions_repondues = self.reponses.count()
         return int((questions_repondues / total_questions * 100) if total_questions > 0 else 0)
@@ -574,6 +598,35 @@ class QuizAttempt(models.Model):
             return "Insuffisant"
 
 
+def noter_reponse(points, reponses_correctes, reponses_eleve):
+    """
+    Note une réponse à partir des identifiants de choix : (points obtenus, est correcte).
+    Partagé par QuestionAttempt.evaluer_reponse et la correction en mémoire (moteur_quiz).
+    """
+    reponses_correctes = set(reponses_correctes)
+    reponses_eleve = set(reponses_eleve)
+    
+    # Pour les questions à choix multiples
+    if len(reponses_correctes) > 1:
+        # Points proportionnels aux bonnes réponses sélectionnées
+        bonnes_reponses = reponses_eleve & reponses_correctes
+        mauvaises_reponses = reponses_eleve - reponses_correctes
+        
+        if not mauvaises_reponses and bonnes_reponses == reponses_correctes:
+            # Toutes les bonnes réponses, aucune mauvaise
+            return points, True
+        if bonnes_reponses:
+            # Au moins une bonne réponse
+            return int(points * len(bonnes_reponses) / len(reponses_correctes)), False
+        # Aucune bonne réponse
+        return 0, False
+    
+    # Question à choix unique
+    if reponses_eleve == reponses_correctes and len(reponses_eleve) == 1:
+        return points, True
+    return 0, False
+
+
 class QuestionAttempt(models.Model):
     """Réponse d'un élève à une question"""
     tentative = models.ForeignKey(QuizAttempt, on_delete=models.CASCADE, related_name="reponses")
@@ -597,36 +650,11 @@ class QuestionAttempt(models.Model):
 
     def evaluer_reponse(self):
         """Évalue la réponse et calcule les points obtenus"""
-        reponses_correctes = set(self.question.get_correct_choices())
-        reponses_eleve = set(self.choix_selectionnes.all())
-        
-        # Pour les questions à choix multiples
-        if self.question.is_multiple_choice():
-            # Points proportionnels aux bonnes réponses sélectionnées
-            bonnes_reponses = reponses_eleve.intersection(reponses_correctes)
-            mauvaises_reponses = reponses_eleve - reponses_correctes
-            
-            if not mauvaises_reponses and bonnes_reponses == reponses_correctes:
-                # Toutes les bonnes réponses, aucune mauvaise
-                self.points_obtenus = self.question.points
-                self.est_correcte = True
-            elif bonnes_reponses:
-                # Au moins une bonne réponse
-                ratio = len(bonnes_reponses) / len(reponses_correctes)
-                self.points_obtenus = int(self.question.points * ratio)
-                self.est_correcte = False
-            else:
-                # Aucune bonne réponse
-                self.points_obtenus = 0
-                self.est_correcte = False
-        else:
-            # Question à choix unique
-            if reponses_eleve == reponses_correctes and len(reponses_eleve) == 1:
-                self.points_obtenus = self.question.points
-                self.est_correcte = True
-            else:
-                self.points_obtenus = 0
-                self.est_correcte = False
+        reponses_correctes = set(self.question.get_correct_choices().values_list('id', flat=True))
+        reponses_eleve = set(self.choix_selectionnes.values_list('id', flat=True))
+        self.points_obtenus, self.est_correcte = noter_reponse(
+            self.question.points, reponses_correctes, reponses_eleve
+        )
         
         self.save()
         return self.points_obtenus
@@ -689,6 +717,145 @@ class QuestionSession(models.Model):
         return f"{self.session} - Q{self.ordre}"
 
 
+# Statistiques matérialisées : tenues à jour à la fin de chaque tentative
+# (QuizAttempt.terminer) et corrigées par la commande reconcilier_stats_quiz
+
+def _maj_stats(modele, cle, increments, calculer):
+    """Incrémente une ligne de statistiques ; la crée à partir des tentatives si elle manque"""
+    if modele.objects.filter(**cle).update(date_maj=timezone.now(), **increments):
+        return
+    try:
+        with transaction.atomic():
+            modele.objects.create(**cle, **calculer())
+    except IntegrityError:
+        # Ligne créée entre-temps par une autre transaction, sans la tentative courante
+        modele.objects.filter(**cle).update(date_maj=timezone.now(), **increments)
+
+
+class EleveStats(models.Model):
+    """Statistiques de quiz précalculées d'un élève"""
+    eleve = models.OneToOneField("utilisateurs.Eleve", on_delete=models.CASCADE, related_name="stats")
+    quiz_termines = models.PositiveIntegerField(default=0)
+    somme_scores = models.FloatField(default=0)
+    points_total = models.IntegerField(default=0)
+    meilleur_score = models.FloatField(default=0)
+    date_maj = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Statistiques élève"
+        verbose_name_plural = "Statistiques élèves"
+
+    def __str__(self):
+        return f"Stats {self.eleve}"
+
+    @property
+    def score_moyen(self):
+        return round(self.somme_scores / self.quiz_termines, 2) if self.quiz_termines else 0
+
+    @staticmethod
+    def calculer(eleve_ids=None):
+        """Valeurs recalculées depuis les tentatives terminées : {eleve_id: {champ: valeur}}"""
+        tentatives = QuizAttempt.objects.filter(statut='termine')
+        if eleve_ids is not None:
+            tentatives = tentatives.filter(eleve_id__in=eleve_ids)
+        lignes = tentatives.values('eleve_id').annotate(
+            quiz_termines=Count('id'),
+            somme_scores=Coalesce(Sum('score'), 0.0),
+            points_total=Coalesce(Sum('points_obtenus'), 0),
+            meilleur_score=Coalesce(Max('score'), 0.0),
+        )
+        return {ligne.pop('eleve_id'): ligne for ligne in lignes}
+
+    @classmethod
+    def pour(cls, eleve):
+        """Statistiques de l'élève ; calculées sans écriture si la ligne n'existe pas encore"""
+        try:
+            return eleve.stats
+        except ObjectDoesNotExist:
+            return cls(eleve=eleve, **cls.calculer([eleve.pk]).get(eleve.pk, {}))
+
+    @classmethod
+    def enregistrer_tentative(cls, tentative):
+        _maj_stats(
+            cls, {'eleve_id': tentative.eleve_id},
+            {
+                'quiz_termines': F('quiz_termines') + 1,
+                'somme_scores': F('somme_scores') + tentative.score,
+                'points_total': F('points_total') + tentative.points_obtenus,
+                'meilleur_score': Greatest(F('meilleur_score'), tentative.score),
+            },
+            lambda: cls.calculer([tentative.eleve_id]).get(tentative.eleve_id, {}),
+        )
+
+
+class QuizStats(models.Model):
+    """Statistiques de tentatives précalculées d'un quiz"""
+    quiz = models.OneToOneField(Quiz, on_delete=models.CASCADE, related_name="stats")
+    tentatives = models.PositiveIntegerField(default=0)
+    tentatives_terminees = models.PositiveIntegerField(default=0)
+    somme_scores = models.FloatField(default=0)
+    meilleur_score = models.FloatField(default=0)
+    date_maj = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Statistiques quiz"
+        verbose_name_plural = "Statistiques quiz"
+
+    def __str__(self):
+        return f"Stats {self.quiz}"
+
+    @property
+    def score_moyen(self):
+        return round(self.somme_scores / self.tentatives_terminees, 2) if self.tentatives_terminees else 0
+
+    @property
+    def taux_completion(self):
+        return round(self.tentatives_terminees / self.tentatives * 100, 2) if self.tentatives else 0
+
+    @staticmethod
+    def calculer(quiz_ids=None):
+        """Valeurs recalculées depuis les tentatives : {quiz_id: {champ: valeur}}"""
+        tentatives = QuizAttempt.objects.all()
+        if quiz_ids is not None:
+            tentatives = tentatives.filter(quiz_id__in=quiz_ids)
+        terminees = Q(statut='termine')
+        lignes = tentatives.values('quiz_id').annotate(
+            tentatives=Count('id'),
+            tentatives_terminees=Count('id', filter=terminees),
+            somme_scores=Coalesce(Sum('score', filter=terminees), 0.0),
+            meilleur_score=Coalesce(Max('score', filter=terminees), 0.0),
+        )
+        return {ligne.pop('quiz_id'): ligne for ligne in lignes}
+
+    @classmethod
+    def pour(cls, quiz):
+        """Statistiques du quiz ; calculées sans écriture si la ligne n'existe pas encore"""
+        try:
+            return quiz.stats
+        except ObjectDoesNotExist:
+            return cls(quiz=quiz, **cls.calculer([quiz.pk]).get(quiz.pk, {}))
+
+    @classmethod
+    def enregistrer_debut(cls, tentative):
+        _maj_stats(
+            cls, {'quiz_id': tentative.quiz_id},
+            {'tentatives': F('tentatives') + 1},
+            lambda: cls.calculer([tentative.quiz_id]).get(tentative.quiz_id, {}),
+        )
+
+    @classmethod
+    def enregistrer_tentative(cls, tentative):
+        _maj_stats(
+            cls, {'quiz_id': tentative.quiz_id},
+            {
+                'tentatives_terminees': F('tentatives_terminees') + 1,
+                'somme_scores': F('somme_scores') + tentative.score,
+                'meilleur_score': Greatest(F('meilleur_score'), tentative.score),
+            },
+            lambda: cls.calculer([tentative.quiz_id]).get(tentative.quiz_id, {}),
+        )
+
+
 # Méthodes supplémentaires pour les modèles existants
 
 def ajouter_methodes_quiz():
@@ -699,20 +866,16 @@ def ajouter_methodes_quiz():
         return self.attempts.count()
     
     def get_average_score(self):
-        """Retourne la moyenne des scores"""
-        avg = self.attempts.filter(statut='termine').aggregate(Avg('score'))['score__avg']
-        return round(avg, 2) if avg else 0
+        """Retourne la moyenne des scores (statistiques précalculées)"""
+        return QuizStats.pour(self).score_moyen
     
     def get_best_score(self):
-        """Retourne le meilleur score"""
-        best = self.attempts.filter(statut='termine').order_by('-score').first()
-        return best.score if best else 0
+        """Retourne le meilleur score (statistiques précalculées)"""
+        return QuizStats.pour(self).meilleur_score
     
     def get_completion_rate(self):
-        """Retourne le taux de complétion"""
-        total_attempts = self.attempts.count()
-        completed_attempts = self.attempts.filter(statut='termine').count()
-        return round((completed_attempts / total_attempts * 100) if total_attempts > 0 else 0, 2)
+        """Retourne le taux de complétion (statistiques précalculées)"""
+        return QuizStats.pour(self).taux_completion
     
     def get_questions_with_choices(self):
         """Retourne les questions avec leurs choix"""
@@ -738,16 +901,15 @@ def ajouter_methodes_eleve():
     
     def get_quiz_completed_count(self):
         """Retourne le nombre de quiz complétés"""
-        return self.quiz_attempts.filter(statut='termine').count()
+        return EleveStats.pour(self).quiz_termines
     
     def get_average_quiz_score(self):
         """Retourne la moyenne des scores aux quiz"""
-        avg = self.quiz_attempts.filter(statut='termine').aggregate(Avg('score'))['score__avg']
-        return round(avg, 2) if avg else 0
+        return EleveStats.pour(self).score_moyen
     
     def get_total_quiz_points(self):
         """Retourne le total des points obtenus"""
-        return self.quiz_attempts.filter(statut='termine').aggregate(Sum('points_obtenus'))['points_obtenus__sum'] or 0
+        return EleveStats.pour(self).points_total
     
     def get_quiz_in_progress(self):
         """Retourne les quiz en cours"""
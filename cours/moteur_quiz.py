@@ -0,0 +1,131 @@
+"""
+Moteur de passage des quiz : démarrage, enregistrement et correction des réponses.
+
+La grille de correction d'un quiz (ordre des questions, points, choix
+possibles et choix corrects) est dérivée de l'instantané du quiz gardé dans
+le cache partagé (instantane_quiz), invalidé à chaque modification du quiz,
+de ses questions ou de ses choix. Une réponse est corrigée en mémoire à
+partir de cette grille et écrite en un nombre fixe de requêtes ; la
+progression est lue sur les compteurs de la tentative (nombre_questions /
+nombre_reponses), sans comptage.
+"""
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Subquery
+from django.utils import timezone
+
+from .instantane_quiz import instantane_quiz
+from .models import QuestionAttempt, QuestionSession, QuizAttempt, QuizSession, noter_reponse
+
+
+def grille_correction(quiz_id):
+    """Grille de correction du quiz, dérivée de l'instantané en cache"""
+    instantane = instantane_quiz(quiz_id)
+    return {
+        'ordre': [question['id'] for question in instantane['questions']],
+        'points_max': instantane['points_max'],
+        'questions': {
+            question['id']: {
+                'points': question['points'],
+                'choix': [choix['id'] for choix in question['choix']],
+                'correctes': question['correctes'],
+            }
+            for question in instantane['questions']
+        },
+    }
+
+
+def sessions_tentative(tentative):
+    """Sessions de l'élève sur ce quiz, la plus récente (celle de la tentative en cours) d'abord"""
+    return QuizSession.objects.filter(
+        quiz_id=tentative.quiz_id, eleve_id=tentative.eleve_id
+    ).order_by('-date_debut', '-id')
+
+
+def demarrer_tentative(quiz, eleve):
+    """Crée la tentative, sa session et les lignes de questions de la session (insertion groupée)"""
+    grille = grille_correction(quiz.id)
+    with transaction.atomic():
+        tentative = QuizAttempt.objects.create(
+            quiz=quiz,
+            eleve=eleve,
+            points_max=grille['points_max'],
+            nombre_questions=len(grille['ordre']),
+        )
+        session = QuizSession.objects.create(
+            quiz=quiz,
+            eleve=eleve,
+            date_fin_prevue=timezone.now() + timedelta(minutes=quiz.duree),
+            temps_restant=quiz.duree * 60,  # Convertir en secondes
+        )
+        QuestionSession.objects.bulk_create([
+            QuestionSession(session=session, question_id=question_id, ordre=ordre)
+            for ordre, question_id in enumerate(grille['ordre'], 1)
+        ])
+    return tentative
+
+
+def enregistrer_reponse(tentative, question_id, choix_ids, temps_reponse=0):
+    """
+    Corrige et enregistre la réponse à une question (création ou remplacement).
+    Lève ValueError si la question n'appartient pas au quiz.
+    """
+    try:
+        question_id = int(question_id)
+        choix_ids = {int(choix_id) for choix_id in choix_ids or []}
+    except (TypeError, ValueError):
+        raise ValueError("Réponse invalide.")
+
+    entree = grille_correction(tentative.quiz_id)['questions'].get(question_id)
+    if entree is None:
+        raise ValueError("Question introuvable dans ce quiz.")
+
+    # Les choix étrangers à la question sont ignorés
+    choisis = choix_ids.intersection(entree['choix'])
+    points_obtenus, est_correcte = noter_reponse(entree['points'], entree['correctes'], choisis)
+    maintenant = timezone.now()
+    valeurs = {
+        'points_obtenus': points_obtenus,
+        'est_correcte': est_correcte,
+        'temps_reponse': temps_reponse,
+        'date_reponse': maintenant,
+    }
+    liens = QuestionAttempt.choix_selectionnes.through
+
+    with transaction.atomic():
+        reponses = QuestionAttempt.objects.filter(tentative=tentative, question_id=question_id)
+        reponse_id = reponses.values_list('id', flat=True).first()
+        nouvelle = reponse_id is None
+        if nouvelle:
+            try:
+                with transaction.atomic():
+                    reponse_id = QuestionAttempt.objects.create(
+                        tentative=tentative, question_id=question_id, **valeurs
+                    ).id
+            except IntegrityError:
+                # Double envoi simultané : l'autre requête a créé la réponse
+                nouvelle = False
+                reponse_id = reponses.values_list('id', flat=True).get()
+        if not nouvelle:
+            reponses.update(**valeurs)
+            liens.objects.filter(questionattempt_id=reponse_id).delete()
+
+        liens.objects.bulk_create([
+            liens(questionattempt_id=reponse_id, choice_id=choix_id) for choix_id in choisis
+        ])
+
+        if nouvelle:
+            QuizAttempt.objects.filter(pk=tentative.pk).update(nombre_reponses=F('nombre_reponses') + 1)
+            tentative.nombre_reponses += 1
+
+        QuestionSession.objects.filter(
+            session_id=Subquery(sessions_tentative(tentative).values('id')[:1]),
+            question_id=question_id,
+        ).update(repondue=True, date_reponse=maintenant)
+
+    return {
+        'points_obtenus': points_obtenus,
+        'est_correcte': est_correcte,
+        'progression': tentative.get_progression(),
+    }
@@ -0,0 +1,136 @@
+"""
+Statistiques des cours d'un professeur : inscrits, évaluations, quiz et tentatives par cours.
+
+Chaque métrique est obtenue par une requête groupée par cours (inscriptions,
+évaluations, quiz, tentatives via QuizStats) : le nombre de requêtes ne
+dépend pas du nombre de cours. Les résultats sont mis en cache dans les
+espaces 'cours' et 'professeur:<id>' / 'statistiques_cours' ; core/signals.py
+les invalide à chaque inscription ou évaluation. Les tentatives de quiz, lues
+dans les statistiques matérialisées, peuvent avoir jusqu'à la durée du cache de retard.
+"""
+import hashlib
+
+from django.db.models import Avg, Count, Sum
+from django.utils import timezone
+
+from core.cache_pages import donnees_en_cache
+from .models import Cours, CoursCoursEleves, Evaluation, Quiz, QuizStats
+
+STATISTIQUES_VIDES = {
+    'eleves_inscrits': 0,
+    'evaluations': 0,
+    'somme_notes': 0,
+    'note_moyenne': None,
+    'quiz': 0,
+    'tentatives': 0,
+    'tentatives_terminees': 0,
+    'taux_completion': 0,
+}
+
+
+def espace_professeur(professeur_id):
+    return f"professeur:{professeur_id}"
+
+
+def _calculer_statistiques_cours(cours_ids):
+    """{cours_id: statistiques} en une requête groupée par table"""
+    statistiques = {cours_id: dict(STATISTIQUES_VIDES) for cours_id in cours_ids}
+    if not statistiques:
+        return statistiques
+
+    inscriptions = (
+        CoursCoursEleves.objects.filter(cours_id__in=cours_ids)
+        .values('cours_id').annotate(total=Count('id')).order_by()
+    )
+    for ligne in inscriptions:
+        statistiques[ligne['cours_id']]['eleves_inscrits'] = ligne['total']
+
+    evaluations = (
+        Evaluation.objects.filter(cours_id__in=cours_ids)
+        .values('cours_id').annotate(total=Count('id'), somme=Sum('note'), moyenne=Avg('note')).order_by()
+    )
+    for ligne in evaluations:
+        stats = statistiques[ligne['cours_id']]
+        stats['evaluations'] = ligne['total']
+        stats['somme_notes'] = ligne['somme'] or 0
+        stats['note_moyenne'] = round(ligne['moyenne'], 1) if ligne['moyenne'] is not None else None
+
+    quiz = (
+        Quiz.objects.filter(cours_id__in=cours_ids)
+        .values('cours_id').annotate(total=Count('id')).order_by()
+    )
+    for ligne in quiz:
+        statistiques[ligne['cours_id']]['quiz'] = ligne['total']
+
+    tentatives = (
+        QuizStats.objects.filter(quiz__cours_id__in=cours_ids)
+        .values('quiz__cours_id')
+        .annotate(tentatives=Sum('tentatives'), terminees=Sum('tentatives_terminees'))
+        .order_by()
+    )
+    for ligne in tentatives:
+        stats = statistiques[ligne['quiz__cours_id']]
+        stats['tentatives'] = ligne['tentatives'] or 0
+        stats['tentatives_terminees'] = ligne['terminees'] or 0
+        if stats['tentatives']:
+            stats['taux_completion'] = round(stats['tentatives_terminees'] / stats['tentatives'] * 100, 1)
+
+    return statistiques
+
+
+def statistiques_cours(cours_ids, duree=None):
+    """Statistiques par cours pour une liste de cours (page de liste), en cache"""
+    cours_ids = sorted(set(cours_ids))
+    if not cours_ids:
+        return {}
+    empreinte = hashlib.md5(','.join(map(str, cours_ids)).encode()).hexdigest()
+    return donnees_en_cache(
+        ['cours', 'statistiques_cours'], ('statistiques_cours', empreinte),
+        lambda: _calculer_statistiques_cours(cours_ids), duree,
+    )
+
+
+def _calculer_statistiques_professeur(professeur_id):
+    cours = list(
+        Cours.objects.filter(professeur_id=professeur_id).values_list('id', 'date_creation')
+    )
+    par_cours = _calculer_statistiques_cours([cours_id for cours_id, _ in cours])
+
+    debut_mois = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    total_evaluations = sum(stats['evaluations'] for stats in par_cours.values())
+    somme_notes = sum(stats['somme_notes'] for stats in par_cours.values())
+    tentatives = sum(stats['tentatives'] for stats in par_cours.values())
+    terminees = sum(stats['tentatives_terminees'] for stats in par_cours.values())
+
+    return {
+        'cours': par_cours,
+        'totaux': {
+            'cours_actifs': len(cours),
+            'eleves_total': sum(stats['eleves_inscrits'] for stats in par_cours.values()),
+            'sessions_mois': sum(1 for _, date_creation in cours if date_creation >= debut_mois),
+            'note_moyenne': round(somme_notes / total_evaluations, 1) if total_evaluations else "0.0",
+            'evaluations': total_evaluations,
+            'quiz': sum(stats['quiz'] for stats in par_cours.values()),
+            'tentatives': tentatives,
+            'taux_completion': round(terminees / tentatives * 100, 1) if tentatives else 0,
+        },
+    }
+
+
+def statistiques_professeur(professeur, duree=None):
+    """
+    Statistiques de tous les cours du professeur, en cache :
+    {'cours': {cours_id: statistiques}, 'totaux': {...}}
+    """
+    professeur_id = getattr(professeur, 'pk', professeur)
+    return donnees_en_cache(
+        ['cours', espace_professeur(professeur_id)], ('statistiques_professeur', professeur_id),
+        lambda: _calculer_statistiques_professeur(professeur_id), duree,
+    )
+
+
+def attacher_statistiques(cours_list, statistiques):
+    """Pose sur chaque cours l'attribut `statistiques` (lu par les templates)"""
+    for cours in cours_list:
+        cours.statistiques = statistiques.get(cours.id, STATISTIQUES_VIDES)
+    return cours_list
@@ -1,3 +1,89 @@
+from unittest import mock
+
+from django.db.models import QuerySet
 from django.test import TestCase
 
-# Create your tests here.
+from utilisateurs.models import Eleve, Utilisateur
+
+from .models import Choice, Question, QuestionAttempt, QuestionSession, Quiz, QuizAttempt
+from .moteur_quiz import demarrer_tentative, enregistrer_reponse
+
+
+class EnregistrerReponseTests(TestCase):
+    def setUp(self):
+        user = Utilisateur.objects.create_user(
+            username='eleve', email='eleve@example.com', password='secret',
+            type_utilisateur=Utilisateur.EST_ELEVE, first_name='Awa', last_name='Diop',
+        )
+        self.eleve = Eleve.objects.create(user=user, niveau=Eleve.NIVEAU_COLLEGE)
+        self.quiz = Quiz.objects.create(titre="Fractions", duree=10)
+        self.question = Question.objects.create(quiz=self.quiz, texte="1/2 + 1/2 ?", ordre=1, points=2)
+        self.juste = Choice.objects.create(question=self.question, texte="1", est_correcte=True, ordre=1)
+        self.faux = Choice.objects.create(question=self.question, texte="2/4", ordre=2)
+        self.autre_question = Question.objects.create(quiz=self.quiz, texte="2 x 3 ?", ordre=2)
+        self.autre_choix = Choice.objects.create(
+            question=self.autre_question, texte="6", est_correcte=True, ordre=1
+        )
+        self.tentative = demarrer_tentative(self.quiz, self.eleve)
+
+    def choix_enregistres(self):
+        reponse = QuestionAttempt.objects.get(tentative=self.tentative, question=self.question)
+        return set(reponse.choix_selectionnes.values_list('id', flat=True))
+
+    def test_premiere_reponse(self):
+        resultat = enregistrer_reponse(self.tentative, self.question.id, [self.juste.id])
+
+        self.assertEqual(resultat['points_obtenus'], 2)
+        self.assertTrue(resultat['est_correcte'])
+        self.assertEqual(resultat['progression'], 50)
+        self.assertEqual(self.choix_enregistres(), {self.juste.id})
+        self.assertTrue(QuestionSession.objects.get(question=self.question).repondue)
+
+    def test_remplacement_reponse(self):
+        enregistrer_reponse(self.tentative, self.question.id, [self.juste.id])
+        resultat = enregistrer_reponse(self.tentative, self.question.id, [self.faux.id])
+
+        self.assertFalse(resultat['est_correcte'])
+        self.assertEqual(resultat['points_obtenus'], 0)
+        self.assertEqual(QuestionAttempt.objects.filter(tentative=self.tentative).count(), 1)
+        self.assertEqual(self.choix_enregistres(), {self.faux.id})
+        self.assertEqual(QuizAttempt.objects.get(pk=self.tentative.pk).nombre_reponses, 1)
+
+    def test_double_envoi_simultane(self):
+        # L'autre requête a créé la réponse entre la lecture et l'insertion
+        QuestionAttempt.objects.create(tentative=self.tentative, question=self.question)
+        QuizAttempt.objects.filter(pk=self.tentative.pk).update(nombre_reponses=1)
+        self.tentative.nombre_reponses = 1
+        first = QuerySet.first
+        lectures = []
+
+        def premiere_lecture_manquee(queryset):
+            if queryset.model is QuestionAttempt and not lectures:
+                lectures.append(queryset)
+                return None
+            return first(queryset)
+
+        with mock.patch.object(QuerySet, 'first', premiere_lecture_manquee):
+            resultat = enregistrer_reponse(self.tentative, self.question.id, [self.juste.id])
+
+        self.assertEqual(len(lectures), 1)
+        self.assertTrue(resultat['est_correcte'])
+        self.assertEqual(QuestionAttempt.objects.filter(tentative=self.tentative).count(), 1)
+        self.assertEqual(self.choix_enregistres(), {self.juste.id})
+        self.assertEqual(QuizAttempt.objects.get(pk=self.tentative.pk).nombre_reponses, 1)
+
+    def test_choix_etrangers_ignores(self):
+        resultat = enregistrer_reponse(
+            self.tentative, self.question.id, [self.juste.id, self.autre_choix.id, 999999]
+        )
+
+        self.assertTrue(resultat['est_correcte'])
+        self.assertEqual(self.choix_enregistres(), {self.juste.id})
+
+    def test_question_etrangere(self):
+        autre_quiz = Quiz.objects.create(titre="Autre", duree=5)
+        etrangere = Question.objects.create(quiz=autre_quiz, texte="?", ordre=1)
+
+        with self.assertRaises(ValueError):
+            enregistrer_reponse(self.tentative, etrangere.id, [])
+        self.assertFalse(QuestionAttempt.objects.exists())
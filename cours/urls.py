@@ -12,6 +12,7 @@ urlpatterns = [
     path("<int:pk>/", views.CoursDetailView.as_view(), name="detail"),
     path("<int:pk>/edit/", views.CoursUpdateView.as_view(), name="edit"),
     path("<int:pk>/delete/", views.CoursDeleteView.as_view(), name="delete"),
+    path("statistiques/", views.StatistiquesProfesseurView.as_view(), name="statistiques_professeur"),
     
     # =====================================
      # Gestion unique des inscriptions des élèves
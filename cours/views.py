@@ -13,9 +13,14 @@ from django.views.decorators.csrf import csrf_exempt
 from django.conf import settings
 from django.core.exceptions import ValidationError
 
+from core.cache_pages import donnees_en_cache
+from .instantane_quiz import instantane_quiz, question_instantane
+from .moteur_quiz import demarrer_tentative, enregistrer_reponse, sessions_tentative
+from .statistiques import attacher_statistiques, statistiques_cours, statistiques_professeur
 from repetiteur_ia.models import SoumissionCours, SessionRevisionProgrammee
+from repetiteur_ia.utils import get_openai_client
 from .forms import QuizForm, QuestionForm, ChoiceForm, CoursForm
-from .models import Cours, Quiz, Evaluation, CoursCoursEleves, EmploiDuTemps, Question, Choice, QuestionAttempt, QuizAttempt, QuizSession
+from .models import Cours, Quiz, Evaluation, CoursCoursEleves, EmploiDuTemps, Question, Choice, QuestionAttempt, QuestionSession, QuizAttempt, QuizSession, QuizStats
 from utilisateurs.models import Professeur, Eleve
 import json
 from django.db import transaction
@@ -41,23 +46,26 @@ class CoursListView(LoginRequiredMixin, ListView):
     def get_queryset(self):
         # VERSION SIMPLIFIÉE POUR TEST - Retourne TOUS les cours
         queryset = Cours.objects.all()
-        print(f"DEBUG - Total cours: {queryset.count()}")
         return queryset.order_by("-date_creation")
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         user = self.request.user
         
-        # Debug info
-        print(f"DEBUG - User: {user.username}, Type: {getattr(user, 'type_utilisateur', 'None')}")
-        print(f"DEBUG - Cours dans contexte: {context['cours_list'].count()}")
+        # Matières disponibles (cache partagé, invalidé à l'enregistrement d'un cours)
+        context['matieres_disponibles'] = donnees_en_cache(
+            'cours', ('matieres_disponibles',),
+            lambda: list(Cours.objects.exclude(
+                matiere__isnull=True
+            ).exclude(
+                matiere__exact=''
+            ).values_list('matiere', flat=True).distinct().order_by('matiere')),
+            duree=3600,
+        )
         
-        # Matières disponibles
-        context['matieres_disponibles'] = Cours.objects.exclude(
-            matiere__isnull=True
-        ).exclude(
-            matiere__exact=''
-        ).values_list('matiere', flat=True).distinct().order_by('matiere')
+        # Inscrits, évaluations et quiz des cours affichés (requêtes groupées, en cache)
+        cours_list = context['cours_list']
+        attacher_statistiques(cours_list, statistiques_cours([cours.id for cours in cours_list]))
         
         context['matiere_actuelle'] = self.request.GET.get('matiere', '')
         context['niveau_actuel'] = self.request.GET.get('niveau', '')
@@ -84,6 +92,22 @@ class CoursListView(LoginRequiredMixin, ListView):
 
 
 
+class StatistiquesProfesseurView(LoginRequiredMixin, ProfesseurRequiredMixin, View):
+    """Statistiques des cours du professeur connecté (JSON)"""
+
+    def get(self, request):
+        professeur = get_object_or_404(Professeur, user=request.user)
+        statistiques = statistiques_professeur(professeur)
+        titres = dict(Cours.objects.filter(professeur=professeur).values_list('id', 'titre'))
+        return JsonResponse({
+            'totaux': statistiques['totaux'],
+            'cours': [
+                {'id': cours_id, 'titre': titres.get(cours_id, ''), **stats}
+                for cours_id, stats in statistiques['cours'].items()
+            ],
+        })
+
+
 class CoursDetailView(LoginRequiredMixin, DetailView):
     model = Cours
     template_name = "cours/cours_detail.html"
@@ -579,7 +603,7 @@ class QuizCreateFromSubmissionView(LoginRequiredMixin, View):
         """
         
         try:
-            response = client.chat.completions.create(
+            response = get_openai_client().chat.completions.create(
                 model="gpt-4o-mini",
                 messages=[{"role": "user", "content": prompt}],
                 temperature=0.7,
@@ -940,6 +964,13 @@ class QuizDetailView(LoginRequiredMixin, DetailView):
     template_name = "cours/quiz_detail.html"
     context_object_name = "quiz"
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # Questions et choix depuis l'instantané en cache
+        context['instantane'] = instantane_quiz(self.object.pk)
+        context['statistiques_quiz'] = QuizStats.pour(self.object)
+        return context
+
 
 class AddQuestionView(LoginRequiredMixin, ProfesseurRequiredMixin, CreateView):
     model = Question
@@ -1116,16 +1147,11 @@ class QuizTakeView(LoginRequiredMixin, DetailView):
     def get_object(self, queryset=None):
         """Récupère la tentative de quiz avec l'ID de l'URL"""
         attempt_id = self.kwargs.get('attempt_id')
-        from utilisateurs.models import Eleve
         
-        # Vérifie que l'utilisateur est bien un élève
-        try:
-            eleve = Eleve.objects.get(user=self.request.user)
-        except Eleve.DoesNotExist:
-            raise Http404("Profil élève introuvable.")
-
-        # On récupère la tentative sans restreindre au statut
-        attempt = get_object_or_404(QuizAttempt, id=attempt_id, eleve=eleve)
+        # La tentative doit appartenir à l'élève connecté (une seule requête, quiz compris)
+        attempt = get_object_or_404(
+            QuizAttempt.objects.select_related('quiz'), id=attempt_id, eleve__user=self.request.user
+        )
         
         # Si le quiz est déjà terminé, on affiche un message
         if attempt.statut != 'en_cours':
@@ -1134,34 +1160,32 @@ class QuizTakeView(LoginRequiredMixin, DetailView):
         return attempt
 
     def get_context_data(self, **kwargs):
-        """Ajoute les données du quiz au contexte"""
+        """Ajoute les données du quiz au contexte (contenu lu dans l'instantané en cache)"""
         context = super().get_context_data(**kwargs)
         attempt = self.object
+        instantane = instantane_quiz(attempt.quiz_id)
         
         # Récupérer la session active liée à la tentative
-        session = QuizSession.objects.filter(
-            quiz=attempt.quiz, 
-            eleve=attempt.eleve
-        ).first()
+        session = sessions_tentative(attempt).first()
         
-        # Récupérer les questions non répondues
-        questions_non_repondues = []
+        # Première question non répondue de la session
+        question_id = None
         if session:
-            questions_non_repondues = session.questions_repondues.filter(
-                questionsession__repondue=False
-            ).order_by('questionsession__ordre')
+            question_id = QuestionSession.objects.filter(
+                session=session, repondue=False
+            ).order_by('ordre').values_list('question_id', flat=True).first()
         
-        # Si aucune question non répondue, récupérer toutes les questions du quiz
-        if not questions_non_repondues.exists():
-            questions_non_repondues = attempt.quiz.questions.order_by('ordre')
-        
-        current_question = questions_non_repondues.first() if questions_non_repondues.exists() else None
+        current_question = question_instantane(instantane, question_id)
+        # Si aucune question non répondue, reprendre à la première question du quiz
+        if current_question is None and instantane['questions']:
+            current_question = instantane['questions'][0]
         
         context.update({
             'quiz': attempt.quiz,
+            'instantane': instantane,
             'session': session,
             'current_question': current_question,
-            'questions_count': attempt.quiz.questions.count(),
+            'questions_count': instantane['nombre_questions'],
             'progression': attempt.get_progression(),
             'temps_restant': session.temps_restant if session else attempt.quiz.duree * 60,
         })
@@ -1182,27 +1206,8 @@ class QuizStartView(LoginRequiredMixin, View):
                 messages.warning(request, "Vous avez déjà une tentative en cours pour ce quiz.")
                 return redirect('cours:quiz_detail', pk=pk)
             
-            # Créer une nouvelle tentative
-            with transaction.atomic():
-                attempt = QuizAttempt.objects.create(
-                    quiz=quiz,
-                    eleve=eleve,
-                    points_max=sum(q.points for q in quiz.questions.all())
-                )
-                
-                # Créer une session de quiz
-                date_fin_prevue = timezone.now() + timedelta(minutes=quiz.duree)
-                session = QuizSession.objects.create(
-                    quiz=quiz,
-                    eleve=eleve,
-                    date_fin_prevue=date_fin_prevue,
-                    temps_restant=quiz.duree * 60  # Convertir en secondes
-                )
-                
-                # Préparer les questions pour la session
-                questions = quiz.questions.order_by('ordre')
-                for ordre, question in enumerate(questions, 1):
-                    session.questions_repondues.add(question, through_defaults={'ordre': ordre})
+            # Tentative, session et questions de la session (insertion groupée)
+            attempt = demarrer_tentative(quiz, eleve)
             
             messages.success(request, f"Quiz '{quiz.titre}' démarré ! Vous avez {quiz.duree} minutes.")
             return redirect('cours:quiz_take', attempt_id=attempt.id)
@@ -1228,41 +1233,10 @@ class QuizSubmitAnswerView(LoginRequiredMixin, View):
             choix_ids = data.get('choix_ids', [])
             temps_reponse = data.get('temps_reponse', 0)
             
-            question = get_object_or_404(attempt.quiz.questions, id=question_id)
-            choix_selectionnes = question.choices.filter(id__in=choix_ids)
+            # Correction en mémoire à partir de la grille du quiz (cache partagé)
+            resultat = enregistrer_reponse(attempt, question_id, choix_ids, temps_reponse)
             
-            with transaction.atomic():
-                # Créer ou mettre à jour la réponse
-                question_attempt, created = QuestionAttempt.objects.get_or_create(
-                    tentative=attempt,
-                    question=question,
-                    defaults={'temps_reponse': temps_reponse}
-                )
-                
-                if not created:
-                    question_attempt.temps_reponse = temps_reponse
-                
-                question_attempt.choix_selectionnes.set(choix_selectionnes)
-                points_obtenus = question_attempt.evaluer_reponse()
-                
-                # Mettre à jour la session
-                session = QuizSession.objects.filter(
-                    quiz=attempt.quiz, 
-                    eleve=attempt.eleve
-                ).first()
-                
-                if session:
-                    question_session = session.questionsession_set.get(question=question)
-                    question_session.repondue = True
-                    question_session.date_reponse = timezone.now()
-                    question_session.save()
-            
-            return JsonResponse({
-                'success': True,
-                'points_obtenus': points_obtenus,
-                'est_correcte': question_attempt.est_correcte,
-                'progression': attempt.get_progression()
-            })
+            return JsonResponse({'success': True, **resultat})
             
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=400)
@@ -1310,10 +1284,31 @@ class QuizResultsView(LoginRequiredMixin, DetailView):
         context = super().get_context_data(**kwargs)
         attempt = self.object
         
-        # Récupérer les réponses détaillées
-        reponses = attempt.reponses.select_related('question').prefetch_related(
-            'choix_selectionnes', 'question__choices'
-        )
+        # Réponses détaillées : contenu des questions et des choix lu dans l'instantané
+        instantane = instantane_quiz(attempt.quiz_id)
+        choix_par_reponse = {}
+        for reponse_id, choix_id in QuestionAttempt.choix_selectionnes.through.objects.filter(
+            questionattempt__tentative=attempt
+        ).values_list('questionattempt_id', 'choice_id'):
+            choix_par_reponse.setdefault(reponse_id, set()).add(choix_id)
+        
+        reponses = []
+        for reponse in attempt.reponses.values('id', 'question_id', 'points_obtenus', 'est_correcte'):
+            question = question_instantane(instantane, reponse['question_id'])
+            if question is None:
+                continue
+            choisis = choix_par_reponse.get(reponse['id'], set())
+            reponses.append({
+                **reponse,
+                'question': question,
+                'choix_selectionnes_texte': ", ".join(
+                    choix['texte'] for choix in question['choix'] if choix['id'] in choisis
+                ),
+                'reponses_correctes_texte': ", ".join(
+                    choix['texte'] for choix in question['choix'] if choix['est_correcte']
+                ),
+            })
+        reponses.sort(key=lambda reponse: instantane['index'][reponse['question_id']])
         
         context.update({
             'quiz': attempt.quiz,
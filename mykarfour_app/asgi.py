@@ -11,12 +11,20 @@ import os
 from django.core.asgi import get_asgi_application
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack
-import repetiteur_ia.routing
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mykarfour_app.settings')
 
 django_asgi_app = get_asgi_application()
 
+# Importé après get_asgi_application() : les consumers dépendent des modèles
+import repetiteur_ia.routing
+
+# Même préchargement que wsgi.py lorsque gunicorn tourne avec --preload
+from django.conf import settings
+if getattr(settings, 'EMBEDDING_PRELOAD', False):
+    from repetiteur_ia.embeddings import get_sentence_model
+    get_sentence_model()
+
 application = ProtocolTypeRouter({
     "http": django_asgi_app,
     "websocket": AuthMiddlewareStack(
@@ -2,17 +2,22 @@ from celery import Celery
 from django.conf import settings
 import os
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mykarfour_ia.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mykarfour_app.settings')
 
-app = Celery('mykarfour_ia')
+app = Celery('mykarfour_app')
 app.config_from_object('django.conf:settings', namespace='CELERY')
 app.autodiscover_tasks()
+# Modules de tâches du répétiteur qui ne s'appellent pas tasks.py
+app.autodiscover_tasks(['repetiteur_ia'], related_name='tasks_rappels')
+app.autodiscover_tasks(['repetiteur_ia'], related_name='tasks_embeddings')
+app.autodiscover_tasks(['repetiteur_ia'], related_name='tasks_audio')
+app.autodiscover_tasks(['repetiteur_ia'], related_name='tasks_soumissions')
+app.autodiscover_tasks(['repetiteur_ia'], related_name='tasks_extraction')
+app.autodiscover_tasks(['repetiteur_ia'], related_name='tasks_resumes')
 
-# Dans gestionnaire/tasks.py
-from celery import shared_task
-from django.utils import timezone
-from repetiteur_ia.utils import programmer_rappels
 
-@shared_task
-def task_programmer_rappels():
-    programmer_rappels()
\ No newline at end of file
+@app.on_after_configure.connect
+def configurer_planification(sender, **kwargs):
+    """Charge la planification Celery Beat du répétiteur"""
+    from repetiteur_ia.celery_schedule import beat_schedule
+    sender.conf.beat_schedule.update(beat_schedule)
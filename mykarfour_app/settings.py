@@ -173,6 +173,18 @@ WHITENOISE_INDEX_FILE = True
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Audios TTS du répétiteur (repetiteur_ia.audio_tts) : MEDIA_ROOT/tts, adressés
+# par sha256 du texte, éviction LRU au-delà de AUDIO_TTS_TAILLE_MAX octets
+AUDIO_TTS_SOUS_DOSSIER = "tts"
+AUDIO_TTS_TAILLE_MAX = env.int("AUDIO_TTS_TAILLE_MAX", default=500 * 1024 * 1024)
+# Synthèse en tâche Celery : le chat répond sans attendre l'audio
+AUDIO_TTS_DIFFERE = env.bool("AUDIO_TTS_DIFFERE", default=True)
+
+# Extraction du texte des fichiers (repetiteur_ia.extraction), mise en cache par sha256
+EXTRACTION_MAX_CARACTERES = env.int("EXTRACTION_MAX_CARACTERES", default=500_000)
+EXTRACTION_OCR_LANGUE = env("EXTRACTION_OCR_LANGUE", default="fra")
+EXTRACTION_OCR_COTE_MAX = 3000  # pixels, l'image est réduite avant l'OCR
+
 # ==================================================
 # 🎨 CRISPY
 # ==================================================
@@ -184,6 +196,95 @@ CRISPY_TEMPLATE_PACK = "bootstrap5"
 # ==================================================
 OPENAI_API_KEY = env("OPENAI_API_KEY", default="")
 
+# Client partagé par processus (repetiteur_ia.clients_openai) : pool httpx
+# réutilisé, concurrence bornée, réessais 429/5xx avec backoff à jitter
+# Appels simultanés : client synchrone du processus, puis par boucle d'événements
+# (limites distinctes, cumulables dans un processus qui utilise les deux)
+OPENAI_MAX_CONCURRENT = env.int("OPENAI_MAX_CONCURRENT", default=32)
+OPENAI_MAX_CONCURRENT_ASYNC = env.int("OPENAI_MAX_CONCURRENT_ASYNC", default=OPENAI_MAX_CONCURRENT)
+OPENAI_MAX_CONNECTIONS = env.int("OPENAI_MAX_CONNECTIONS", default=100)
+OPENAI_MAX_KEEPALIVE = env.int("OPENAI_MAX_KEEPALIVE", default=20)
+OPENAI_MAX_RETRIES = env.int("OPENAI_MAX_RETRIES", default=3)
+OPENAI_BACKOFF_BASE = env.float("OPENAI_BACKOFF_BASE", default=0.5)
+OPENAI_BACKOFF_MAX = env.float("OPENAI_BACKOFF_MAX", default=8.0)
+OPENAI_CONNECT_TIMEOUT = env.float("OPENAI_CONNECT_TIMEOUT", default=5.0)
+OPENAI_TIMEOUT = env.float("OPENAI_TIMEOUT", default=60.0)
+# Timeouts (secondes) par type d'appel
+OPENAI_TIMEOUTS = {
+    "chat": env.float("OPENAI_TIMEOUT_CHAT", default=60.0),
+    "transcription": env.float("OPENAI_TIMEOUT_TRANSCRIPTION", default=120.0),
+    "audio": env.float("OPENAI_TIMEOUT_AUDIO", default=60.0),
+}
+
+# Cache des réponses du répétiteur (repetiteur_ia.cache_reponses) : clé exacte
+# puis similarité d'embedding >= REPONSE_CACHE_SEUIL, par niveau et matière.
+# Incrémenter REPONSE_CACHE_VERSION invalide tout le cache.
+REPONSE_CACHE_ACTIF = env.bool("REPONSE_CACHE_ACTIF", default=True)
+REPONSE_CACHE_SEUIL = env.float("REPONSE_CACHE_SEUIL", default=0.92)
+REPONSE_CACHE_TTL = env.int("REPONSE_CACHE_TTL", default=7 * 24 * 3600)
+REPONSE_CACHE_MAX_PAR_GROUPE = env.int("REPONSE_CACHE_MAX_PAR_GROUPE", default=500)
+REPONSE_CACHE_VERSION = env("REPONSE_CACHE_VERSION", default="1")
+
+# Budget en tokens (tiktoken) du prompt du répétiteur et plafonds par partie ;
+# les parties les moins prioritaires (historique, puis contenus) sont coupées d'abord
+REPETITEUR_BUDGET_TOKENS = env.int("REPETITEUR_BUDGET_TOKENS", default=3000)
+REPETITEUR_PLAFONDS_TOKENS = {
+    "question": 400,
+    "session": 300,
+    "contexte": 1200,   # ensemble des contenus pédagogiques
+    "contenu": 400,     # chaque contenu pédagogique
+    "resume": 500,      # résumé glissant de la session
+    "historique": 1200,
+}
+
+# Résumé glissant des sessions : le prompt porte le résumé et les derniers
+# échanges bruts ; le résumé est mis à jour en tâche de fond tous les N échanges
+REPETITEUR_ECHANGES_RECENTS = env.int("REPETITEUR_ECHANGES_RECENTS", default=2)
+REPETITEUR_RESUME_TOUS_LES = env.int("REPETITEUR_RESUME_TOUS_LES", default=3)
+REPETITEUR_RESUME_MAX_TOKENS = env.int("REPETITEUR_RESUME_MAX_TOKENS", default=400)
+
+# ==================================================
+# 🧠 VECTOR STORE (FAISS)
+# ==================================================
+# Index chargé une fois par processus, rechargé quand sa génération change sur disque
+VECTOR_STORE_PATH = env("VECTOR_STORE_PATH", default=str(BASE_DIR / "data" / "vector_store.faiss"))
+# Générations gardées dans versions/ pour les processus encore en train de les charger
+VECTOR_STORE_VERSIONS_CONSERVEES = env.int("VECTOR_STORE_VERSIONS_CONSERVEES", default=3)
+
+# Type d'index : "flat" (exact), "ivfpq", "hnsw" ou "auto" (Flat puis
+# VECTOR_INDEX_AUTO_TYPE dès VECTOR_INDEX_AUTO_THRESHOLD vecteurs)
+VECTOR_INDEX_TYPE = env("VECTOR_INDEX_TYPE", default="auto")
+VECTOR_INDEX_AUTO_TYPE = env("VECTOR_INDEX_AUTO_TYPE", default="ivfpq")
+VECTOR_INDEX_AUTO_THRESHOLD = env.int("VECTOR_INDEX_AUTO_THRESHOLD", default=50000)
+VECTOR_INDEX_NLIST = env.int("VECTOR_INDEX_NLIST", default=1024)
+VECTOR_INDEX_PQ_M = env.int("VECTOR_INDEX_PQ_M", default=48)
+VECTOR_INDEX_NPROBE = env.int("VECTOR_INDEX_NPROBE", default=16)
+VECTOR_INDEX_HNSW_M = env.int("VECTOR_INDEX_HNSW_M", default=32)
+VECTOR_INDEX_EF_CONSTRUCTION = env.int("VECTOR_INDEX_EF_CONSTRUCTION", default=80)
+VECTOR_INDEX_EF_SEARCH = env.int("VECTOR_INDEX_EF_SEARCH", default=64)
+# HNSW : compactage du graphe au-delà de cette part de vecteurs supprimés
+VECTOR_INDEX_TAUX_SUPPRIMES = env.float("VECTOR_INDEX_TAUX_SUPPRIMES", default=0.2)
+
+# Modèle d'embeddings partagé (chargé à la demande, une fois par processus)
+EMBEDDING_MODEL_NAME = env("EMBEDDING_MODEL_NAME", default="all-MiniLM-L6-v2")
+EMBEDDING_DEVICE = env("EMBEDDING_DEVICE", default="")  # "" = auto, "cpu", "cuda"...
+# Précharger le modèle dans le master gunicorn (--preload) : les workers forkés
+# le partagent en copy-on-write au lieu de le charger chacun
+EMBEDDING_PRELOAD = env.bool("EMBEDDING_PRELOAD", default=False)
+
+# Ingestion asynchrone : taille des lots d'encodage et délai d'agrégation (secondes)
+EMBEDDING_BATCH_SIZE = env.int("EMBEDDING_BATCH_SIZE", default=64)
+EMBEDDING_BATCH_DELAY = env.int("EMBEDDING_BATCH_DELAY", default=2)
+EMBEDDING_MAX_RETRIES = env.int("EMBEDDING_MAX_RETRIES", default=5)
+# Reconstruction complète : nombre de lignes lues par chunk depuis la base
+EMBEDDING_REBUILD_CHUNK_SIZE = env.int("EMBEDDING_REBUILD_CHUNK_SIZE", default=2000)
+# Stockage des vecteurs EmbeddingIA : float32, float16 ou int8 (quantifié)
+EMBEDDING_STORAGE_FORMAT = env("EMBEDDING_STORAGE_FORMAT", default="float32")
+# Chunks des documents pédagogiques et des cours (tokens tiktoken) : rester sous
+# la longueur max du modèle d'embedding (256 pour all-MiniLM-L6-v2)
+INDEXATION_CHUNK_TOKENS = env.int("INDEXATION_CHUNK_TOKENS", default=200)
+INDEXATION_CHUNK_CHEVAUCHEMENT = env.int("INDEXATION_CHUNK_CHEVAUCHEMENT", default=40)
+
 # ==================================================
 # ✉️ EMAIL
 # ==================================================
@@ -201,15 +302,51 @@ else:
 # ==================================================
 # 🔄 CHANNELS / REDIS
 # ==================================================
+REDIS_URL = env("REDIS_URL", default="redis://redis:6379/0")
+
+# Cache partagé par tous les workers (verrous de tâches, droits d'accès,
+# pages publiques, données de tableaux de bord) ; incrémenter CACHE_VERSION
+# invalide toutes les clés d'un coup après un déploiement incompatible
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": env("CACHE_URL", default=REDIS_URL),
+        "KEY_PREFIX": "mykarfour",
+        "VERSION": env.int("CACHE_VERSION", default=1),
+        "TIMEOUT": 300,
+    },
+}
+CACHE_DUREE_PAGES = env.int("CACHE_DUREE_PAGES", default=15 * 60)
+CACHE_DUREE_DONNEES = env.int("CACHE_DUREE_DONNEES", default=10 * 60)
+
 CHANNEL_LAYERS = {
     "default": {
         "BACKEND": "channels_redis.core.RedisChannelLayer",
         "CONFIG": {
-            "hosts": [env("REDIS_URL", default="redis://redis:6379/0")],
+            "hosts": [REDIS_URL],
         },
     },
 }
 
+# ==================================================
+# 🧵 CELERY
+# ==================================================
+CELERY_BROKER_URL = env("CELERY_BROKER_URL", default=REDIS_URL)
+# Backend de résultats requis par les chords (pipeline des soumissions de cours)
+CELERY_RESULT_BACKEND = env("CELERY_RESULT_BACKEND", default=REDIS_URL)
+CELERY_RESULT_EXPIRES = 24 * 3600
+CELERY_TIMEZONE = TIME_ZONE
+CELERY_TASK_ROUTES = {
+    "repetiteur_ia.traiter_file_indexation": {"queue": "embeddings"},
+    "repetiteur_ia.synthetiser_audio": {"queue": "audio"},
+    "repetiteur_ia.resumer_soumission": {"queue": "soumissions"},
+    "repetiteur_ia.generer_quiz_soumission": {"queue": "soumissions"},
+    "repetiteur_ia.finaliser_soumission": {"queue": "soumissions"},
+    "repetiteur_ia.reprendre_soumissions_en_attente": {"queue": "soumissions"},
+    "repetiteur_ia.extraire_texte_objet": {"queue": "extraction"},
+    "repetiteur_ia.mettre_a_jour_resume_session": {"queue": "resumes"},
+}
+
 # ==================================================
 # 🌐 SITE
 # ==================================================
@@ -5,3 +5,10 @@ settings_module = 'mykarfour_app.deployment' if os.environ.get('WEBSITE_HOSTNAME
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mykarfour_app.settings')
 
 application = get_wsgi_application()
+
+# Avec gunicorn --preload, ce module est importé par le master : le modèle
+# d'embeddings chargé ici est partagé par les workers forkés
+from django.conf import settings
+if getattr(settings, 'EMBEDDING_PRELOAD', False):
+    from repetiteur_ia.embeddings import get_sentence_model
+    get_sentence_model()
@@ -0,0 +1,186 @@
+"""
+Droits d'accès au répétiteur : cet utilisateur peut-il l'utiliser, et pour quels élèves ?
+
+Les droits sont résolus en une seule requête : les élèves liés à
+l'utilisateur (lui-même, ou ses enfants pour un parent), annotés d'un EXISTS
+sur un paiement complet couvrant la date du jour. Le résultat est mémorisé
+sur l'objet utilisateur le temps de la requête et dans le cache Django sous
+une clé datée du jour ; les signaux Paiement, Eleve et Parent.eleves l'invalident.
+
+Un élève a accès s'il a un paiement en cours, ou un abonnement actif dont la
+date de fin n'est pas dépassée (abonnement accordé sans paiement).
+"""
+from functools import wraps
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.contrib import messages
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef, Q
+from django.shortcuts import redirect
+from django.utils import timezone
+
+from paiement.models import Paiement
+from utilisateurs.models import Eleve, Parent
+
+DUREE_CACHE = 300
+ATTRIBUT_MEMO = '_droits_repetiteur'
+
+
+def _cle_cache(user_id, jour=None):
+    # La date fait partie de la clé : un abonnement qui expire ce soir n'est plus servi demain
+    return f"droits_repetiteur:{user_id}:{(jour or timezone.localdate()).isoformat()}"
+
+
+class DroitsRepetiteur:
+    """Droits résolus d'un utilisateur : élèves rattachés et, pour chacun, l'accès"""
+
+    def __init__(self, type_utilisateur, eleves):
+        self.type_utilisateur = type_utilisateur
+        # {eleve_id: {'autorise': bool, 'paiement_en_cours': bool}}
+        self.eleves = eleves
+
+    @property
+    def eleves_ids(self):
+        return list(self.eleves)
+
+    @property
+    def eleves_autorises(self):
+        return [eleve_id for eleve_id, droits in self.eleves.items() if droits['autorise']]
+
+    @property
+    def autorise(self):
+        return bool(self.eleves_autorises)
+
+    def autorise_pour(self, eleve_id):
+        return eleve_id in self.eleves and self.eleves[eleve_id]['autorise']
+
+    def paiement_en_cours(self, eleve_id):
+        return eleve_id in self.eleves and self.eleves[eleve_id]['paiement_en_cours']
+
+    @property
+    def erreur(self):
+        """Message d'erreur à afficher, ou None si l'accès est autorisé"""
+        if self.autorise:
+            return None
+        if self.type_utilisateur == 'élève':
+            if not self.eleves:
+                return "Profil élève introuvable."
+            return "Accès au répétiteur non autorisé. Vérifiez votre abonnement."
+        if self.type_utilisateur == 'parent':
+            return "Aucun enfant avec abonnement actif."
+        return "Type d'utilisateur non reconnu."
+
+
+def _resoudre(user):
+    type_utilisateur = getattr(user, 'type_utilisateur', None)
+    if type_utilisateur == 'élève':
+        filtre = Q(user=user)
+    elif type_utilisateur == 'parent':
+        filtre = Q(mes_parents__user=user)
+    else:
+        return {'type_utilisateur': type_utilisateur, 'eleves': {}}
+
+    aujourd_hui = timezone.localdate()
+    paiement_en_cours = Paiement.objects.filter(
+        eleve=OuterRef('pk'),
+        statut=Paiement.STATUT_COMPLET,
+        date_debut_abonnement__lte=aujourd_hui,
+        date_fin_abonnement__gte=aujourd_hui,
+    )
+    lignes = (
+        Eleve.objects.filter(filtre)
+        .order_by('id')
+        .annotate(paiement_en_cours=Exists(paiement_en_cours))
+        .values('id', 'abonnement_actif', 'date_fin_abonnement', 'paiement_en_cours')
+    )
+    eleves = {}
+    for ligne in lignes:
+        abonnement_valide = ligne['abonnement_actif'] and (
+            ligne['date_fin_abonnement'] is None or ligne['date_fin_abonnement'] >= aujourd_hui
+        )
+        eleves[ligne['id']] = {
+            'autorise': bool(ligne['paiement_en_cours'] or abonnement_valide),
+            'paiement_en_cours': ligne['paiement_en_cours'],
+        }
+    return {'type_utilisateur': type_utilisateur, 'eleves': eleves}
+
+
+def droits_repetiteur(user):
+    """Droits de l'utilisateur, depuis la mémoire de la requête, le cache ou la base"""
+    memo = getattr(user, ATTRIBUT_MEMO, None)
+    if memo is not None:
+        return memo
+
+    cle = _cle_cache(user.pk)
+    donnees = cache.get(cle)
+    if donnees is None:
+        donnees = _resoudre(user)
+        cache.set(cle, donnees, DUREE_CACHE)
+
+    droits = DroitsRepetiteur(donnees['type_utilisateur'], donnees['eleves'])
+    setattr(user, ATTRIBUT_MEMO, droits)
+    return droits
+
+
+def oublier_droits(user):
+    """Oublie les droits mémorisés sur l'objet utilisateur (relus au prochain appel)"""
+    if getattr(user, ATTRIBUT_MEMO, None) is not None:
+        delattr(user, ATTRIBUT_MEMO)
+
+
+def invalider_droits(*user_ids):
+    cache.delete_many([_cle_cache(user_id) for user_id in user_ids])
+
+
+def invalider_droits_eleve(eleve_id):
+    """Invalide les droits de l'élève et de ses parents"""
+    user_ids = list(Eleve.objects.filter(id=eleve_id).values_list('user_id', flat=True))
+    user_ids += Parent.objects.filter(eleves=eleve_id).values_list('user_id', flat=True)
+    invalider_droits(*user_ids)
+
+
+def refus_acces_repetiteur(request):
+    """Redirection à appliquer si l'utilisateur n'a pas accès, sinon None"""
+    user = request.user
+    if not user.is_authenticated:
+        messages.error(request, "Accès non autorisé.")
+        return redirect('accueil')
+
+    droits = droits_repetiteur(user)
+    if droits.autorise:
+        return None
+    if droits.type_utilisateur == 'élève':
+        if not droits.eleves:
+            messages.error(request, droits.erreur)
+            return redirect('profil')
+        messages.info(request, "Souscrivez pour accéder au répétiteur IA.")
+        return redirect('abonnements')
+    if droits.type_utilisateur == 'parent':
+        messages.info(request, droits.erreur)
+        return redirect('profil')
+    messages.error(request, "Accès non autorisé.")
+    return redirect('accueil')
+
+
+def acces_repetiteur_requis(vue):
+    """
+    Décorateur de vue (ou de dispatch via method_decorator) réservant l'accès
+    aux abonnés ; s'adapte aux vues async
+    """
+    if asyncio.iscoroutinefunction(vue):
+        @wraps(vue)
+        async def vue_async(request, *args, **kwargs):
+            refus = await sync_to_async(refus_acces_repetiteur)(request)
+            if refus is not None:
+                return refus
+            return await vue(request, *args, **kwargs)
+        return vue_async
+
+    @wraps(vue)
+    def vue_sync(request, *args, **kwargs):
+        refus = refus_acces_repetiteur(request)
+        if refus is not None:
+            return refus
+        return vue(request, *args, **kwargs)
+    return vue_sync
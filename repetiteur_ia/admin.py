@@ -3,7 +3,9 @@ from django.contrib import admin
 from .models import (
     SessionIA, MessageIA, EmbeddingIA, Notification,
     SessionRevisionProgrammee, SoumissionCours, PlanificationAutomatique,
-    HistoriqueChat, DocumentPedagogique, ProgressionRevision, RappelRevision, HistoriqueConversation
+    HistoriqueChat, DocumentPedagogique, ProgressionRevision, RappelRevision, HistoriqueConversation,
+    IndexationEnAttente, ReponseCacheIA, StatistiqueCacheReponse, TexteExtrait,
+    ChunkIndexe
 )
 
 @admin.register(SessionIA)
@@ -26,8 +28,41 @@ class MessageIAAdmin(admin.ModelAdmin):
 
 @admin.register(EmbeddingIA)
 class EmbeddingIAAdmin(admin.ModelAdmin):
-    list_display = ['message', 'created_at', 'updated_at']
-    readonly_fields = ['created_at', 'updated_at']
+    list_display = ['message', 'format_vecteur', 'created_at', 'updated_at']
+    list_filter = ['format_vecteur']
+    exclude = ['vecteur_binaire']
+    readonly_fields = ['format_vecteur', 'echelle', 'created_at', 'updated_at']
+
+@admin.register(IndexationEnAttente)
+class IndexationEnAttenteAdmin(admin.ModelAdmin):
+    list_display = ['type_source', 'objet_id', 'tentatives', 'date_creation']
+    list_filter = ['type_source']
+    readonly_fields = ['date_creation']
+
+@admin.register(ReponseCacheIA)
+class ReponseCacheIAAdmin(admin.ModelAdmin):
+    list_display = ['question', 'niveau', 'matiere', 'nb_hits', 'tokens', 'dernier_acces']
+    list_filter = ['niveau', 'matiere', 'version_prompt']
+    search_fields = ['question', 'reponse']
+    readonly_fields = ['cle', 'version_prompt', 'question_normalisee', 'date_creation', 'dernier_acces']
+    exclude = ['vecteur_binaire']
+
+@admin.register(StatistiqueCacheReponse)
+class StatistiqueCacheReponseAdmin(admin.ModelAdmin):
+    list_display = ['date', 'requetes', 'hits_exacts', 'hits_semantiques', 'taux_hit', 'tokens_economises']
+
+@admin.register(ChunkIndexe)
+class ChunkIndexeAdmin(admin.ModelAdmin):
+    list_display = ['type_source', 'objet_id', 'position', 'partition', 'nb_tokens', 'date_indexation']
+    list_filter = ['type_source', 'partition']
+    readonly_fields = ['empreinte', 'date_indexation']
+
+@admin.register(TexteExtrait)
+class TexteExtraitAdmin(admin.ModelAdmin):
+    list_display = ['empreinte', 'extracteur', 'nb_pages', 'tronque', 'taille_fichier', 'dernier_acces']
+    list_filter = ['extracteur', 'tronque']
+    search_fields = ['empreinte', 'texte']
+    readonly_fields = ['empreinte', 'date_creation', 'dernier_acces']
 
 @admin.register(Notification)
 class NotificationAdmin(admin.ModelAdmin):
@@ -46,7 +81,7 @@ class SessionRevisionProgrammeeAdmin(admin.ModelAdmin):
     list_display = ['titre', 'eleve', 'matiere', 'date_programmation', 'statut', 'duree_prevue']
     list_filter = ['statut', 'date_programmation', 'emploi_temps__matiere']
     search_fields = ['titre', 'eleve__user__username', 'objectifs']
-    readonly_fields = ['date_creation', 'date_modification']
+    readonly_fields = ['date_creation', 'date_modification', 'resume_jusqu_a', 'date_resume']
     list_editable = ['statut']
     
     def matiere(self, obj):
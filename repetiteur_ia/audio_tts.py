@@ -0,0 +1,167 @@
+"""
+Stockage des audios TTS du répétiteur, adressé par contenu.
+
+Le fichier d'un texte est rangé sous MEDIA_ROOT/<AUDIO_TTS_SOUS_DOSSIER> selon
+le sha256 de (modèle, voix, texte) : un même texte n'est synthétisé qu'une
+fois, quel que soit l'élève. La taille totale est bornée (éviction des
+fichiers les moins récemment servis) et la synthèse peut être différée à une
+tâche Celery pour que le chat réponde sans attendre l'audio.
+"""
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.urls import reverse
+
+from .clients_openai import delai_openai, get_client_openai
+
+MODELE_TTS = "tts-1"
+VOIX_TTS = "alloy"
+LONGUEUR_MAX_TEXTE = 1000
+LONGUEUR_MIN_TEXTE = 10
+
+
+def _parametre(nom, defaut):
+    return getattr(settings, nom, defaut)
+
+
+def dossier_audio():
+    return Path(settings.MEDIA_ROOT) / _parametre('AUDIO_TTS_SOUS_DOSSIER', 'tts')
+
+
+def texte_a_synthetiser(texte):
+    """Texte effectivement envoyé au TTS (None si trop court)"""
+    texte = (texte or '').strip()
+    if len(texte) < LONGUEUR_MIN_TEXTE:
+        return None
+    return texte[:LONGUEUR_MAX_TEXTE]
+
+
+def empreinte_audio(texte, voix=VOIX_TTS, modele=MODELE_TTS):
+    return hashlib.sha256(f"{modele}|{voix}|{texte}".encode('utf-8')).hexdigest()
+
+
+def chemin_audio(empreinte):
+    # Deux niveaux de sous-dossiers pour éviter des répertoires géants
+    return dossier_audio() / empreinte[:2] / f"{empreinte}.mp3"
+
+
+def url_audio(empreinte):
+    return reverse('audio_tts', args=[empreinte])
+
+
+def audio_disponible(empreinte):
+    chemin = chemin_audio(empreinte)
+    if not chemin.exists():
+        return False
+    marquer_utilisation(chemin)
+    return True
+
+
+def marquer_utilisation(chemin):
+    """La date de modification sert d'horodatage LRU pour l'éviction"""
+    try:
+        os.utime(chemin)
+    except OSError:
+        pass
+
+
+def synthetiser(texte, voix=VOIX_TTS, modele=MODELE_TTS):
+    """
+    Synthétise le texte s'il n'est pas déjà en cache et retourne son empreinte
+    (None si le texte est trop court). Écriture atomique : un lecteur ne voit
+    jamais de fichier partiel.
+    """
+    texte = texte_a_synthetiser(texte)
+    if texte is None:
+        return None
+    empreinte = empreinte_audio(texte, voix, modele)
+    if audio_disponible(empreinte):
+        return empreinte
+
+    response = get_client_openai().audio.speech.create(
+        model=modele,
+        voice=voix,
+        input=texte,
+        timeout=delai_openai('audio')
+    )
+    enregistrer_audio(empreinte, response.content)
+    return empreinte
+
+
+def enregistrer_audio(empreinte, contenu):
+    chemin = chemin_audio(empreinte)
+    chemin.parent.mkdir(parents=True, exist_ok=True)
+    descripteur, chemin_tmp = tempfile.mkstemp(dir=chemin.parent, suffix='.part')
+    try:
+        with os.fdopen(descripteur, 'wb') as fichier:
+            fichier.write(contenu)
+        os.replace(chemin_tmp, chemin)
+    except BaseException:
+        if os.path.exists(chemin_tmp):
+            os.remove(chemin_tmp)
+        raise
+    evincer()
+
+
+def evincer(taille_max=None):
+    """
+    Supprime les audios les moins récemment servis tant que le dossier dépasse
+    AUDIO_TTS_TAILLE_MAX ; redescend à 90 % pour ne pas évincer à chaque écriture
+    """
+    taille_max = taille_max or _parametre('AUDIO_TTS_TAILLE_MAX', 500 * 1024 * 1024)
+    fichiers = []
+    total = 0
+    for sous_dossier in dossier_audio().glob('*'):
+        if not sous_dossier.is_dir():
+            continue
+        for entree in os.scandir(sous_dossier):
+            if entree.name.endswith('.mp3'):
+                stat = entree.stat()
+                fichiers.append((stat.st_mtime, stat.st_size, entree.path))
+                total += stat.st_size
+    if total <= taille_max:
+        return 0
+
+    cible = taille_max * 0.9
+    supprimes = 0
+    for _, taille, chemin in sorted(fichiers):
+        if total <= cible:
+            break
+        try:
+            os.remove(chemin)
+            total -= taille
+            supprimes += 1
+        except FileNotFoundError:
+            pass
+    print(f"🧹 Audios TTS : {supprimes} fichier(s) évincé(s)")
+    return supprimes
+
+
+def programmer_audio(texte, differe=None):
+    """
+    Retourne ``{'url': ..., 'pret': bool}`` (ou None si rien à synthétiser).
+    En mode différé l'URL est renvoyée tout de suite et la synthèse part en
+    tâche Celery ; le navigateur interroge l'URL jusqu'à ce que l'audio existe.
+    """
+    texte = texte_a_synthetiser(texte)
+    if texte is None:
+        return None
+    empreinte = empreinte_audio(texte)
+    if audio_disponible(empreinte):
+        return {'url': url_audio(empreinte), 'pret': True}
+
+    if differe is None:
+        differe = _parametre('AUDIO_TTS_DIFFERE', True)
+    if not differe:
+        synthetiser(texte)
+        return {'url': url_audio(empreinte), 'pret': True}
+
+    # Une seule tâche par texte même si plusieurs élèves reçoivent la même réponse
+    if cache.add(f"tts:en_cours:{empreinte}", True, timeout=300):
+        from .tasks_audio import synthetiser_audio
+        synthetiser_audio.delay(texte)
+    return {'url': url_audio(empreinte), 'pret': False}
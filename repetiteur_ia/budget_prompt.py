@@ -0,0 +1,114 @@
+"""
+Mesure et budget en tokens des prompts envoyés au modèle.
+
+Les parties d'un prompt sont allouées par ordre de priorité : chacune reçoit
+au plus son plafond et ce qui reste du budget total, si bien que les parties
+les moins prioritaires (allouées en dernier) sont tronquées les premières.
+"""
+from functools import lru_cache
+
+from django.conf import settings
+
+MARQUE_TRONCATURE = " […]"
+
+
+@lru_cache(maxsize=8)
+def encodage_tokens(modele=None):
+    """Encodage tiktoken du modèle (cl100k_base à défaut)"""
+    import tiktoken
+
+    if modele:
+        try:
+            return tiktoken.encoding_for_model(modele)
+        except KeyError:
+            pass
+    return tiktoken.get_encoding("cl100k_base")
+
+
+def compter_tokens(texte, modele=None):
+    return len(encodage_tokens(modele).encode(texte or ''))
+
+
+def tronquer_tokens(texte, max_tokens, modele=None, garder='debut'):
+    """
+    Coupe ``texte`` à ``max_tokens`` ; ``garder='fin'`` conserve la fin
+    (ex : les échanges les plus récents d'un historique)
+    """
+    if not texte or max_tokens <= 0:
+        return ''
+    encodage = encodage_tokens(modele)
+    tokens = encodage.encode(texte)
+    if len(tokens) <= max_tokens:
+        return texte
+    # La marque de troncature compte dans le plafond
+    max_tokens -= len(encodage.encode(MARQUE_TRONCATURE))
+    if max_tokens <= 0:
+        return ''
+    if garder == 'fin':
+        return MARQUE_TRONCATURE.strip() + ' ' + encodage.decode(tokens[-max_tokens:]).lstrip()
+    return encodage.decode(tokens[:max_tokens]).rstrip() + MARQUE_TRONCATURE
+
+
+class BudgetPrompt:
+    """Répartit un budget de tokens entre les parties d'un prompt"""
+
+    def __init__(self, total, modele=None):
+        self.total = total
+        self.modele = modele
+        self.restant = total
+        self.comptes = {}
+
+    def _consommer(self, nom, nb_tokens):
+        self.comptes[nom] = self.comptes.get(nom, 0) + nb_tokens
+        self.restant -= nb_tokens
+
+    def reserver(self, nom, texte):
+        """Partie incompressible (consignes, gabarit) : comptée telle quelle"""
+        self._consommer(nom, compter_tokens(texte, self.modele))
+        return texte
+
+    def allouer(self, nom, texte, plafond=None, garder='debut'):
+        """Partie compressible : tronquée à min(plafond, budget restant)"""
+        if not texte:
+            return ''
+        limite = max(self.restant, 0) if plafond is None else min(plafond, max(self.restant, 0))
+        texte = tronquer_tokens(texte, limite, self.modele, garder)
+        self._consommer(nom, compter_tokens(texte, self.modele))
+        return texte
+
+    def allouer_liste(self, nom, textes, plafond=None, plafond_element=None):
+        """
+        Éléments classés par pertinence : gardés dans l'ordre tant qu'ils
+        tiennent, les derniers (les moins pertinents) sont abandonnés d'abord
+        """
+        limite = max(self.restant, 0) if plafond is None else min(plafond, max(self.restant, 0))
+        gardes = []
+        utilises = 0
+        for texte in textes:
+            if plafond_element:
+                texte = tronquer_tokens(texte, plafond_element, self.modele)
+            nb_tokens = compter_tokens(texte, self.modele)
+            if utilises + nb_tokens > limite:
+                break
+            gardes.append(texte)
+            utilises += nb_tokens
+        self._consommer(nom, utilises)
+        return gardes
+
+    def resume(self):
+        detail = ', '.join(f"{nom} {nb}" for nom, nb in self.comptes.items())
+        return f"{self.total - self.restant}/{self.total} tokens ({detail})"
+
+
+def budget_repetiteur():
+    """Budget total et plafonds par partie du prompt du répétiteur (settings)"""
+    plafonds = {
+        'question': 400,
+        'session': 300,
+        'contexte': 1200,
+        'contenu': 400,
+        'resume': 500,
+        'historique': 1200,
+    }
+    plafonds.update(getattr(settings, 'REPETITEUR_PLAFONDS_TOKENS', {}))
+    return getattr(settings, 'REPETITEUR_BUDGET_TOKENS', 3000), plafonds
@@ -0,0 +1,308 @@
+"""
+Cache des réponses du répétiteur.
+
+Une question déjà posée au même niveau, dans la même matière, est servie
+depuis la base au lieu de relancer une complétion : d'abord par clé exacte
+(question normalisée), puis par similarité d'embedding au-delà d'un seuil.
+Les entrées expirent (TTL), sont évincées par LRU au-delà d'un plafond par
+groupe niveau/matière, et sont ignorées dès que le prompt du répétiteur change.
+
+La réponse mise en cache est construite à partir de la question seule :
+question, niveau, matière et contenus pédagogiques partagés retrouvés, sans
+historique, résumé, objectifs de session ni contenus propres à l'élève (voir
+``contexte_partage``). L'empreinte de ces contenus partagés fait partie de
+la clé exacte et filtre aussi la recherche par similarité. Seule une question
+qui renvoie à l'échange en cours (« et pourquoi ? ») contourne le cache ; elle
+est comptée comme telle dans les statistiques.
+"""
+import hashlib
+import json
+import re
+import unicodedata
+from datetime import timedelta
+from functools import lru_cache
+
+import numpy as np
+from django.conf import settings
+from django.db import IntegrityError
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import ReponseCacheIA, StatistiqueCacheReponse
+
+
+def _parametre(nom, defaut):
+    return getattr(settings, nom, defaut)
+
+
+# Incrémenté quand la composition de la clé change : les entrées antérieures
+# (ex. réponses liées au contexte d'un élève) ne sont plus servies
+FORMAT_CLE = 3
+
+# Tournures qui renvoient à l'échange en cours : la réponse dépend de l'historique
+MARQUEURS_SUITE = (
+    'tu as dit', 'tu viens de', 'ta reponse', 'ton explication', 'precedent', 'precedente',
+    'plus haut', 'ci dessus', 'pas compris', 'comprends pas', 'autrement', 'encore',
+    'redis', 'reexplique', 'ca', 'cela', 'ceci', 'celui', 'celle', 'ceux', 'celles',
+)
+DEBUTS_SUITE = ('et ', 'mais ', 'donc ', 'alors ', 'ok ', 'oui ', 'non ', 'merci ')
+
+
+def cache_actif():
+    return _parametre('REPONSE_CACHE_ACTIF', True)
+
+
+def normaliser_question(question):
+    """Minuscules, sans accents ni ponctuation, espaces réduits"""
+    texte = unicodedata.normalize('NFKD', question.lower())
+    texte = ''.join(c for c in texte if not unicodedata.combining(c))
+    texte = re.sub(r"[^\w\s]", ' ', texte)
+    return re.sub(r'\s+', ' ', texte).strip()
+
+
+@lru_cache(maxsize=1)
+def version_prompt():
+    """
+    Empreinte du gabarit de prompt et des paramètres du modèle : toute
+    modification invalide de fait les réponses mises en cache avec l'ancienne
+    """
+    from .budget_prompt import budget_repetiteur
+    from .utils import PARAMETRES_REPETITEUR, construire_messages_repetiteur
+
+    gabarit = construire_messages_repetiteur(
+        "{question}",
+        contexte_session={'matiere': "{matiere}", 'objectifs': "{objectifs}", 'nb_soumissions': 0},
+        niveau_eleve="{niveau}",
+        historique_conversation="{historique}",
+        resume_conversation="{resume}",
+        journaliser=False,
+    )
+    contenu = json.dumps(
+        [gabarit, PARAMETRES_REPETITEUR, budget_repetiteur(), _parametre('REPONSE_CACHE_VERSION', '1'), FORMAT_CLE],
+        sort_keys=True, ensure_ascii=False,
+    )
+    return hashlib.sha256(contenu.encode('utf-8')).hexdigest()[:16]
+
+
+def question_autonome(question):
+    """Vrai si la question se comprend sans l'échange qui la précède"""
+    texte = normaliser_question(question)
+    if len(texte.split()) < _parametre('REPONSE_CACHE_MOTS_MIN', 4):
+        return False
+    if f"{texte} ".startswith(DEBUTS_SUITE):
+        return False
+    mots = f" {texte} "
+    return not any(f" {marqueur} " in mots for marqueur in MARQUEURS_SUITE)
+
+
+def empreinte_contexte(contenus_partages):
+    """Empreinte des contenus pédagogiques partagés sur lesquels repose la réponse"""
+    contenu = json.dumps(list(contenus_partages or []), ensure_ascii=False)
+    return hashlib.sha256(contenu.encode('utf-8')).hexdigest()[:16]
+
+
+def contexte_partage(question, contexte_pedagogique=None, contexte_session=None,
+                     historique_conversation="", resume_conversation=""):
+    """
+    Contexte de la version partageable de la réponse, ou None si elle doit
+    contourner le cache (cache désactivé, ou question qui renvoie à
+    l'échange en cours alors qu'il y a un historique).
+
+    Retourne ``{'contexte_pedagogique', 'contexte_session', 'empreinte'}`` :
+    les contenus partagés retrouvés (jamais ceux de l'élève) et la seule
+    matière de la session, à passer à construire_messages_repetiteur sans
+    historique ni résumé.
+    """
+    if not cache_actif():
+        return None
+    contexte_pedagogique = contexte_pedagogique or {}
+    historique = (
+        historique_conversation or resume_conversation
+        or contexte_pedagogique.get('historique_conversation')
+    )
+    if historique and not question_autonome(question):
+        return None
+    contenus = contexte_pedagogique.get('contenus_partages')
+    if contenus is None:
+        contenus = contexte_pedagogique.get('contenus_similaires') or []
+    contenus = list(contenus)[:3]  # ce que retient construire_messages_repetiteur
+    matiere = (contexte_session or {}).get('matiere')
+    return {
+        'contexte_pedagogique': {'contenus_similaires': contenus},
+        'contexte_session': {'matiere': matiere} if matiere else None,
+        'empreinte': empreinte_contexte(contenus),
+    }
+
+
+def _cle(niveau, matiere, question_normalisee, contexte=''):
+    brut = '|'.join([version_prompt(), niveau, matiere, contexte, question_normalisee])
+    return hashlib.sha256(brut.encode('utf-8')).hexdigest()
+
+
+def _vecteur_question(question_normalisee):
+    from .embeddings import embeddings
+
+    vecteur = np.asarray(embeddings.embed_query(question_normalisee), dtype=np.float32)
+    norme = np.linalg.norm(vecteur)
+    return vecteur / norme if norme else vecteur
+
+
+def _entrees_valides(niveau, matiere, contexte):
+    limite = timezone.now() - timedelta(seconds=_parametre('REPONSE_CACHE_TTL', 7 * 24 * 3600))
+    return ReponseCacheIA.objects.filter(
+        version_prompt=version_prompt(), niveau=niveau, matiere=matiere, contexte=contexte,
+        dernier_acces__gte=limite,
+    )
+
+
+def _compter(hit_exact=False, hit_semantique=False, tokens=0, contourne=False):
+    aujourdhui = timezone.localdate()
+    mises_a_jour = {
+        'requetes': F('requetes') + 1,
+        'hits_exacts': F('hits_exacts') + int(hit_exact),
+        'hits_semantiques': F('hits_semantiques') + int(hit_semantique),
+        'contournements': F('contournements') + int(contourne),
+        'tokens_economises': F('tokens_economises') + tokens,
+    }
+    if not StatistiqueCacheReponse.objects.filter(date=aujourdhui).update(**mises_a_jour):
+        try:
+            StatistiqueCacheReponse.objects.create(date=aujourdhui)
+        except IntegrityError:
+            pass  # créée entre-temps par un autre worker
+        StatistiqueCacheReponse.objects.filter(date=aujourdhui).update(**mises_a_jour)
+
+
+def _servir(entree, hit_exact):
+    ReponseCacheIA.objects.filter(pk=entree.pk).update(
+        nb_hits=F('nb_hits') + 1, dernier_acces=timezone.now()
+    )
+    _compter(hit_exact=hit_exact, hit_semantique=not hit_exact, tokens=entree.tokens)
+
+
+def chercher_reponse(question, niveau, matiere='', contexte=''):
+    """
+    Retourne ``(entree, vecteur)`` : l'entrée ReponseCacheIA servie (ou None)
+    et l'embedding de la question, à repasser à enregistrer_reponse en cas de miss.
+    ``contexte`` est l'empreinte de contexte_partage ; None = requête qui
+    contourne le cache, comptée comme telle.
+    """
+    if not cache_actif():
+        return None, None
+    try:
+        if contexte is None:
+            _compter(contourne=True)
+            return None, None
+
+        matiere = matiere or ''
+        question_normalisee = normaliser_question(question)
+
+        entree = _entrees_valides(niveau, matiere, contexte).filter(
+            cle=_cle(niveau, matiere, question_normalisee, contexte)
+        ).first()
+        if entree:
+            _servir(entree, hit_exact=True)
+            return entree, None
+
+        vecteur = _vecteur_question(question_normalisee)
+        candidats = list(
+            _entrees_valides(niveau, matiere, contexte)
+            .exclude(vecteur_binaire=None)
+            .order_by('-dernier_acces')
+            .only('id', 'reponse', 'tokens', 'vecteur_binaire')
+            [:_parametre('REPONSE_CACHE_MAX_PAR_GROUPE', 500)]
+        )
+        candidats = [c for c in candidats if c.vector.shape == vecteur.shape]
+        if candidats:
+            similarites = np.vstack([c.vector for c in candidats]) @ vecteur
+            meilleur = int(np.argmax(similarites))
+            if similarites[meilleur] >= _parametre('REPONSE_CACHE_SEUIL', 0.92):
+                _servir(candidats[meilleur], hit_exact=False)
+                return candidats[meilleur], vecteur
+
+        _compter()
+        return None, vecteur
+    except Exception as e:
+        print(f"⚠️ Cache réponses indisponible (lecture): {e}")
+        return None, None
+
+
+def enregistrer_reponse(question, niveau, matiere, reponse, tokens=0, vecteur=None, contexte=''):
+    """Met la réponse en cache puis applique l'éviction TTL/LRU du groupe (rien si ``contexte`` est None)"""
+    if not cache_actif() or not reponse or contexte is None:
+        return None
+    try:
+        matiere = matiere or ''
+        question_normalisee = normaliser_question(question)
+        if vecteur is None:
+            vecteur = _vecteur_question(question_normalisee)
+        entree, _ = ReponseCacheIA.objects.update_or_create(
+            cle=_cle(niveau, matiere, question_normalisee, contexte),
+            defaults={
+                'version_prompt': version_prompt(),
+                'niveau': niveau,
+                'matiere': matiere,
+                'contexte': contexte,
+                'question': question,
+                'question_normalisee': question_normalisee,
+                'reponse': reponse,
+                'vecteur_binaire': np.asarray(vecteur, dtype=np.float32).tobytes(),
+                'tokens': tokens or 0,
+                'dernier_acces': timezone.now(),
+            },
+        )
+        evincer(niveau, matiere)
+        return entree
+    except Exception as e:
+        print(f"⚠️ Cache réponses indisponible (écriture): {e}")
+        return None
+
+
+def evincer(niveau, matiere):
+    """Supprime, pour un groupe, les entrées expirées, d'une autre version du prompt ou au-delà du plafond LRU"""
+    groupe = ReponseCacheIA.objects.filter(niveau=niveau, matiere=matiere)
+    limite = timezone.now() - timedelta(seconds=_parametre('REPONSE_CACHE_TTL', 7 * 24 * 3600))
+    groupe.exclude(version_prompt=version_prompt()).delete()
+    groupe.filter(dernier_acces__lt=limite).delete()
+
+    plafond = _parametre('REPONSE_CACHE_MAX_PAR_GROUPE', 500)
+    ids_exces = list(
+        groupe.order_by('-dernier_acces').values_list('id', flat=True)[plafond:]
+    )
+    if ids_exces:
+        ReponseCacheIA.objects.filter(id__in=ids_exces).delete()
+
+
+def invalider_cache(niveau=None, matiere=None):
+    """Vide le cache (entièrement, ou pour un niveau et/ou une matière)"""
+    entrees = ReponseCacheIA.objects.all()
+    if niveau is not None:
+        entrees = entrees.filter(niveau=niveau)
+    if matiere is not None:
+        entrees = entrees.filter(matiere=matiere)
+    return entrees.delete()[0]
+
+
+def purger_cache():
+    """Supprime toutes les entrées expirées ou d'une ancienne version du prompt"""
+    limite = timezone.now() - timedelta(seconds=_parametre('REPONSE_CACHE_TTL', 7 * 24 * 3600))
+    obsoletes = ReponseCacheIA.objects.exclude(version_prompt=version_prompt()).delete()[0]
+    expirees = ReponseCacheIA.objects.filter(dernier_acces__lt=limite).delete()[0]
+    return obsoletes + expirees
+
+
+def statistiques_cache(jours=30):
+    """Taux de hit, contournements et tokens économisés sur les ``jours`` derniers jours"""
+    depuis = timezone.localdate() - timedelta(days=jours - 1)
+    totaux = StatistiqueCacheReponse.objects.filter(date__gte=depuis).aggregate(
+        requetes=Sum('requetes'),
+        hits_exacts=Sum('hits_exacts'),
+        hits_semantiques=Sum('hits_semantiques'),
+        contournements=Sum('contournements'),
+        tokens_economises=Sum('tokens_economises'),
+    )
+    totaux = {cle: valeur or 0 for cle, valeur in totaux.items()}
+    hits = totaux['hits_exacts'] + totaux['hits_semantiques']
+    totaux['hits'] = hits
+    totaux['taux_hit'] = hits / totaux['requetes'] if totaux['requetes'] else 0.0
+    totaux['entrees'] = ReponseCacheIA.objects.filter(version_prompt=version_prompt()).count()
+    return totaux
@@ -39,4 +39,22 @@ beat_schedule = {
             'queue': 'planning',
         }
     },
+    
+    # Filet de sécurité : drainer la file d'indexation si un déclenchement a été perdu
+    'drainer-file-indexation': {
+        'task': 'repetiteur_ia.traiter_file_indexation',
+        'schedule': 60.0,  # Toutes les minutes
+        'options': {
+            'queue': 'embeddings',
+        }
+    },
+
+    # Filet de sécurité : programmer les soumissions restées en attente (broker indisponible à l'envoi)
+    'reprendre-soumissions-en-attente': {
+        'task': 'repetiteur_ia.reprendre_soumissions_en_attente',
+        'schedule': 60.0,  # Toutes les minutes
+        'options': {
+            'queue': 'soumissions',
+        }
+    },
 }
@@ -0,0 +1,401 @@
+"""
+Clients OpenAI partagés par processus.
+
+Un seul client synchrone (et un client async par boucle d'événements) réutilise
+le même pool de connexions httpx : plus de handshake TLS à chaque appel. Le
+transport HTTP borne le nombre d'appels simultanés, réessaie les 429/5xx avec
+un backoff à jitter et tient les métriques (file d'attente, pool).
+
+Les limites de concurrence sont indépendantes : OPENAI_MAX_CONCURRENT pour le
+client synchrone du processus, OPENAI_MAX_CONCURRENT_ASYNC pour *chaque* boucle
+d'événements (un sémaphore asyncio ne peut pas être partagé entre boucles, ni
+un sémaphore de threads attendu sans bloquer la boucle). Un processus qui
+utilise les deux peut donc avoir jusqu'à la somme des deux limites en vol.
+Une place attendue plus de OPENAI_TIMEOUT secondes lève ``httpx.PoolTimeout``,
+que le client OpenAI traite comme tout autre délai dépassé.
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+import weakref
+
+import httpx
+import openai
+from django.conf import settings
+
+# Statuts réessayés : limitation de débit et erreurs serveur transitoires
+STATUTS_REESSAYABLES = {408, 409, 429, 500, 502, 503, 504}
+# Erreurs réseau survenues avant l'envoi de la requête : réessai sans risque
+ERREURS_REESSAYABLES = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+def _parametre(nom, defaut):
+    return getattr(settings, nom, defaut)
+
+
+def _limite_async():
+    """Appels simultanés autorisés par boucle d'événements"""
+    return _parametre('OPENAI_MAX_CONCURRENT_ASYNC', _parametre('OPENAI_MAX_CONCURRENT', 32))
+
+
+def delai_openai(type_appel='chat'):
+    """Timeout (secondes) d'un type d'appel : chat, transcription ou audio"""
+    delais = _parametre('OPENAI_TIMEOUTS', {})
+    return delais.get(type_appel, _parametre('OPENAI_TIMEOUT', 60))
+
+
+def _timeout_defaut():
+    return httpx.Timeout(delai_openai('chat'), connect=_parametre('OPENAI_CONNECT_TIMEOUT', 5))
+
+
+def _limites_pool():
+    return httpx.Limits(
+        max_connections=_parametre('OPENAI_MAX_CONNECTIONS', 100),
+        max_keepalive_connections=_parametre('OPENAI_MAX_KEEPALIVE', 20),
+        keepalive_expiry=_parametre('OPENAI_KEEPALIVE_EXPIRY', 30),
+    )
+
+
+def _delai_reessai(tentative, response=None):
+    """
+    Backoff exponentiel à jitter complet, en respectant Retry-After s'il est
+    fourni. Retourne None (pas de réessai) si Retry-After dépasse
+    OPENAI_BACKOFF_MAX : mieux vaut rendre l'erreur que bloquer la requête.
+    """
+    maximum = _parametre('OPENAI_BACKOFF_MAX', 8.0)
+    delai = random.uniform(0, min(maximum, _parametre('OPENAI_BACKOFF_BASE', 0.5) * (2 ** tentative)))
+    if response is not None:
+        try:
+            retry_after = float(response.headers.get('retry-after', 0))
+        except ValueError:
+            retry_after = 0
+        if retry_after > maximum:
+            return None
+        delai = max(delai, retry_after)
+    return delai
+
+
+class MetriquesOpenAI:
+    """Compteurs par processus des appels OpenAI"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reinitialiser()
+
+    def reinitialiser(self):
+        with self._lock:
+            self.appels = 0
+            self.en_cours = 0
+            self.en_attente = 0
+            self.pic_en_cours = 0
+            self.attente_totale = 0.0
+            self.attente_max = 0.0
+            self.reessais = 0
+            self.erreurs = {}
+
+    def debut_attente(self):
+        with self._lock:
+            self.en_attente += 1
+
+    def attente_abandonnee(self):
+        with self._lock:
+            self.en_attente -= 1
+
+    def debut_appel(self, attente):
+        with self._lock:
+            self.en_attente -= 1
+            self.appels += 1
+            self.en_cours += 1
+            self.pic_en_cours = max(self.pic_en_cours, self.en_cours)
+            self.attente_totale += attente
+            self.attente_max = max(self.attente_max, attente)
+
+    def fin_appel(self):
+        with self._lock:
+            self.en_cours -= 1
+
+    def reessai(self):
+        with self._lock:
+            self.reessais += 1
+
+    def erreur(self, cle):
+        with self._lock:
+            self.erreurs[cle] = self.erreurs.get(cle, 0) + 1
+
+    def instantane(self):
+        with self._lock:
+            return {
+                'pid': os.getpid(),
+                'appels': self.appels,
+                'en_cours': self.en_cours,
+                'en_attente': self.en_attente,
+                'pic_en_cours': self.pic_en_cours,
+                'limite_concurrence': _parametre('OPENAI_MAX_CONCURRENT', 32),
+                'limite_concurrence_par_boucle': _limite_async(),
+                'attente_moyenne_ms': round(self.attente_totale / self.appels * 1000, 1) if self.appels else 0.0,
+                'attente_max_ms': round(self.attente_max * 1000, 1),
+                'reessais': self.reessais,
+                'erreurs': dict(self.erreurs),
+            }
+
+
+metriques = MetriquesOpenAI()
+
+
+def _connexions_pool(transport):
+    """Connexions ouvertes / actives du pool httpcore (API interne, au mieux)"""
+    pool = getattr(transport, '_pool', None)
+    connexions = getattr(pool, 'connections', None)
+    if connexions is None:
+        return None
+    return {
+        'ouvertes': len(connexions),
+        'actives': sum(1 for c in connexions if not c.is_idle()),
+        'max': _parametre('OPENAI_MAX_CONNECTIONS', 100),
+    }
+
+
+class _FluxLibere(httpx.SyncByteStream):
+    """Corps de réponse qui libère la place de concurrence à sa fermeture (streams compris)"""
+
+    def __init__(self, flux, liberer):
+        self._flux = flux
+        self._liberer = liberer
+
+    def __iter__(self):
+        yield from self._flux
+
+    def close(self):
+        try:
+            self._flux.close()
+        finally:
+            self._liberer()
+
+
+class _FluxLibereAsync(httpx.AsyncByteStream):
+    def __init__(self, flux, liberer):
+        self._flux = flux
+        self._liberer = liberer
+
+    async def __aiter__(self):
+        async for morceau in self._flux:
+            yield morceau
+
+    async def aclose(self):
+        try:
+            await self._flux.aclose()
+        finally:
+            self._liberer()
+
+
+def _liberation_unique(semaphore):
+    libere = threading.Event()
+
+    def liberer():
+        if not libere.is_set():
+            libere.set()
+            semaphore.release()
+            metriques.fin_appel()
+    return liberer
+
+
+class TransportOpenAI(httpx.BaseTransport):
+    """Transport httpx : concurrence bornée, réessais à jitter, métriques"""
+
+    def __init__(self, semaphore):
+        self.transport = httpx.HTTPTransport(limits=_limites_pool())
+        self.semaphore = semaphore
+
+    def handle_request(self, request):
+        metriques.debut_attente()
+        debut = time.monotonic()
+        try:
+            acquis = self.semaphore.acquire(timeout=_parametre('OPENAI_TIMEOUT', 60))
+        except BaseException:
+            metriques.attente_abandonnee()
+            raise
+        if not acquis:
+            metriques.attente_abandonnee()
+            metriques.erreur('PoolTimeout')
+            raise httpx.PoolTimeout("Aucune place libre pour un appel OpenAI", request=request)
+        metriques.debut_appel(time.monotonic() - debut)
+        liberer = _liberation_unique(self.semaphore)
+        try:
+            response = self._envoyer(request)
+        except BaseException:
+            liberer()
+            raise
+        if response.is_closed:
+            # corps déjà lu par le transport : rien ne libérera la place plus tard
+            liberer()
+        else:
+            response.stream = _FluxLibere(response.stream, liberer)
+        return response
+
+    def _envoyer(self, request):
+        max_reessais = _parametre('OPENAI_MAX_RETRIES', 3)
+        for tentative in range(max_reessais + 1):
+            try:
+                response = self.transport.handle_request(request)
+            except ERREURS_REESSAYABLES as e:
+                metriques.erreur(type(e).__name__)
+                if tentative == max_reessais:
+                    raise
+                metriques.reessai()
+                time.sleep(_delai_reessai(tentative))
+                continue
+
+            if response.status_code not in STATUTS_REESSAYABLES or tentative == max_reessais:
+                return response
+            metriques.erreur(response.status_code)
+            delai = _delai_reessai(tentative, response)
+            if delai is None:
+                return response
+            metriques.reessai()
+            response.read()
+            response.close()
+            time.sleep(delai)
+
+    def close(self):
+        self.transport.close()
+
+
+class TransportOpenAIAsync(httpx.AsyncBaseTransport):
+    def __init__(self, semaphore):
+        self.transport = httpx.AsyncHTTPTransport(limits=_limites_pool())
+        self.semaphore = semaphore
+
+    async def handle_async_request(self, request):
+        metriques.debut_attente()
+        debut = time.monotonic()
+        try:
+            await asyncio.wait_for(self.semaphore.acquire(), _parametre('OPENAI_TIMEOUT', 60))
+        except asyncio.TimeoutError:
+            metriques.attente_abandonnee()
+            metriques.erreur('PoolTimeout')
+            raise httpx.PoolTimeout("Aucune place libre pour un appel OpenAI", request=request)
+        except BaseException:
+            metriques.attente_abandonnee()
+            raise
+        metriques.debut_appel(time.monotonic() - debut)
+        liberer = _liberation_unique(self.semaphore)
+        try:
+            response = await self._envoyer(request)
+        except BaseException:
+            liberer()
+            raise
+        if response.is_closed:
+            # corps déjà lu par le transport : rien ne libérera la place plus tard
+            liberer()
+        else:
+            response.stream = _FluxLibereAsync(response.stream, liberer)
+        return response
+
+    async def _envoyer(self, request):
+        max_reessais = _parametre('OPENAI_MAX_RETRIES', 3)
+        for tentative in range(max_reessais + 1):
+            try:
+                response = await self.transport.handle_async_request(request)
+            except ERREURS_REESSAYABLES as e:
+                metriques.erreur(type(e).__name__)
+                if tentative == max_reessais:
+                    raise
+                metriques.reessai()
+                await asyncio.sleep(_delai_reessai(tentative))
+                continue
+
+            if response.status_code not in STATUTS_REESSAYABLES or tentative == max_reessais:
+                return response
+            metriques.erreur(response.status_code)
+            delai = _delai_reessai(tentative, response)
+            if delai is None:
+                return response
+            metriques.reessai()
+            await response.aread()
+            await response.aclose()
+            await asyncio.sleep(delai)
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+class RegistreClientsOpenAI:
+    """
+    Un client synchrone par processus (recréé après un fork) et un client async
+    par boucle d'événements : un pool httpx async ne peut pas changer de boucle.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._client = None
+        self._transport = None
+        self._semaphore = None
+        self._clients_async = weakref.WeakKeyDictionary()
+
+    def _verifier_processus(self):
+        # Appelé sous self._lock
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._client = None
+            self._transport = None
+            self._semaphore = threading.BoundedSemaphore(_parametre('OPENAI_MAX_CONCURRENT', 32))
+            self._clients_async = weakref.WeakKeyDictionary()
+
+    def client(self):
+        with self._lock:
+            self._verifier_processus()
+            if self._client is None:
+                self._transport = TransportOpenAI(self._semaphore)
+                self._client = openai.OpenAI(
+                    api_key=settings.OPENAI_API_KEY,
+                    max_retries=0,  # réessais gérés par le transport
+                    http_client=httpx.Client(transport=self._transport, timeout=_timeout_defaut()),
+                )
+            return self._client
+
+    def client_async(self):
+        boucle = asyncio.get_running_loop()
+        with self._lock:
+            self._verifier_processus()
+            entree = self._clients_async.get(boucle)
+            if entree is None:
+                # Limite propre à cette boucle (voir la docstring du module)
+                transport = TransportOpenAIAsync(asyncio.Semaphore(_limite_async()))
+                client = openai.AsyncOpenAI(
+                    api_key=settings.OPENAI_API_KEY,
+                    max_retries=0,
+                    http_client=httpx.AsyncClient(transport=transport, timeout=_timeout_defaut()),
+                )
+                entree = (client, transport)
+                self._clients_async[boucle] = entree
+            return entree[0]
+
+    def metriques(self):
+        donnees = metriques.instantane()
+        with self._lock:
+            transport = self._transport if self._pid == os.getpid() else None
+            transports_async = [t for _, t in self._clients_async.values()]
+        donnees['pool_sync'] = _connexions_pool(transport.transport) if transport else None
+        donnees['pools_async'] = [_connexions_pool(t.transport) for t in transports_async]
+        return donnees
+
+
+registre_openai = RegistreClientsOpenAI()
+
+
+def get_client_openai():
+    """Client OpenAI synchrone partagé par le processus"""
+    return registre_openai.client()
+
+
+def get_client_openai_async():
+    """Client OpenAI async partagé par la boucle d'événements courante"""
+    return registre_openai.client_async()
+
+
+def metriques_openai():
+    """Instantané des compteurs et de l'état des pools pour ce processus"""
+    return registre_openai.metriques()
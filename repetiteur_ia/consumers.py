@@ -1,5 +1,16 @@
+import time
+
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
 
+from .acces import oublier_droits
+from .conversation import (
+    contexte_utilise, preparer_contexte_question, sauvegarder_conversation, verifier_acces_repetiteur,
+)
+from .models import SoumissionCours
+from .soumissions import etat_traitement, groupe_soumission
+from .utils import repondre_au_repetiteur_stream
+
 class SlotConsumer(AsyncJsonWebsocketConsumer):
     async def connect(self):
         user = self.scope.get('user')
@@ -21,4 +32,145 @@ class SlotConsumer(AsyncJsonWebsocketConsumer):
             'type': 'slot_running',
             'slot_id': event.get('slot_id'),
             'title': event.get('title'),
-        })
\ No newline at end of file
+        })
+
+
+class RepetiteurChatConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Chat du répétiteur en streaming : les fragments de la réponse sont envoyés
+    au navigateur dès que le modèle les produit, l'échange complet n'est
+    enregistré dans l'historique qu'à la fin du stream.
+
+    Messages reçus : {"question": "...", "session_id": 12}
+    Messages envoyés : 'debut', puis des 'fragment', puis 'fin' (ou 'erreur')
+    """
+
+    async def connect(self):
+        user = self.scope.get('user')
+        if not user or user.is_anonymous:
+            await self.close()
+            return
+        erreur_acces = await database_sync_to_async(verifier_acces_repetiteur)(user)
+        if erreur_acces:
+            await self.close(code=4403)
+            return
+        await self.accept()
+
+    async def receive_json(self, content, **kwargs):
+        question = (content.get('question') or '').strip()
+        if not question:
+            await self.send_json({'type': 'erreur', 'error': "Veuillez poser une question."})
+            return
+        # Channels traite les messages d'une connexion un par un : une question
+        # envoyée pendant un stream attend la fin de la réponse précédente
+        await self.repondre(question, content.get('session_id'))
+
+    async def repondre(self, question, session_id):
+        user = self.scope['user']
+        debut = time.perf_counter()
+        # La connexion peut durer plus longtemps que l'abonnement : accès revérifié
+        # à chaque question (droits en cache, la mémoire de l'objet user est oubliée)
+        erreur_acces = await database_sync_to_async(self._verifier_acces)(user)
+        if erreur_acces:
+            await self.envoyer_erreur(erreur_acces)
+            await self.close(code=4403)
+            return
+
+        try:
+            contexte = await database_sync_to_async(preparer_contexte_question)(user, question, session_id)
+        except Exception as e:
+            print(f"Erreur répétiteur IA (stream): {e}")
+            await self.envoyer_erreur()
+            return
+
+        fragments = []
+        premier_fragment = None
+        try:
+            await self.send_json({
+                'type': 'debut',
+                'question': question,
+                'niveau_adapte': contexte['niveau_eleve'],
+                'contenus_trouves': contexte['arguments']['contexte_pedagogique']['nombre_resultats'],
+            })
+            async for fragment in repondre_au_repetiteur_stream(**contexte['arguments']):
+                if premier_fragment is None:
+                    premier_fragment = time.perf_counter() - debut
+                    print(f"⏱️ Répétiteur stream : premier fragment en {premier_fragment * 1000:.0f} ms")
+                fragments.append(fragment)
+                await self.send_json({'type': 'fragment', 'texte': fragment})
+        except Exception as e:
+            # Réponse interrompue : rien n'est enregistré dans l'historique
+            print(f"Erreur répétiteur IA (stream interrompu après {len(fragments)} fragment(s)): {e}")
+            await self.envoyer_erreur()
+            return
+
+        reponse_texte = ''.join(fragments).strip()
+        historique_count = None
+        try:
+            await database_sync_to_async(sauvegarder_conversation)(
+                user, contexte['session'], question, reponse_texte,
+                contexte_utilise(contexte, session_id)
+            )
+            historique_count = len(contexte['historique']) + 1
+        except Exception as e:
+            print(f"Erreur sauvegarde conversation (stream): {e}")
+
+        try:
+            await self.send_json({
+                'type': 'fin',
+                'reponse': reponse_texte,
+                'session_active': contexte['session'] is not None,
+                'historique_count': historique_count,
+                'duree_totale_ms': round((time.perf_counter() - debut) * 1000),
+                'premier_fragment_ms': round(premier_fragment * 1000) if premier_fragment is not None else None,
+            })
+        except Exception as e:
+            print(f"Erreur envoi fin de réponse (stream): {e}")
+
+    async def envoyer_erreur(self, message="Désolé, une erreur technique est survenue. Veuillez réessayer."):
+        try:
+            await self.send_json({'type': 'erreur', 'error': message})
+        except Exception as e:
+            print(f"Erreur envoi message d'erreur (stream): {e}")
+
+    @staticmethod
+    def _verifier_acces(user):
+        oublier_droits(user)
+        return verifier_acces_repetiteur(user)
+
+
+class SoumissionConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Suivi du traitement IA d'une soumission de cours : l'état courant est
+    envoyé à la connexion, puis à chaque étape terminée par les tâches Celery
+    """
+
+    async def connect(self):
+        user = self.scope.get('user')
+        if not user or user.is_anonymous:
+            await self.close()
+            return
+        soumission_id = int(self.scope['url_route']['kwargs']['soumission_id'])
+        autorise = await database_sync_to_async(
+            SoumissionCours.objects.filter(id=soumission_id, session__eleve__user=user).exists
+        )()
+        if not autorise:
+            await self.close(code=4403)
+            return
+        self.group_name = groupe_soumission(soumission_id)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+        # Lu après l'abonnement : aucune étape ne peut être manquée entre les deux
+        etat = await database_sync_to_async(self._etat_courant)(soumission_id)
+        await self.send_json({'type': 'progression', **etat})
+
+    async def disconnect(self, close_code):
+        if hasattr(self, 'group_name'):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    def _etat_courant(self, soumission_id):
+        return etat_traitement(SoumissionCours.objects.select_related('quiz_associe').get(id=soumission_id))
+
+    # handler appelé lorsque group_send envoie type 'soumission.progression'
+    async def soumission_progression(self, event):
+        await self.send_json({'type': 'progression', **event['etat']})
@@ -0,0 +1,196 @@
+"""
+Préparation et persistance des échanges avec le répétiteur, partagées par la
+vue HTTP du chat et le consumer WebSocket de streaming
+"""
+from utilisateurs.models import Eleve
+
+from .acces import droits_repetiteur
+from .embeddings import search_similar_content
+from .models import HistoriqueConversation, SessionRevisionProgrammee
+from .resumes_conversation import derniers_echanges, programmer_resume
+
+
+def verifier_acces_repetiteur(user):
+    """Retourne None si l'utilisateur a accès au répétiteur, sinon le message d'erreur"""
+    return droits_repetiteur(user).erreur
+
+
+def get_eleve_context(user):
+    """Récupère et structure les informations de l'élève (ou du premier enfant actif d'un parent)"""
+    if user.type_utilisateur == 'élève':
+        try:
+            eleve = Eleve.objects.select_related('user').get(user=user)
+            return {
+                'eleve': eleve,
+                'niveau': eleve.get_niveau_display(),
+                'classe': eleve.get_classe_display(),
+                'nom_complet': eleve.user.get_full_name() or eleve.user.username
+            }
+        except Eleve.DoesNotExist:
+            return None
+
+    elif user.type_utilisateur == 'parent':
+        eleves_autorises = droits_repetiteur(user).eleves_autorises
+        if eleves_autorises:
+            eleve = Eleve.objects.select_related('user').filter(id=eleves_autorises[0]).first()
+            if eleve:
+                return {
+                    'eleve': eleve,
+                    'niveau': eleve.get_niveau_display(),
+                    'classe': eleve.get_classe_display(),
+                    'nom_complet': eleve.user.get_full_name() or eleve.user.username,
+                    'est_parent': True
+                }
+
+    return None
+
+
+def get_historique_recent(utilisateur, session=None, limit=10):
+    """Récupère l'historique récent (ordre chronologique) pour le contexte"""
+    queryset = HistoriqueConversation.objects.filter(
+        utilisateur=utilisateur
+    ).order_by('-date_creation')
+
+    if session:
+        queryset = queryset.filter(session=session)
+
+    historique = list(queryset[:limit])
+    historique.reverse()
+
+    return [echange_en_dict(conv) for conv in historique]
+
+
+def echange_en_dict(conv):
+    return {
+        'id': conv.id,
+        'question': conv.question,
+        'reponse': conv.reponse,
+        'date': conv.date_creation,
+        'session': conv.session_id,
+        'type_conversation': conv.type_conversation
+    }
+
+
+def sauvegarder_conversation(utilisateur, session, question, reponse, contexte=None):
+    """Sauvegarde l'échange dans l'historique et programme au besoin le résumé de la session"""
+    type_conv = 'session' if session else 'libre'
+
+    conversation = HistoriqueConversation.objects.create(
+        utilisateur=utilisateur,
+        session=session,
+        type_conversation=type_conv,
+        question=question,
+        reponse=reponse,
+        contexte_utilise=contexte or {}
+    )
+    if session:
+        try:
+            programmer_resume(session)
+        except Exception as e:
+            print(f"⚠️ Résumé de la session {session.id} non programmé: {e}")
+    return conversation
+
+
+def formater_historique(historique):
+    """Met en forme les échanges précédents pour le prompt"""
+    if not historique:
+        return ""
+    contexte_historique = "CONTEXTE DES ÉCHANGES PRÉCÉDENTS:\n"
+    for i, conv in enumerate(historique, 1):
+        contexte_historique += f"\nÉchange {i}:\n"
+        contexte_historique += f"Question: {conv['question']}\n"
+        contexte_historique += f"Réponse: {conv['reponse']}\n"
+    return contexte_historique
+
+
+def preparer_contexte_question(user, question, session_id=None):
+    """
+    Rassemble tout ce dont le répétiteur a besoin pour répondre : élève,
+    session active, résumé et derniers échanges, contenus similaires du vectorstore.
+    Retourne un dict dont 'arguments' se passe tel quel à repondre_au_repetiteur.
+    """
+    eleve_info = get_eleve_context(user)
+
+    session_obj = None
+    session_context = None
+    if session_id and eleve_info:
+        session_obj = SessionRevisionProgrammee.objects.select_related('emploi_temps').filter(
+            id=session_id, eleve=eleve_info['eleve']
+        ).first()
+        if session_obj:
+            session_context = {
+                'matiere': session_obj.emploi_temps.matiere,
+                'objectifs': session_obj.objectifs,
+                # Seul le nombre de documents entre dans le prompt : pas de chargement des textes
+                'nb_soumissions': session_obj.soumissions.count()
+            }
+
+    # En session : résumé glissant et échanges qu'il ne couvre pas encore ;
+    # en chat libre : derniers 5 échanges
+    resume_conversation = ""
+    if session_obj:
+        historique = [echange_en_dict(conv) for conv in derniers_echanges(session_obj)]
+        resume_conversation = session_obj.resume_conversation
+    else:
+        historique = get_historique_recent(user, None, limit=5)
+    contexte_historique = formater_historique(historique)
+
+    # Recherche de contenu similaire dans le vectorstore, limitée au niveau
+    # de l'élève, à ses propres échanges et à la matière de la session
+    try:
+        filtres = None
+        niveau_partition = None
+        if eleve_info:
+            niveau_partition = eleve_info['eleve'].niveau
+            filtres = {'eleve_id': [eleve_info['eleve'].id, None]}
+            if session_context:
+                filtres['matiere'] = [session_context['matiere'], None]
+        documents = search_similar_content(
+            question, niveau=niveau_partition, filtres=filtres, documents=True
+        )
+        print(f"🔍 Vectorstore: {len(documents)} contenus similaires trouvés")
+    except Exception as e:
+        print(f"⚠️ Erreur vectorstore: {e}")
+        documents = []
+
+    contenus_similaires = [document.page_content for document in documents]
+    contexte_pedagogique = {
+        "contenus_similaires": contenus_similaires,
+        "nombre_resultats": len(contenus_similaires),
+        "historique_conversation": contexte_historique,
+        # Contenus communs à tous les élèves : seuls admis dans la réponse mise en cache
+        "contenus_partages": [
+            document.page_content for document in documents if document.metadata.get('eleve_id') is None
+        ],
+    }
+
+    # Niveau par défaut si non spécifié
+    niveau_eleve = "secondaire"
+    if eleve_info and 'niveau' in eleve_info:
+        niveau_eleve = eleve_info['niveau']
+
+    return {
+        'eleve_info': eleve_info,
+        'session': session_obj,
+        'historique': historique,
+        'niveau_eleve': niveau_eleve,
+        'arguments': {
+            'question': question,
+            'contexte_pedagogique': contexte_pedagogique,
+            'contexte_session': session_context,
+            'niveau_eleve': niveau_eleve,
+            'historique_conversation': contexte_historique,
+            'resume_conversation': resume_conversation,
+        },
+    }
+
+
+def contexte_utilise(contexte, session_id=None):
+    """Résumé du contexte stocké avec l'échange dans HistoriqueConversation"""
+    return {
+        'niveau_eleve': contexte['niveau_eleve'],
+        'session_id': session_id,
+        'contenus_trouves': contexte['arguments']['contexte_pedagogique']["nombre_resultats"],
+        'historique_utilise': len(contexte['historique']),
+        'resume_utilise': bool(contexte['arguments']['resume_conversation'])
+    }
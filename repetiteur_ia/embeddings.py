@@ -1,14 +1,55 @@
 from langchain_community.vectorstores import FAISS
 from langchain_core.embeddings import Embeddings
 from langchain_core.documents import Document
+from contextlib import contextmanager
 import os
+import shutil
+import threading
+import time
+import json
+import numpy as np
 from django.conf import settings
-from sentence_transformers import SentenceTransformer
+from django.utils.text import slugify
+
+try:
+    import fcntl
+except ImportError:  # Windows : verrou inter-processus indisponible
+    fcntl = None
+
+# Registre des modèles SentenceTransformer : un seul chargement par processus,
+# partagé par la recherche, le worker d'indexation et tout autre appelant.
+_modeles = {}
+_modeles_lock = threading.Lock()
+
+def get_sentence_model(model_name=None, device=None):
+    """
+    Retourne le modèle SentenceTransformer partagé, chargé au premier appel.
+    Nom et device viennent de ``EMBEDDING_MODEL_NAME`` / ``EMBEDDING_DEVICE``.
+    """
+    model_name = model_name or getattr(settings, 'EMBEDDING_MODEL_NAME', 'all-MiniLM-L6-v2')
+    device = device or getattr(settings, 'EMBEDDING_DEVICE', None) or None
+    cle = (model_name, device)
+    modele = _modeles.get(cle)
+    if modele is None:
+        with _modeles_lock:
+            modele = _modeles.get(cle)
+            if modele is None:
+                # Import différé : torch n'est chargé que par les processus qui encodent
+                from sentence_transformers import SentenceTransformer
+                modele = SentenceTransformer(model_name, device=device)
+                _modeles[cle] = modele
+                print(f"✅ Modèle d'embeddings chargé: {model_name} ({device or 'auto'})")
+    return modele
 
 #  NOUVEAU : Classe d'embeddings compatible avec SentenceTransformer
 class SentenceTransformerEmbeddings(Embeddings):
-    def __init__(self, model_name="all-MiniLM-L6-v2"):
-        self.model = SentenceTransformer(model_name)
+    def __init__(self, model_name=None, device=None):
+        self.model_name = model_name
+        self.device = device
+
+    @property
+    def model(self):
+        return get_sentence_model(self.model_name, self.device)
     
     def embed_documents(self, texts):
         """Embed search docs."""
@@ -28,7 +69,10 @@ else:
     embeddings = OpenAIEmbeddings(openai_api_key=settings.OPENAI_API_KEY)
 
 # Chemin du stockage des vecteurs
-VECTOR_STORE_PATH = os.path.join(settings.BASE_DIR, "data", "vector_store.faiss")
+VECTOR_STORE_PATH = getattr(
+    settings, "VECTOR_STORE_PATH",
+    os.path.join(settings.BASE_DIR, "data", "vector_store.faiss")
+)
 
 # Créer le dossier data s'il n'existe pas
 os.makedirs(os.path.dirname(VECTOR_STORE_PATH), exist_ok=True)
@@ -38,42 +82,539 @@ def create_vector_store_from_texts(texts):
     Crée un vector store FAISS à partir d'une liste de textes.
     """
     documents = [Document(page_content=text) for text in texts]
-    embeddings = get_embeddings()
     vector_store = FAISS.from_documents(documents, embeddings)
     return vector_store
 
-def get_vector_store():
-    """Charger le Vector Store existant ou en créer un nouveau"""
-    if os.path.exists(VECTOR_STORE_PATH):
+def creer_vector_store_vide():
+    """Crée un vector store FAISS sans aucun document (index Flat vide)"""
+    import faiss
+    from langchain_community.docstore.in_memory import InMemoryDocstore
+    dimension = len(embeddings.embed_query("dimension"))
+    return FAISS(
+        embedding_function=embeddings,
+        index=faiss.IndexFlatL2(dimension),
+        docstore=InMemoryDocstore(),
+        index_to_docstore_id={},
+    )
+
+# Textes d'amorce écrits sans métadonnées par les anciennes versions dans les
+# index vides : ils ne doivent jamais remonter comme contenu partagé
+TEXTES_AMORCE = frozenset([
+    "Base de connaissances MrKarfour - Conversations élèves",
+    "Bienvenue dans l'assistant pédagogique MrKarfour !",
+    "Posez vos questions et le répétiteur IA vous aidera.",
+    "Les conversations précédentes aident le répétiteur à mieux vous comprendre.",
+])
+
+
+# ----------------------------------------------------------------------
+# Fabrique d'index FAISS : exact (Flat) ou approché (IVF-PQ, HNSW)
+# ----------------------------------------------------------------------
+INDEX_FLAT = "flat"
+INDEX_IVFPQ = "ivfpq"
+INDEX_HNSW = "hnsw"
+INDEX_AUTO = "auto"
+TYPES_INDEX = (INDEX_FLAT, INDEX_IVFPQ, INDEX_HNSW)
+
+def type_index(index):
+    """Type (flat/ivfpq/hnsw) d'un index FAISS brut"""
+    import faiss
+    if isinstance(index, faiss.IndexHNSW):
+        return INDEX_HNSW
+    if isinstance(index, faiss.IndexIVF):
+        return INDEX_IVFPQ
+    return INDEX_FLAT
+
+def _diviseur_pq(dimension, m_souhaite):
+    """Plus grand nombre de sous-quantifieurs <= m_souhaite qui divise la dimension"""
+    for m in range(min(m_souhaite, dimension), 0, -1):
+        if dimension % m == 0:
+            return m
+    return 1
+
+def appliquer_parametres_recherche(index, parametres=None):
+    """Applique nprobe (IVF) / efSearch (HNSW) à un index chargé"""
+    import faiss
+    parametres = parametres or {}
+    if isinstance(index, faiss.IndexIVF):
+        index.nprobe = int(parametres.get("nprobe") or getattr(settings, "VECTOR_INDEX_NPROBE", 16))
+    elif isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = int(parametres.get("ef_search") or getattr(settings, "VECTOR_INDEX_EF_SEARCH", 64))
+
+def parametres_index(index):
+    """Paramètres persistés à côté de l'index"""
+    import faiss
+    parametres = {"type": type_index(index), "ntotal": int(index.ntotal)}
+    if isinstance(index, faiss.IndexIVF):
+        parametres.update({"nprobe": int(index.nprobe), "nlist": int(index.nlist), "n_entrainement": int(index.ntotal)})
+    elif isinstance(index, faiss.IndexHNSW):
+        parametres.update({"ef_search": int(index.hnsw.efSearch)})
+    return parametres
+
+def creer_index_faiss(vecteurs, type_voulu=INDEX_FLAT):
+    """
+    Construit un index FAISS brut contenant ``vecteurs`` (matrice float32 n x d).
+    IVF-PQ est entraîné sur les vecteurs fournis ; retombe sur Flat si le
+    corpus est trop petit pour l'entraînement.
+    """
+    import faiss
+    vecteurs = np.ascontiguousarray(vecteurs, dtype=np.float32)
+    nombre, dimension = vecteurs.shape
+
+    if type_voulu == INDEX_HNSW:
+        index = faiss.IndexHNSWFlat(dimension, getattr(settings, "VECTOR_INDEX_HNSW_M", 32))
+        index.hnsw.efConstruction = getattr(settings, "VECTOR_INDEX_EF_CONSTRUCTION", 80)
+    elif type_voulu == INDEX_IVFPQ and nombre >= 39 * 256:
+        # PQ 8 bits : 256 centroïdes par sous-quantifieur, ~39 points chacun pour l'entraînement
+        # ~4*sqrt(n) listes, au moins 39 points d'entraînement par liste
+        nlist = max(1, min(getattr(settings, "VECTOR_INDEX_NLIST", 1024), int(4 * np.sqrt(nombre)), nombre // 39))
+        m = _diviseur_pq(dimension, getattr(settings, "VECTOR_INDEX_PQ_M", 48))
+        quantifieur = faiss.IndexFlatL2(dimension)
+        index = faiss.IndexIVFPQ(quantifieur, dimension, nlist, m, 8)
+        index.train(vecteurs)
+    else:
+        index = faiss.IndexFlatL2(dimension)
+
+    appliquer_parametres_recherche(index)
+    if nombre:
+        index.add(vecteurs)
+    return index
+
+def vecteurs_index(index):
+    """Relit tous les vecteurs d'un index (Flat, HNSW, ou IVF avec direct map)"""
+    import faiss
+    if isinstance(index, faiss.IndexIVF):
+        index.make_direct_map()
+    return index.reconstruct_n(0, index.ntotal)
+
+def type_index_cible(ntotal):
+    """Type d'index voulu selon ``VECTOR_INDEX_TYPE`` (``auto`` : Flat puis ANN au-delà du seuil)"""
+    configure = getattr(settings, "VECTOR_INDEX_TYPE", INDEX_AUTO)
+    if configure in TYPES_INDEX:
+        return configure
+    if ntotal >= getattr(settings, "VECTOR_INDEX_AUTO_THRESHOLD", 50000):
+        return getattr(settings, "VECTOR_INDEX_AUTO_TYPE", INDEX_IVFPQ)
+    return INDEX_FLAT
+
+def vecteurs_store(store, positions):
+    """
+    Vecteurs exacts des documents aux ``positions`` de l'index d'un store.
+
+    Flat et HNSW (Flat) gardent les vecteurs tels quels. IVF-PQ n'en garde
+    qu'une reconstruction approchée, impropre au ré-entraînement : les messages
+    reprennent leur vecteur ``EmbeddingIA``, les autres documents sont réencodés.
+    """
+    if not positions:
+        return np.zeros((0, store.index.d), dtype=np.float32)
+    if type_index(store.index) != INDEX_IVFPQ:
+        return vecteurs_index(store.index)[positions]
+
+    from .models import EmbeddingIA, IndexationEnAttente
+    prefixe = f"{IndexationEnAttente.SOURCE_MESSAGE}:"
+    doc_ids = [store.index_to_docstore_id[position] for position in positions]
+    messages = {
+        int(doc_id[len(prefixe):]): rang
+        for rang, doc_id in enumerate(doc_ids) if doc_id.startswith(prefixe)
+    }
+
+    vecteurs = np.zeros((len(positions), store.index.d), dtype=np.float32)
+    trouves = set()
+    ids_messages = list(messages)
+    for debut in range(0, len(ids_messages), 900):
+        for embedding in EmbeddingIA.objects.filter(message_id__in=ids_messages[debut:debut + 900]):
+            rang = messages[embedding.message_id]
+            vecteurs[rang] = embedding.vector
+            trouves.add(rang)
+
+    manquants = [rang for rang in range(len(positions)) if rang not in trouves]
+    for debut in range(0, len(manquants), 256):
+        lot = manquants[debut:debut + 256]
+        vecteurs[lot] = embeddings.embed_documents(
+            [store.docstore.search(doc_ids[rang]).page_content for rang in lot]
+        )
+    return vecteurs
+
+# Position d'un vecteur supprimé d'un index HNSW (qui ne supporte pas remove_ids) :
+# le vecteur reste dans le graphe jusqu'au compactage, le document est un
+# marqueur exclu des recherches par le filtre {'supprime': [None]}
+DOC_SUPPRIME = "__supprime__"
+
+def positions_supprimees(store):
+    return [position for position, doc_id in store.index_to_docstore_id.items() if doc_id == DOC_SUPPRIME]
+
+def _reconstruire_index(store, garder, type_voulu):
+    """Reconstruit l'index avec les seules ``garder`` (positions triées), renumérotées 0..n-1"""
+    nouvel_index = creer_index_faiss(vecteurs_store(store, garder), type_voulu)
+    store.index_to_docstore_id = {
+        nouvelle: store.index_to_docstore_id[ancienne] for nouvelle, ancienne in enumerate(garder)
+    }
+    if isinstance(store.docstore.search(DOC_SUPPRIME), Document):
+        store.docstore.delete([DOC_SUPPRIME])
+    store.index = nouvel_index
+    store.parametres_index = parametres_index(nouvel_index)
+
+def optimiser_index(store):
+    """
+    Convertit, ré-entraîne ou compacte l'index d'un store si nécessaire :
+    passage de Flat vers l'ANN configuré quand le corpus dépasse le seuil,
+    ré-entraînement IVF-PQ (sur les vecteurs exacts) quand le corpus a quadruplé
+    depuis le dernier entraînement, compactage HNSW quand la part de vecteurs
+    supprimés dépasse ``VECTOR_INDEX_TAUX_SUPPRIMES``.
+    Retourne True si l'index a été reconstruit.
+    """
+    index = store.index
+    actuel = type_index(index)
+    supprimees = positions_supprimees(store) if actuel == INDEX_HNSW else []
+    vivants = index.ntotal - len(supprimees)
+    cible = type_index_cible(vivants)
+    parametres = getattr(store, "parametres_index", None) or {}
+
+    retrain = (
+        actuel == INDEX_IVFPQ == cible
+        and vivants >= 4 * max(1, parametres.get("n_entrainement", vivants))
+    )
+    compacter = bool(supprimees) and (
+        cible != INDEX_HNSW
+        or len(supprimees) >= getattr(settings, "VECTOR_INDEX_TAUX_SUPPRIMES", 0.2) * index.ntotal
+    )
+    if actuel == cible and not retrain and not compacter:
+        return False
+    if actuel != cible and not compacter and cible == INDEX_IVFPQ and vivants < 39 * 256:
+        return False  # corpus encore trop petit pour l'entraînement
+
+    supprimees = set(supprimees)
+    garder = sorted(position for position in store.index_to_docstore_id if position not in supprimees)
+    _reconstruire_index(store, garder, cible)
+    print(f"✅ Index FAISS reconstruit: {actuel} → {type_index(store.index)} ({store.index.ntotal} vecteurs)")
+    return True
+
+def _supprimer_positions_ivf(index, positions):
+    """
+    Retire des positions d'un index IVF puis renumérote les labels restants
+    en 0..n-1, sans décoder ni réencoder les codes : IVF garde ses labels
+    d'origine après ``remove_ids``, alors que le docstore LangChain suppose des
+    positions contiguës (comme Flat) et que les ajouts suivants prennent ntotal.
+    """
+    import faiss
+    supprimees = np.asarray(sorted(positions), dtype=np.int64)
+    index.set_direct_map_type(faiss.DirectMap.NoMap)
+    index.remove_ids(supprimees)
+
+    listes = index.invlists
+    for liste in range(index.nlist):
+        taille = listes.list_size(liste)
+        if not taille:
+            continue
+        labels = faiss.rev_swig_ptr(listes.get_ids(liste), taille).copy()
+        codes = faiss.rev_swig_ptr(listes.get_codes(liste), taille * listes.code_size).copy()
+        labels = (labels - np.searchsorted(supprimees, labels)).astype(np.int64)
+        listes.update_entries(liste, 0, taille, faiss.swig_ptr(labels), faiss.swig_ptr(codes))
+
+def supprimer_ids_index(store, doc_ids):
+    """
+    Supprime des documents d'un store.
+
+    Flat : suppression LangChain (l'index se compacte de lui-même).
+    IVF-PQ : ``remove_ids`` puis renumérotation des labels dans les listes inversées.
+    HNSW (pas de ``remove_ids``) : les positions sont marquées supprimées ;
+    ``optimiser_index`` compacte le graphe quand elles deviennent trop nombreuses.
+    """
+    actuel = type_index(store.index)
+    if actuel == INDEX_FLAT:
+        store.delete(doc_ids)
+        return
+
+    a_supprimer = set(doc_ids)
+    positions = [
+        position for position, doc_id in store.index_to_docstore_id.items() if doc_id in a_supprimer
+    ]
+    if not positions:
+        return
+    store.docstore.delete([store.index_to_docstore_id[position] for position in positions])
+
+    if actuel == INDEX_IVFPQ:
+        _supprimer_positions_ivf(store.index, positions)
+        supprimees = set(positions)
+        store.index_to_docstore_id = {
+            nouvelle: store.index_to_docstore_id[ancienne]
+            for nouvelle, ancienne in enumerate(
+                sorted(position for position in store.index_to_docstore_id if position not in supprimees)
+            )
+        }
+        return
+
+    if not isinstance(store.docstore.search(DOC_SUPPRIME), Document):
+        store.docstore.add({DOC_SUPPRIME: Document(page_content="", metadata={"supprime": True})})
+    for position in positions:
+        store.index_to_docstore_id[position] = DOC_SUPPRIME
+
+
+class VectorStoreManager:
+    """
+    Garde un seul index FAISS chargé par processus (worker gunicorn, worker Celery).
+
+    Chaque sauvegarde écrit un dossier complet ``versions/<génération>``
+    (index.faiss, index.pkl, parametres.json) puis bascule le seul fichier
+    ``generation`` vers lui : un lecteur voit toujours les trois fichiers d'une
+    même génération. Les index écrits avant ce format (fichiers à la racine,
+    génération = date de modification de ``index.faiss``) restent lisibles.
+    Quand un autre processus publie une nouvelle génération, l'index est
+    rechargé puis échangé atomiquement : les lectures ne prennent jamais de
+    verrou pendant la recherche.
+    """
+
+    VERSION_FILENAME = "generation"
+    VERSIONS_DIRNAME = "versions"
+    LOCK_FILENAME = ".lock"
+    PARAMETRES_FILENAME = "parametres.json"
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._store = None
+        self._generation = None
+        self._reload_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Génération sur disque
+    # ------------------------------------------------------------------
+    def _version_path(self):
+        return os.path.join(self.path, self.VERSION_FILENAME)
+
+    def disk_generation(self):
+        """Retourne l'identifiant de la génération publiée sur disque (ou None)"""
+        try:
+            with open(self._version_path(), "r", encoding="utf-8") as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            pass
         try:
-            return FAISS.load_local(
-                VECTOR_STORE_PATH, 
-                embeddings, 
-                allow_dangerous_deserialization=True
+            # Index écrit avant l'introduction du fichier de version
+            return f"mtime:{os.stat(os.path.join(self.path, 'index.faiss')).st_mtime_ns}"
+        except FileNotFoundError:
+            return None
+
+    def _versions_path(self):
+        return os.path.join(self.path, self.VERSIONS_DIRNAME)
+
+    def _dossier_generation(self, generation):
+        """Dossier des fichiers d'une génération (racine pour un index de l'ancien format)"""
+        if generation and not generation.startswith("mtime:"):
+            dossier = os.path.join(self._versions_path(), generation)
+            if os.path.isdir(dossier):
+                return dossier
+        return self.path
+
+    def _publier_generation(self, generation):
+        """Bascule le pointeur de génération (écriture atomique via os.replace)"""
+        tmp_path = f"{self._version_path()}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(generation)
+        os.replace(tmp_path, self._version_path())
+        return generation
+
+    def _purger_versions(self, generation):
+        """Supprime les anciennes générations, en gardant les plus récentes pour les lecteurs en cours"""
+        conservees = max(1, getattr(settings, "VECTOR_STORE_VERSIONS_CONSERVEES", 3))
+        try:
+            versions = sorted(
+                nom for nom in os.listdir(self._versions_path())
+                if not nom.endswith(".tmp") and nom != generation
             )
-        except Exception as e:
-            print(f"❌ Erreur chargement vectorstore: {e}")
-            # Recréer si corrompu
-            return create_vector_store_from_texts(["Base de connaissances MrKarfour - Conversations élèves"])
-    else:
-        return create_vector_store_from_texts(["Base de connaissances MrKarfour - Conversations élèves"])
+        except FileNotFoundError:
+            return
+        for nom in versions[:max(0, len(versions) - (conservees - 1))]:
+            shutil.rmtree(os.path.join(self._versions_path(), nom), ignore_errors=True)
+
+    # ------------------------------------------------------------------
+    # Lecture
+    # ------------------------------------------------------------------
+    def _load_from_disk(self, generation=None):
+        dossier = self._dossier_generation(generation or self.disk_generation())
+        if os.path.exists(os.path.join(dossier, "index.faiss")):
+            try:
+                store = FAISS.load_local(
+                    dossier,
+                    embeddings,
+                    allow_dangerous_deserialization=True
+                )
+                store.parametres_index = self._lire_parametres(dossier)
+                appliquer_parametres_recherche(store.index, store.parametres_index)
+                return store
+            except Exception as e:
+                print(f"❌ Erreur chargement vectorstore: {e}")
+        # Recréer (vide) si absent ou corrompu
+        return creer_vector_store_vide()
+
+    def _lire_parametres(self, dossier):
+        """Paramètres de l'index (type, nprobe, efSearch...) persistés à côté de lui"""
+        try:
+            with open(os.path.join(dossier, self.PARAMETRES_FILENAME), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def get(self):
+        """Retourne l'index du processus, rechargé si la génération disque a changé"""
+        generation = self.disk_generation()
+        store = self._store
+        if store is not None and generation == self._generation:
+            return store
+
+        with self._reload_lock:
+            # Un autre thread a peut-être déjà rechargé pendant l'attente
+            if self._store is not None and generation == self._generation:
+                return self._store
+            store = self._load_from_disk(generation)
+            self._store, self._generation = store, generation
+            return store
 
-def search_similar_content(query, k=3):
-    """Effectuer une recherche sémantique dans les embeddings"""
+    # ------------------------------------------------------------------
+    # Écriture
+    # ------------------------------------------------------------------
+    @contextmanager
+    def _verrou_ecriture(self):
+        """Sérialise les écritures entre threads et, si possible, entre processus"""
+        with self._write_lock:
+            os.makedirs(self.path, exist_ok=True)
+            with open(os.path.join(self.path, self.LOCK_FILENAME), "a") as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _save(self, store):
+        """
+        Écrit une nouvelle génération dans ``versions/<génération>`` puis la
+        publie en basculant le fichier ``generation`` : aucun état intermédiaire
+        (index d'une génération, docstore d'une autre) n'est visible.
+        """
+        generation = f"{time.time_ns()}-{os.getpid()}"
+        tmp_dir = os.path.join(self._versions_path(), f"{generation}.tmp")
+        store.save_local(tmp_dir)
+
+        parametres = parametres_index(store.index)
+        precedents = getattr(store, "parametres_index", None) or {}
+        if "n_entrainement" in precedents and parametres["type"] == precedents.get("type"):
+            parametres["n_entrainement"] = precedents["n_entrainement"]
+        store.parametres_index = parametres
+        with open(os.path.join(tmp_dir, self.PARAMETRES_FILENAME), "w", encoding="utf-8") as f:
+            json.dump(parametres, f)
+
+        os.rename(tmp_dir, os.path.join(self._versions_path(), generation))
+        self._publier_generation(generation)
+        self._purger_versions(generation)
+        return generation
+
+    def update(self, mutation):
+        """
+        Applique ``mutation(store)`` sur une copie fraîche de l'index, la persiste
+        et la publie. Les lecteurs continuent d'utiliser l'ancienne copie jusqu'à l'échange.
+        """
+        with self._verrou_ecriture():
+            store = self._load_from_disk()
+            result = mutation(store)
+            optimiser_index(store)
+            generation = self._save(store)
+            self._store, self._generation = store, generation
+            return result
+
+    def replace(self, store):
+        """Publie un index entièrement reconstruit"""
+        with self._verrou_ecriture():
+            optimiser_index(store)
+            generation = self._save(store)
+            self._store, self._generation = store, generation
+            return store
+
+
+# Index historique (non partitionné), conservé tant qu'aucune partition n'existe
+vector_store_manager = VectorStoreManager(VECTOR_STORE_PATH)
+
+# Sous-index par niveau scolaire : une recherche ne parcourt que sa partition
+PARTITIONS_PATH = os.path.join(VECTOR_STORE_PATH, "partitions")
+PARTITION_GENERALE = "general"
+_partition_managers = {}
+_partition_lock = threading.Lock()
+
+def partition_pour_niveau(niveau):
+    """Clé de partition d'un niveau (``'college'``, ``'lycee'``...) ; ``general`` à défaut"""
+    return slugify(niveau or "") or PARTITION_GENERALE
+
+def get_vector_store_manager(partition):
+    """Retourne le gestionnaire (unique par processus) du sous-index d'une partition"""
+    manager = _partition_managers.get(partition)
+    if manager is None:
+        with _partition_lock:
+            manager = _partition_managers.setdefault(
+                partition, VectorStoreManager(os.path.join(PARTITIONS_PATH, partition))
+            )
+    return manager
+
+def partitions_existantes():
+    """Partitions publiées sur disque"""
     try:
-        vectorstore = get_vector_store()
-        docs = vectorstore.similarity_search(query, k=k)
-        return [doc.page_content for doc in docs]
+        return sorted(
+            nom for nom in os.listdir(PARTITIONS_PATH)
+            if get_vector_store_manager(nom).disk_generation() is not None
+        )
+    except FileNotFoundError:
+        return []
+
+
+def get_vector_store(partition=None):
+    """Retourne le Vector Store du processus (chargé une seule fois, rechargé si modifié sur disque)"""
+    if partition is None:
+        return vector_store_manager.get()
+    return get_vector_store_manager(partition).get()
+
+def search_similar_content(query, k=3, niveau=None, filtres=None, documents=False):
+    """
+    Effectuer une recherche sémantique dans les embeddings.
+
+    ``niveau`` limite la recherche au sous-index de ce niveau ; sans niveau,
+    toutes les partitions sont interrogées et fusionnées par score.
+    ``filtres`` filtre sur les métadonnées (eleve_id, matiere, niveau, source,
+    origine_type...) ; une liste de valeurs signifie « l'une de ces valeurs »,
+    ``None`` dans la liste acceptant les documents sans cette métadonnée.
+    ``documents=True`` retourne les ``Document`` (texte et métadonnées) au lieu des textes.
+    """
+    try:
+        if niveau is not None:
+            stores = [get_vector_store(partition_pour_niveau(niveau))]
+        else:
+            partitions = partitions_existantes()
+            stores = [get_vector_store(p) for p in partitions] or [get_vector_store()]
+
+        vecteur = embeddings.embed_query(query)
+        resultats = []
+        for store in stores:
+            resultats.extend(
+                (doc, score) for doc, score in store.similarity_search_with_score_by_vector(
+                    vecteur, k=k + 1, filter=dict(filtres or {}, supprime=[None]), fetch_k=max(20, 4 * k)
+                )
+                if doc.page_content not in TEXTES_AMORCE
+            )
+        # Score FAISS = distance : plus petit = plus proche
+        resultats.sort(key=lambda resultat: resultat[1])
+        if documents:
+            return [doc for doc, _ in resultats[:k]]
+        return [doc.page_content for doc, _ in resultats[:k]]
     except Exception as e:
         print(f"❌ Erreur recherche vectorstore: {e}")
         return []
 
-def ajouter_texte_au_vectorstore(texte):
+def ajouter_texte_au_vectorstore(texte, partition=PARTITION_GENERALE):
     """Ajouter un texte au vectorstore existant"""
+    return ajouter_textes_au_vectorstore([texte], partition=partition)
+
+def ajouter_textes_au_vectorstore(textes, partition=PARTITION_GENERALE):
+    """Ajouter plusieurs textes au vectorstore en une seule sauvegarde"""
     try:
-        vectorstore = get_vector_store()
-        vectorstore.add_texts([texte])
-        vectorstore.save_local(VECTOR_STORE_PATH)
+        get_vector_store_manager(partition).update(lambda store: store.add_texts(list(textes)))
         return True
     except Exception as e:
         print(f"❌ Erreur ajout au vectorstore: {e}")
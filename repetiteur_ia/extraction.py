@@ -0,0 +1,286 @@
+"""
+Extraction du texte des fichiers de cours (soumissions, documents pédagogiques, cours).
+
+Chaque format a son extracteur, enregistré par extension avec @extracteur : un
+générateur qui produit le texte page par page (ou par bloc de paragraphes),
+de sorte que la mémoire reste bornée même pour un gros document. Le texte
+assemblé est plafonné et mis en cache en base par empreinte du contenu :
+réextraire un fichier déjà vu ne coûte qu'un calcul de sha256. Les gros
+fichiers sont extraits par un worker Celery (file 'extraction').
+
+Dépendances optionnelles : pypdf (PDF), pytesseract + binaire tesseract (OCR).
+DOCX et ODT sont lus directement dans l'archive zip, sans dépendance.
+"""
+import hashlib
+import io
+import shutil
+import tempfile
+import zipfile
+from contextlib import contextmanager
+from pathlib import Path
+from xml.etree.ElementTree import iterparse
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import TexteExtrait
+
+# Incrémenter quand un extracteur change : les textes en cache sont alors réextraits
+VERSION_EXTRACTION = "1"
+TAILLE_BLOC_LECTURE = 1024 * 1024
+PARAGRAPHES_PAR_BLOC = 50
+
+W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+TEXT_NS = "{urn:oasis:names:tc:opendocument:xmlns:text:1.0}"
+
+# extension -> (nom de l'extracteur, générateur de pages)
+EXTRACTEURS = {}
+
+
+def _parametre(nom, defaut):
+    return getattr(settings, nom, defaut)
+
+
+def extracteur(nom, *extensions):
+    """Enregistre un générateur ``fonction(fichier binaire) -> pages de texte`` pour des extensions"""
+    def decorateur(fonction):
+        for extension in extensions:
+            EXTRACTEURS[extension] = (nom, fonction)
+        return fonction
+    return decorateur
+
+
+def extension_supportee(nom_fichier):
+    return Path(nom_fichier or '').suffix.lower() in EXTRACTEURS
+
+
+# ----------------------------------------------------------------------
+# Extracteurs
+# ----------------------------------------------------------------------
+
+@extracteur('texte', '.txt', '.md', '.csv')
+def _extraire_texte_brut(fichier):
+    lecteur = io.TextIOWrapper(fichier, encoding='utf-8', errors='replace')
+    try:
+        while True:
+            bloc = lecteur.read(TAILLE_BLOC_LECTURE)
+            if not bloc:
+                break
+            yield bloc
+    finally:
+        lecteur.detach()  # ne pas fermer le fichier de l'appelant
+
+
+@extracteur('pdf', '.pdf')
+def _extraire_pdf(fichier):
+    from pypdf import PdfReader
+
+    # Les pages sont analysées à la demande : une seule en mémoire à la fois
+    for page in PdfReader(fichier).pages:
+        yield page.extract_text() or ''
+
+
+def _paragraphes_xml(fichier, membre, balises_paragraphe, balise_texte=None):
+    """
+    Parcourt un XML d'archive bureautique en flux et produit les paragraphes
+    par blocs ; chaque élément est libéré dès qu'il a été lu
+    """
+    paragraphes = []
+    with zipfile.ZipFile(fichier) as archive, archive.open(membre) as xml:
+        for _, element in iterparse(xml, events=('end',)):
+            if element.tag not in balises_paragraphe:
+                continue
+            if balise_texte:
+                texte = ''.join(t.text or '' for t in element.iter(balise_texte))
+            else:
+                texte = ''.join(element.itertext())
+            element.clear()
+            if texte.strip():
+                paragraphes.append(texte)
+            if len(paragraphes) >= PARAGRAPHES_PAR_BLOC:
+                yield '\n'.join(paragraphes)
+                paragraphes = []
+    if paragraphes:
+        yield '\n'.join(paragraphes)
+
+
+@extracteur('docx', '.docx')
+def _extraire_docx(fichier):
+    yield from _paragraphes_xml(fichier, 'word/document.xml', {f'{W_NS}p'}, f'{W_NS}t')
+
+
+@extracteur('odt', '.odt')
+def _extraire_odt(fichier):
+    yield from _paragraphes_xml(fichier, 'content.xml', {f'{TEXT_NS}p', f'{TEXT_NS}h'})
+
+
+@extracteur('ocr', '.jpg', '.jpeg', '.png', '.tif', '.tiff', '.bmp')
+def _extraire_image(fichier):
+    import pytesseract
+    from PIL import Image
+
+    cote_max = _parametre('EXTRACTION_OCR_COTE_MAX', 3000)
+    with Image.open(fichier) as image:
+        image.draft('L', (cote_max, cote_max))  # JPEG : décodage directement réduit
+        image = image.convert('L')
+        image.thumbnail((cote_max, cote_max))
+        yield pytesseract.image_to_string(image, lang=_parametre('EXTRACTION_OCR_LANGUE', 'fra'))
+
+
+# ----------------------------------------------------------------------
+# Ouverture, empreinte et cache
+# ----------------------------------------------------------------------
+
+@contextmanager
+def _ouvrir(source):
+    """
+    Ouvre un chemin, un FieldFile ou un fichier déjà ouvert en binaire seekable
+    (zip et PDF en ont besoin) ; un flux non seekable est recopié dans un
+    fichier temporaire, en mémoire seulement s'il est petit
+    """
+    if isinstance(source, (str, Path)):
+        with open(source, 'rb') as fichier:
+            yield fichier
+        return
+
+    if hasattr(source, 'storage'):  # FieldFile
+        source.open('rb')
+        fichier = source.file
+        try:
+            with _seekable(fichier) as lisible:
+                yield lisible
+        finally:
+            source.close()
+        return
+
+    with _seekable(source) as lisible:
+        yield lisible
+
+
+@contextmanager
+def _seekable(fichier):
+    if getattr(fichier, 'seekable', lambda: False)():
+        fichier.seek(0)
+        yield fichier
+        return
+    with tempfile.SpooledTemporaryFile(max_size=8 * TAILLE_BLOC_LECTURE) as copie:
+        shutil.copyfileobj(fichier, copie, TAILLE_BLOC_LECTURE)
+        copie.seek(0)
+        yield copie
+
+
+def empreinte_fichier(fichier):
+    """sha256 du contenu, lu par blocs"""
+    sha = hashlib.sha256(VERSION_EXTRACTION.encode())
+    fichier.seek(0)
+    for bloc in iter(lambda: fichier.read(TAILLE_BLOC_LECTURE), b''):
+        sha.update(bloc)
+    fichier.seek(0)
+    return sha.hexdigest()
+
+
+def _assembler(pages, max_caracteres):
+    """Concatène les pages jusqu'au plafond ; le générateur est fermé dès qu'il est atteint"""
+    morceaux = []
+    total = 0
+    nb_pages = 0
+    tronque = False
+    try:
+        for page in pages:
+            nb_pages += 1
+            if total + len(page) > max_caracteres:
+                morceaux.append(page[:max_caracteres - total])
+                tronque = True
+                break
+            morceaux.append(page)
+            total += len(page)
+    finally:
+        pages.close()
+    return '\n\n'.join(m.strip() for m in morceaux if m.strip()), nb_pages, tronque
+
+
+def extraire_texte(source, nom_fichier=None, max_caracteres=None):
+    """
+    Texte d'un fichier (chemin, FieldFile ou fichier ouvert), depuis le cache
+    si le même contenu a déjà été extrait. Retourne None si le format n'est
+    pas pris en charge ; lève si l'extraction échoue.
+    """
+    nom_fichier = nom_fichier or str(getattr(source, 'name', source))
+    extension = Path(nom_fichier).suffix.lower()
+    if extension not in EXTRACTEURS:
+        return None
+    nom_extracteur, fonction = EXTRACTEURS[extension]
+    max_caracteres = max_caracteres or _parametre('EXTRACTION_MAX_CARACTERES', 500_000)
+
+    with _ouvrir(source) as fichier:
+        empreinte = empreinte_fichier(fichier)
+        if TexteExtrait.objects.filter(empreinte=empreinte).update(dernier_acces=timezone.now()):
+            return TexteExtrait.objects.values_list('texte', flat=True).get(empreinte=empreinte)
+
+        texte, nb_pages, tronque = _assembler(fonction(fichier), max_caracteres)
+        taille = fichier.seek(0, io.SEEK_END)
+
+    TexteExtrait.objects.update_or_create(
+        empreinte=empreinte,
+        defaults={
+            'extracteur': nom_extracteur,
+            'texte': texte,
+            'nb_pages': nb_pages,
+            'tronque': tronque,
+            'taille_fichier': taille,
+            'dernier_acces': timezone.now(),
+        },
+    )
+    print(f"📄 Texte extrait ({nom_extracteur}): {Path(nom_fichier).name}, {nb_pages} page(s), {len(texte)} caractères")
+    return texte
+
+
+def texte_fichier(source, nom_fichier=None):
+    """Comme extraire_texte, mais ne lève jamais : None si le texte est indisponible"""
+    try:
+        return extraire_texte(source, nom_fichier)
+    except Exception as e:
+        print(f"⚠️ Extraction de texte impossible ({nom_fichier or getattr(source, 'name', source)}): {e}")
+        return None
+
+
+# ----------------------------------------------------------------------
+# Extraction en tâche de fond
+# ----------------------------------------------------------------------
+
+def programmer_extraction(instance, champ='fichier', champ_texte=None):
+    """
+    Extrait le texte du fichier d'un objet dans un worker, après le commit.
+    Si ``champ_texte`` est donné et vide, il est rempli avec le texte extrait.
+    """
+    fichier = getattr(instance, champ, None)
+    if not fichier or not extension_supportee(fichier.name):
+        return
+    modele = instance._meta.label
+
+    def lancer():
+        from .tasks_extraction import extraire_texte_objet as tache_extraction
+        try:
+            tache_extraction.delay(modele, instance.pk, champ, champ_texte)
+        except Exception as e:
+            print(f"⚠️ Celery indisponible, extraction de {modele} {instance.pk} reportée: {e}")
+
+    transaction.on_commit(lancer)
+
+
+def extraire_texte_objet(modele, objet_id, champ='fichier', champ_texte=None):
+    """Corps de la tâche d'extraction : met le texte en cache et remplit ``champ_texte`` si vide"""
+    from django.apps import apps
+
+    classe = apps.get_model(modele)
+    instance = classe.objects.filter(pk=objet_id).first()
+    fichier = getattr(instance, champ, None) if instance else None
+    if not fichier:
+        return None
+
+    texte = extraire_texte(fichier)
+    if texte and champ_texte and not getattr(instance, champ_texte):
+        # update() : ne redéclenche pas les signaux post_save
+        classe.objects.filter(pk=objet_id).update(**{champ_texte: texte})
+    return len(texte or '')
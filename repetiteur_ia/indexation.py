@@ -0,0 +1,423 @@
+# repetiteur_ia/indexation.py
+"""
+Pipeline d'indexation du vectorstore FAISS.
+
+Les signaux ne font qu'enregistrer une ligne ``IndexationEnAttente`` : aucun
+encodage ni accès à l'index dans le thread de la requête. Un worker Celery
+draine ensuite la file par lots, encode tous les textes d'un lot en un seul
+appel au modèle, ajoute les vecteurs à l'index en bloc et ne sauvegarde
+l'index qu'une fois par lot.
+
+Chaque document porte un identifiant stable dérivé de la clé primaire
+(``message:<id>``, ``session:<id>``, ``document:<id>:<chunk>``) : une suppression en base devient une
+suppression ciblée dans l'index. Les documents sont rangés dans le sous-index
+du niveau de l'élève et portent des métadonnées structurées (eleve_id,
+matiere, niveau, source, origine) utilisées par la recherche filtrée. La reconstruction complète n'est plus
+déclenchée que par la commande ``reconstruire_vectorstore``.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from langchain_community.vectorstores import FAISS
+
+from .embeddings import (
+    embeddings, creer_vector_store_vide, PARTITION_GENERALE,
+    get_vector_store_manager, partition_pour_niveau, partitions_existantes,
+    supprimer_ids_index,
+)
+from .models import (
+    IndexationEnAttente, MessageIA, SessionIA, EmbeddingIA, doc_id_vectorstore,
+)
+
+TAILLE_LOT = getattr(settings, 'EMBEDDING_BATCH_SIZE', 64)
+MAX_TENTATIVES = getattr(settings, 'EMBEDDING_MAX_RETRIES', 5)
+
+
+def formater_message(message):
+    """Texte indexé pour un message (question d'élève ou réponse de l'IA)"""
+    session = message.session
+    if message.role == 'élève':
+        eleve = session.eleve
+        eleve_nom = eleve.user.get_full_name() or eleve.user.username
+        contenu_formate = f"""
+        QUESTION ÉLÈVE: {message.contenu}
+        Élève: {eleve_nom}
+        Niveau: {eleve.get_niveau_display()}
+        Classe: {eleve.get_classe_display()}
+        Session: {session.titre}
+        Date: {message.date_envoi}
+        """
+    else:
+        contenu_formate = f"""
+        RÉPONSE IA: {message.contenu}
+        Session: {session.titre}
+        Date: {message.date_envoi}
+        """
+    return contenu_formate.strip()
+
+
+def formater_session(session):
+    """Texte indexé pour l'en-tête d'une session IA"""
+    eleve = session.eleve
+    contenu_formate = f"""
+    SESSION: {session.titre}
+    Élève: {eleve.user.get_full_name() or eleve.user.username}
+    Niveau: {eleve.get_niveau_display()}
+    Classe: {eleve.get_classe_display()}
+    Date: {session.date_creation}
+    """
+    return contenu_formate.strip()
+
+
+def metadata_document(source, objet_id, eleve_id=None, niveau=None, matiere=None,
+                      origine_type=None, origine_id=None, **extra):
+    """
+    Métadonnées communes à tous les documents du vectorstore.
+    ``origine_type``/``origine_id`` désignent l'objet pédagogique d'origine
+    (``document_pedagogique``, ``soumission``...) quand il existe.
+    """
+    metadata = {
+        'source': source,
+        'objet_id': objet_id,
+        'eleve_id': eleve_id,
+        'niveau': niveau,
+        'matiere': matiere,
+        'origine_type': origine_type,
+        'origine_id': origine_id,
+    }
+    metadata.update(extra)
+    return metadata
+
+
+def partition_document(document):
+    """Partition (sous-index) d'un document (doc_id, texte, metadata)"""
+    return partition_pour_niveau(document[2].get('niveau'))
+
+
+def document_message(message):
+    """(doc_id, texte, metadata) d'un message pour le vectorstore"""
+    session = message.session
+    metadata = metadata_document(
+        IndexationEnAttente.SOURCE_MESSAGE, message.id,
+        eleve_id=session.eleve_id,
+        niveau=session.eleve.niveau,
+        session_id=message.session_id,
+        role=message.role,
+    )
+    return doc_id_vectorstore(IndexationEnAttente.SOURCE_MESSAGE, message.id), formater_message(message), metadata
+
+
+def document_session(session):
+    """(doc_id, texte, metadata) d'une session IA pour le vectorstore"""
+    metadata = metadata_document(
+        IndexationEnAttente.SOURCE_SESSION, session.id,
+        eleve_id=session.eleve_id,
+        niveau=session.eleve.niveau,
+        session_id=session.id,
+    )
+    return doc_id_vectorstore(IndexationEnAttente.SOURCE_SESSION, session.id), formater_session(session), metadata
+
+
+def grouper_par_partition(documents, vecteurs):
+    """Regroupe documents et vecteurs par sous-index : {partition: [(document, vecteur), ...]}"""
+    groupes = {}
+    for document, vecteur in zip(documents, vecteurs):
+        groupes.setdefault(partition_document(document), []).append((document, vecteur))
+    return groupes
+
+
+def _programmer_drainage():
+    """
+    Programme un drainage de la file, sauf s'il y en a déjà un de prévu : la clé
+    de cache vit le temps du délai, toutes les écritures validées d'ici là
+    (même transaction ou non) seront prises par ce drainage.
+    """
+    delai = getattr(settings, 'EMBEDDING_BATCH_DELAY', 2)
+    if not cache.add('indexation:drainage_programme', True, timeout=max(1, delai)):
+        return
+    try:
+        from .tasks_embeddings import traiter_file_indexation
+        traiter_file_indexation.apply_async(countdown=delai)
+    except Exception as e:
+        cache.delete('indexation:drainage_programme')
+        print(f"⚠️ Drainage indexation non programmé (sera repris périodiquement): {e}")
+
+
+def mettre_en_file(type_source, objet_id, operation=IndexationEnAttente.OPERATION_AJOUT):
+    """
+    Enregistre une écriture à indexer et programme le drainage après le commit.
+    Si le broker est indisponible, la ligne reste en base et sera traitée
+    par le drainage périodique.
+    """
+    IndexationEnAttente.objects.create(
+        type_source=type_source, objet_id=objet_id, operation=operation
+    )
+    # Idempotent : une suppression en cascade de 500 messages ne programme qu'un drainage
+    transaction.on_commit(_programmer_drainage)
+
+
+def _supprimer_documents(store, doc_ids):
+    """
+    Retire de l'index les documents présents ; retourne le nombre supprimé.
+    Sûr pour tous les types d'index (voir ``supprimer_ids_index``) : les
+    positions restent contiguës, un ré-ajout des mêmes ids dans la même
+    mutation ne peut pas écraser un autre document.
+    """
+    presents = set(store.index_to_docstore_id.values())
+    a_supprimer = [doc_id for doc_id in doc_ids if doc_id in presents]
+    if a_supprimer:
+        supprimer_ids_index(store, a_supprimer)
+    return len(a_supprimer)
+
+
+def _traiter_lot(lot):
+    """Encode, indexe et supprime un lot ; retourne le nombre de documents modifiés"""
+    # Documents pédagogiques et cours : découpés en chunks, traités à part
+    contenus = [e for e in lot if e.type_source in IndexationEnAttente.SOURCES_CONTENU]
+    lot = [e for e in lot if e.type_source not in IndexationEnAttente.SOURCES_CONTENU]
+    modifies = 0
+    if contenus:
+        from .indexation_contenus import traiter_entrees_contenus
+        modifies += traiter_entrees_contenus(contenus)
+
+    ajouts = [e for e in lot if e.operation == IndexationEnAttente.OPERATION_AJOUT]
+    suppressions = [e.doc_id for e in lot if e.operation == IndexationEnAttente.OPERATION_SUPPRESSION]
+
+    ids_messages = [e.objet_id for e in ajouts if e.type_source == IndexationEnAttente.SOURCE_MESSAGE]
+    ids_sessions = [e.objet_id for e in ajouts if e.type_source == IndexationEnAttente.SOURCE_SESSION]
+
+    # Les objets supprimés entre-temps sont simplement absents de ces requêtes
+    messages = list(
+        MessageIA.objects.filter(id__in=ids_messages)
+        .select_related('session__eleve__user', 'embedding')
+        .order_by('id')
+    )
+    sessions = list(
+        SessionIA.objects.filter(id__in=ids_sessions)
+        .select_related('eleve__user')
+        .order_by('id')
+    )
+
+    # Vecteurs des messages : ceux d'EmbeddingIA, l'encodage n'a lieu qu'une fois
+    vecteurs_messages, _ = _vecteurs_messages(messages)
+
+    documents = [document_session(s) for s in sessions] + [document_message(m) for m in messages]
+    if not documents and not suppressions:
+        return modifies
+
+    textes = [texte for _, texte, _ in documents]
+    vecteurs_sessions = embeddings.embed_documents(textes[:len(sessions)]) if sessions else []
+    vecteurs_index = list(vecteurs_sessions) + list(vecteurs_messages)
+
+    groupes = grouper_par_partition(documents, vecteurs_index)
+
+    # Documents retirés de tous les sous-index avant ajout : les suppressions, et
+    # les documents ré-indexés dont une version précédente a pu être rangée dans
+    # une autre partition (niveau de l'élève modifié)
+    a_retirer = [doc_id for doc_id, _, _ in documents] + suppressions
+
+    # Sous-index qui ne reçoivent rien : réécrits seulement s'ils contiennent un de ces documents
+    for partition in partitions_existantes():
+        if partition in groupes:
+            continue
+        manager = get_vector_store_manager(partition)
+        presents = set(manager.get().index_to_docstore_id.values())
+        if presents.intersection(a_retirer):
+            modifies += manager.update(lambda store: _supprimer_documents(store, a_retirer))
+
+    for partition, elements in groupes.items():
+        docs_partition = [document for document, _ in elements]
+
+        def _appliquer(store, elements=elements, docs_partition=docs_partition):
+            # Ré-indexation idempotente : on retire d'abord une éventuelle version précédente
+            retires = _supprimer_documents(store, a_retirer)
+            store.add_embeddings(
+                [(texte, vecteur) for (_, texte, _), vecteur in elements],
+                metadatas=[metadata for _, _, metadata in docs_partition],
+                ids=[doc_id for doc_id, _, _ in docs_partition],
+            )
+            return retires + len(docs_partition)
+
+        # Une seule sauvegarde par sous-index pour tout le lot
+        modifies += get_vector_store_manager(partition).update(_appliquer)
+
+    return modifies
+
+
+def _traiter_entrees(lot):
+    """
+    Traite un lot ; s'il échoue, le rejoue par moitiés pour isoler les entrées
+    fautives. Retourne (documents modifiés, ids traités, {id: erreur}).
+    """
+    try:
+        with transaction.atomic():
+            return _traiter_lot(lot), [e.id for e in lot], {}
+    except Exception as e:
+        if len(lot) == 1:
+            return 0, [], {lot[0].id: e}
+        milieu = len(lot) // 2
+        modifies, traites, echecs = _traiter_entrees(lot[:milieu])
+        modifies_fin, traites_fin, echecs_fin = _traiter_entrees(lot[milieu:])
+        return modifies + modifies_fin, traites + traites_fin, {**echecs, **echecs_fin}
+
+
+def traiter_file_indexation(taille_lot=None):
+    """Draine la file d'indexation par lots ; retourne le nombre d'éléments indexés"""
+    taille_lot = taille_lot or TAILLE_LOT
+    total = 0
+
+    while True:
+        with transaction.atomic():
+            lot = list(
+                IndexationEnAttente.objects.select_for_update(skip_locked=True)
+                .filter(tentatives__lt=MAX_TENTATIVES)
+                .order_by('id')[:taille_lot]
+            )
+            if not lot:
+                break
+
+            modifies, traites, echecs = _traiter_entrees(lot)
+            total += modifies
+            IndexationEnAttente.objects.filter(id__in=traites).delete()
+
+            # Seules les entrées fautives consomment une tentative
+            for entree_id, erreur in echecs.items():
+                print(f"❌ Erreur indexation (entrée {entree_id}): {erreur}")
+                IndexationEnAttente.objects.filter(id=entree_id).update(
+                    tentatives=F('tentatives') + 1,
+                    derniere_erreur=str(erreur)[:1000],
+                )
+            if echecs:
+                break  # réessayées au prochain drainage
+
+    if total:
+        print(f"✅ Vectorstore mis à jour : {total} document(s) ajouté(s) ou supprimé(s)")
+    return total
+
+
+def _vecteurs_messages(messages):
+    """
+    Retourne les vecteurs des messages, en réutilisant ``EmbeddingIA`` et en
+    n'encodant (puis enregistrant) que les messages qui n'en ont pas encore.
+    Les messages doivent avoir été chargés avec ``select_related('embedding')``.
+    """
+    vecteurs = {}
+    manquants = []
+    for message in messages:
+        try:
+            vecteurs[message.id] = message.embedding.vector
+        except EmbeddingIA.DoesNotExist:
+            manquants.append(message)
+
+    if manquants:
+        nouveaux = embeddings.embed_documents([m.contenu for m in manquants])
+        EmbeddingIA.objects.bulk_create(
+            [EmbeddingIA(message=m, vector=v) for m, v in zip(manquants, nouveaux)],
+            ignore_conflicts=True,
+        )
+        vecteurs.update({m.id: v for m, v in zip(manquants, nouveaux)})
+
+    return [vecteurs[m.id] for m in messages], len(manquants)
+
+
+def _ajouter_chunk(stores, documents, vecteurs):
+    """Ajoute des vecteurs précalculés aux sous-index (créés au premier chunk)"""
+    for partition, elements in grouper_par_partition(documents, vecteurs).items():
+        text_embeddings = [(texte, vecteur) for (_, texte, _), vecteur in elements]
+        metadatas = [metadata for (_, _, metadata), _ in elements]
+        ids = [doc_id for (doc_id, _, _), _ in elements]
+        if partition not in stores:
+            stores[partition] = FAISS.from_embeddings(text_embeddings, embeddings, metadatas=metadatas, ids=ids)
+        else:
+            stores[partition].add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+
+
+def reconstruire_vectorstore_complet(taille_chunk=None):
+    """
+    Reconstruit le vectorstore complet avec tous les messages historiques
+    et les chunks des documents pédagogiques et des cours.
+    Opération hors ligne : à lancer via ``manage.py reconstruire_vectorstore``.
+
+    Les vecteurs déjà stockés dans ``EmbeddingIA`` sont lus par chunks
+    (``iterator()``) et ajoutés tels quels : seuls les messages sans vecteur
+    passent par le modèle.
+    """
+    taille_chunk = taille_chunk or getattr(settings, 'EMBEDDING_REBUILD_CHUNK_SIZE', 2000)
+    try:
+        stores = {}
+        total = 0
+        encodes = 0
+
+        # En-têtes de session : peu nombreux, sans vecteur stocké
+        sessions = list(SessionIA.objects.select_related('eleve__user').order_by('id'))
+        print(f"🔍 Reconstruction vectorstore: {len(sessions)} sessions trouvées")
+        for i in range(0, len(sessions), taille_chunk):
+            documents = [document_session(s) for s in sessions[i:i + taille_chunk]]
+            vecteurs = embeddings.embed_documents([texte for _, texte, _ in documents])
+            _ajouter_chunk(stores, documents, vecteurs)
+            total += len(documents)
+            encodes += len(documents)
+
+        # Messages : vecteurs relus depuis la base, par chunks
+        messages = (
+            MessageIA.objects.select_related('session__eleve__user', 'embedding')
+            .order_by('session_id', 'date_envoi')
+            .iterator(chunk_size=taille_chunk)
+        )
+        chunk = []
+        for message in messages:
+            chunk.append(message)
+            if len(chunk) >= taille_chunk:
+                vecteurs, nb_encodes = _vecteurs_messages(chunk)
+                _ajouter_chunk(stores, [document_message(m) for m in chunk], vecteurs)
+                total += len(chunk)
+                encodes += nb_encodes
+                chunk = []
+        if chunk:
+            vecteurs, nb_encodes = _vecteurs_messages(chunk)
+            _ajouter_chunk(stores, [document_message(m) for m in chunk], vecteurs)
+            total += len(chunk)
+            encodes += nb_encodes
+
+        # Documents pédagogiques et cours, découpés en chunks
+        from .indexation_contenus import documents_catalogue
+        for documents, vecteurs in documents_catalogue(taille_chunk):
+            _ajouter_chunk(stores, documents, vecteurs)
+            total += len(documents)
+            encodes += len(documents)
+
+        if stores:
+            for partition, store in stores.items():
+                get_vector_store_manager(partition).replace(store)
+            print(
+                f"✅ Vectorstore reconstruit avec {total} éléments de conversation "
+                f"({encodes} encodé(s), partitions: {', '.join(sorted(stores))})"
+            )
+            return total
+        else:
+            print("⚠️ Aucune conversation trouvée pour le vectorstore")
+            return 0
+
+    except Exception as e:
+        print(f"❌ Erreur reconstruction vectorstore: {e}")
+        return 0
+
+
+def initialiser_vectorstore():
+    """Fonction pour initialiser le vectorstore au démarrage de l'application"""
+    try:
+        # Vérifier si le vectorstore existe déjà
+        if not partitions_existantes():
+            print("🔄 Initialisation du vectorstore avec les conversations existantes...")
+            count = reconstruire_vectorstore_complet()
+            if count > 0:
+                print(f"✅ Vectorstore initialisé avec {count} éléments")
+            else:
+                # Vectorstore vide : aucun document factice renvoyé aux recherches
+                get_vector_store_manager(PARTITION_GENERALE).replace(creer_vector_store_vide())
+                print("✅ Vectorstore initialisé (vide)")
+        else:
+            print("✅ Vectorstore déjà initialisé")
+    except Exception as e:
+        print(f"❌ Erreur initialisation vectorstore: {e}")
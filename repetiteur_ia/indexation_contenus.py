@@ -0,0 +1,273 @@
+"""
+Indexation des contenus pédagogiques (DocumentPedagogique, Cours) dans le vectorstore.
+
+Le texte d'un contenu (champ texte + texte extrait du fichier joint) est
+découpé en chunks bornés en tokens, qui se chevauchent pour ne pas couper
+une explication en deux. Chaque chunk est un document FAISS
+(``document:<id>:<position>``) accompagné d'une ligne ``ChunkIndexe`` qui
+garde l'empreinte de son texte : une ré-indexation ne réencode que les chunks
+dont le texte a changé et retire ceux qui n'existent plus.
+
+Les écritures passent par la même file (IndexationEnAttente) que les
+messages ; la commande ``indexer_contenus`` traite tout le catalogue.
+"""
+import hashlib
+
+from django.conf import settings
+
+from .budget_prompt import encodage_tokens
+from .embeddings import embeddings, get_vector_store_manager, partition_pour_niveau
+from .extraction import texte_fichier
+from .indexation import _supprimer_documents, metadata_document
+from .models import ChunkIndexe, DocumentPedagogique, IndexationEnAttente, doc_id_chunk
+
+CHUNK_TOKENS = getattr(settings, 'INDEXATION_CHUNK_TOKENS', 200)
+CHUNK_CHEVAUCHEMENT = getattr(settings, 'INDEXATION_CHUNK_CHEVAUCHEMENT', 40)
+
+NIVEAUX_COLLEGE = ('6ème', '5ème', '4ème', '3ème')
+
+
+def decouper_en_chunks(texte, taille=CHUNK_TOKENS, chevauchement=CHUNK_CHEVAUCHEMENT):
+    """Fenêtres de ``taille`` tokens avançant de ``taille - chevauchement`` : [(texte, nb_tokens)]"""
+    texte = (texte or '').strip()
+    if not texte:
+        return []
+    encodage = encodage_tokens()
+    tokens = encodage.encode(texte)
+    pas = max(taille - chevauchement, 1)
+    chunks = []
+    for debut in range(0, len(tokens), pas):
+        fenetre = tokens[debut:debut + taille]
+        chunks.append((encodage.decode(fenetre).strip(), len(fenetre)))
+        if debut + taille >= len(tokens):
+            break
+    return chunks
+
+
+def _modele(type_source):
+    if type_source == IndexationEnAttente.SOURCE_DOCUMENT:
+        return DocumentPedagogique
+    from cours.models import Cours
+    return Cours
+
+
+def _texte_avec_fichier(texte, fichier):
+    texte = (texte or '').strip()
+    if fichier:
+        texte_joint = (texte_fichier(fichier) or '').strip()
+        # contenu_texte a pu être rempli à partir du fichier lui-même
+        if texte_joint and texte_joint != texte:
+            texte = f"{texte}\n\n{texte_joint}".strip()
+    return texte
+
+
+def _niveau_cours(cours):
+    """Niveau au sens des partitions (college / lycee) d'après le cycle ou la classe"""
+    if cours.cycle:
+        return cours.cycle
+    if cours.niveau:
+        return 'collège' if cours.niveau in NIVEAUX_COLLEGE else 'lycée'
+    return None
+
+
+def description_contenu(type_source, objet):
+    """
+    (texte, en-tête, métadonnées) d'un contenu indexable, ou None s'il ne doit
+    pas figurer dans l'index (brouillon non public, texte vide)
+    """
+    if type_source == IndexationEnAttente.SOURCE_DOCUMENT:
+        if not objet.est_public:
+            return None
+        texte = _texte_avec_fichier(objet.contenu_texte, objet.fichier)
+        entete = f"{objet.get_type_document_display().upper()}: {objet.titre} ({objet.matiere})"
+        metadata = metadata_document(
+            type_source, objet.id, niveau=objet.niveau, matiere=objet.matiere,
+            origine_type='document_pedagogique', origine_id=objet.id,
+        )
+    else:
+        if not objet.est_public:
+            return None
+        texte = _texte_avec_fichier(
+            "\n\n".join(t for t in [objet.objectifs, objet.contenu] if t), objet.fichier
+        )
+        entete = f"COURS: {objet.titre} ({objet.get_matiere_display()})"
+        metadata = metadata_document(
+            type_source, objet.id, niveau=_niveau_cours(objet), matiere=objet.matiere,
+            origine_type='cours', origine_id=objet.id,
+        )
+    if not texte:
+        return None
+    return texte, entete, metadata
+
+
+def chunks_contenu(type_source, objet):
+    """Chunks à indexer pour un contenu : [(position, texte, metadata, empreinte, nb_tokens)]"""
+    description = description_contenu(type_source, objet)
+    if description is None:
+        return []
+    texte, entete, metadata = description
+    chunks = []
+    for position, (morceau, nb_tokens) in enumerate(decouper_en_chunks(texte)):
+        texte_chunk = f"{entete}\n{morceau}"
+        chunks.append((
+            position,
+            texte_chunk,
+            {**metadata, 'position': position},
+            hashlib.sha256(texte_chunk.encode('utf-8')).hexdigest(),
+            nb_tokens,
+        ))
+    return chunks
+
+
+def _retirer(par_partition):
+    """Retire des sous-index les doc_ids groupés par partition ; retourne le nombre retiré"""
+    retires = 0
+    for partition, doc_ids in par_partition.items():
+        manager = get_vector_store_manager(partition)
+        # Sous-index réécrit seulement s'il contient un des chunks
+        if not set(manager.get().index_to_docstore_id.values()).intersection(doc_ids):
+            continue
+        retires += manager.update(lambda store, doc_ids=doc_ids: _supprimer_documents(store, doc_ids))
+    return retires
+
+
+def indexer_contenus(type_source, objet_ids, forcer=False):
+    """
+    Synchronise l'index avec les contenus donnés : encode en un lot les chunks
+    nouveaux ou modifiés, retire les chunks disparus. ``forcer`` réencode tout.
+    Retourne le nombre de documents FAISS ajoutés ou retirés.
+    """
+    objets = {o.id: o for o in _modele(type_source).objects.filter(id__in=objet_ids)}
+    existants = {}
+    for chunk in ChunkIndexe.objects.filter(type_source=type_source, objet_id__in=objet_ids):
+        existants.setdefault(chunk.objet_id, {})[chunk.position] = chunk
+
+    a_encoder = []   # (objet_id, position, texte, metadata, empreinte, nb_tokens, partition)
+    a_retirer = {}   # partition -> [doc_id]
+    lignes_obsoletes = []
+
+    for objet_id in objet_ids:
+        objet = objets.get(objet_id)
+        chunks = chunks_contenu(type_source, objet) if objet else []
+        anciens = existants.get(objet_id, {})
+        for position, texte, metadata, empreinte, nb_tokens in chunks:
+            partition = partition_pour_niveau(metadata.get('niveau'))
+            ancien = anciens.get(position)
+            if ancien and not forcer and ancien.empreinte == empreinte and ancien.partition == partition:
+                continue
+            if ancien and ancien.partition != partition:
+                a_retirer.setdefault(ancien.partition, []).append(ancien.doc_id)
+            a_encoder.append((objet_id, position, texte, metadata, empreinte, nb_tokens, partition))
+        for position, ancien in anciens.items():
+            if position >= len(chunks):
+                a_retirer.setdefault(ancien.partition, []).append(ancien.doc_id)
+                lignes_obsoletes.append(ancien.id)
+
+    modifies = _retirer(a_retirer)
+
+    if a_encoder:
+        vecteurs = embeddings.embed_documents([element[2] for element in a_encoder])
+        par_partition = {}
+        for element, vecteur in zip(a_encoder, vecteurs):
+            par_partition.setdefault(element[6], []).append((element, vecteur))
+
+        for partition, elements in par_partition.items():
+            def _appliquer(store, elements=elements):
+                doc_ids = [doc_id_chunk(type_source, e[0], e[1]) for e, _ in elements]
+                # Ré-indexation idempotente : l'ancienne version du chunk est retirée d'abord
+                # (IVF : labels renumérotés, HNSW : positions marquées supprimées)
+                _supprimer_documents(store, doc_ids)
+                store.add_embeddings(
+                    [(e[2], vecteur) for e, vecteur in elements],
+                    metadatas=[e[3] for e, _ in elements],
+                    ids=doc_ids,
+                )
+                return len(elements)
+
+            modifies += get_vector_store_manager(partition).update(_appliquer)
+
+        for objet_id, position, _, _, empreinte, nb_tokens, partition in a_encoder:
+            ChunkIndexe.objects.update_or_create(
+                type_source=type_source, objet_id=objet_id, position=position,
+                defaults={'partition': partition, 'empreinte': empreinte, 'nb_tokens': nb_tokens},
+            )
+
+    if lignes_obsoletes:
+        ChunkIndexe.objects.filter(id__in=lignes_obsoletes).delete()
+    return modifies
+
+
+def supprimer_contenus(type_source, objet_ids):
+    """Retire de l'index tous les chunks des contenus supprimés"""
+    chunks = list(ChunkIndexe.objects.filter(type_source=type_source, objet_id__in=objet_ids))
+    a_retirer = {}
+    for chunk in chunks:
+        a_retirer.setdefault(chunk.partition, []).append(chunk.doc_id)
+    retires = _retirer(a_retirer)
+    ChunkIndexe.objects.filter(id__in=[c.id for c in chunks]).delete()
+    return retires
+
+
+def traiter_entrees_contenus(entrees):
+    """Partie « contenus » d'un lot de la file d'indexation"""
+    modifies = 0
+    for type_source in IndexationEnAttente.SOURCES_CONTENU:
+        ajouts = sorted({
+            e.objet_id for e in entrees
+            if e.type_source == type_source and e.operation == IndexationEnAttente.OPERATION_AJOUT
+        })
+        suppressions = sorted({
+            e.objet_id for e in entrees
+            if e.type_source == type_source and e.operation == IndexationEnAttente.OPERATION_SUPPRESSION
+        })
+        if suppressions:
+            modifies += supprimer_contenus(type_source, suppressions)
+        if ajouts:
+            modifies += indexer_contenus(type_source, ajouts)
+    return modifies
+
+
+def documents_catalogue(taille_chunk=2000):
+    """
+    Pour la reconstruction complète : (documents, vecteurs) par paquets de
+    chunks, en réécrivant les lignes ChunkIndexe correspondantes
+    """
+    ChunkIndexe.objects.all().delete()
+    for type_source in IndexationEnAttente.SOURCES_CONTENU:
+        documents, lignes = [], []
+        for objet in _modele(type_source).objects.order_by('id').iterator(chunk_size=200):
+            for position, texte, metadata, empreinte, nb_tokens in chunks_contenu(type_source, objet):
+                documents.append((doc_id_chunk(type_source, objet.id, position), texte, metadata))
+                lignes.append(ChunkIndexe(
+                    type_source=type_source, objet_id=objet.id, position=position,
+                    partition=partition_pour_niveau(metadata.get('niveau')),
+                    empreinte=empreinte, nb_tokens=nb_tokens,
+                ))
+            if len(documents) >= taille_chunk:
+                ChunkIndexe.objects.bulk_create(lignes)
+                yield documents, embeddings.embed_documents([texte for _, texte, _ in documents])
+                documents, lignes = [], []
+        if documents:
+            ChunkIndexe.objects.bulk_create(lignes)
+            yield documents, embeddings.embed_documents([texte for _, texte, _ in documents])
+
+
+def indexer_catalogue(taille_lot=None, forcer=False, sources=None, sortie=print):
+    """Indexe (ou met à jour) tous les documents et cours, par lots ; retourne (contenus, modifiés)"""
+    taille_lot = taille_lot or getattr(settings, 'EMBEDDING_BATCH_SIZE', 64)
+    total_contenus = 0
+    total_modifies = 0
+    for type_source in sources or IndexationEnAttente.SOURCES_CONTENU:
+        ids = list(_modele(type_source).objects.order_by('id').values_list('id', flat=True))
+        # Contenus supprimés sans que le signal ait été traité
+        orphelins = set(
+            ChunkIndexe.objects.filter(type_source=type_source)
+            .exclude(objet_id__in=ids).values_list('objet_id', flat=True)
+        )
+        if orphelins:
+            total_modifies += supprimer_contenus(type_source, sorted(orphelins))
+        for i in range(0, len(ids), taille_lot):
+            total_modifies += indexer_contenus(type_source, ids[i:i + taille_lot], forcer=forcer)
+            total_contenus += len(ids[i:i + taille_lot])
+        sortie(f"📚 {type_source}: {len(ids)} contenu(s) parcouru(s)")
+    return total_contenus, total_modifies
@@ -0,0 +1,70 @@
+# repetiteur_ia/management/commands/benchmark_vectorstore.py
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from repetiteur_ia.embeddings import TYPES_INDEX, INDEX_FLAT, creer_index_faiss, type_index
+from repetiteur_ia.models import EmbeddingIA
+
+
+class Command(BaseCommand):
+    help = 'Compare rappel et latence des index FAISS (flat, ivfpq, hnsw) sur les vecteurs MessageIA réels'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--k', type=int, default=5, help='Nombre de voisins recherchés')
+        parser.add_argument('--requetes', type=int, default=200, help='Nombre de requêtes tirées du corpus')
+        parser.add_argument('--modes', nargs='+', default=list(TYPES_INDEX), choices=TYPES_INDEX)
+        parser.add_argument('--limite', type=int, default=None, help='Nombre maximum de vecteurs chargés')
+
+    def handle(self, *args, **options):
+        k = options['k']
+        vecteurs = self.charger_vecteurs(options['limite'])
+        if len(vecteurs) <= k:
+            raise CommandError(f"Pas assez de vecteurs EmbeddingIA ({len(vecteurs)}) pour k={k}")
+
+        rng = np.random.default_rng(42)
+        nb_requetes = min(options['requetes'], len(vecteurs))
+        requetes = vecteurs[rng.choice(len(vecteurs), nb_requetes, replace=False)]
+
+        self.stdout.write(f'📊 {len(vecteurs)} vecteurs, {nb_requetes} requêtes, k={k}')
+
+        # Vérité terrain : recherche exacte
+        reference = creer_index_faiss(vecteurs, INDEX_FLAT)
+        _, attendus = reference.search(requetes, k)
+
+        self.stdout.write(f"{'mode':<8} {'construction':>13} {'p50 (ms)':>10} {'p95 (ms)':>10} {'rappel@k':>10}")
+        for mode in options['modes']:
+            debut = time.perf_counter()
+            index = creer_index_faiss(vecteurs, mode)
+            duree_construction = time.perf_counter() - debut
+
+            latences = []
+            trouves = np.empty((nb_requetes, k), dtype=np.int64)
+            for i, requete in enumerate(requetes):
+                debut = time.perf_counter()
+                _, voisins = index.search(requete.reshape(1, -1), k)
+                latences.append((time.perf_counter() - debut) * 1000)
+                trouves[i] = voisins[0]
+
+            rappel = np.mean([
+                len(set(trouves[i]) & set(attendus[i])) / k for i in range(nb_requetes)
+            ])
+            nom = type_index(index)
+            if nom != mode:
+                nom = f"{mode}→{nom}"  # corpus trop petit pour l'entraînement
+            self.stdout.write(
+                f"{nom:<8} {duree_construction:>12.2f}s {np.percentile(latences, 50):>10.3f} "
+                f"{np.percentile(latences, 95):>10.3f} {rappel:>10.3f}"
+            )
+
+        self.stdout.write(self.style.SUCCESS('✅ Benchmark terminé'))
+
+    def charger_vecteurs(self, limite):
+        embeddings = EmbeddingIA.objects.only('vecteur_binaire', 'format_vecteur', 'echelle').order_by('created_at')
+        if limite:
+            embeddings = embeddings[:limite]
+        vecteurs = [e.vector for e in embeddings.iterator(chunk_size=2000)]
+        if not vecteurs:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.vstack(vecteurs).astype(np.float32)
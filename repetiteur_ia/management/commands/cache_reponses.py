@@ -0,0 +1,35 @@
+# repetiteur_ia/management/commands/cache_reponses.py
+from django.core.management.base import BaseCommand
+
+from repetiteur_ia.cache_reponses import invalider_cache, purger_cache, statistiques_cache
+
+
+class Command(BaseCommand):
+    help = 'Statistiques du cache de réponses du répétiteur (taux de hit, tokens économisés), purge et invalidation'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jours', type=int, default=30, help='Période des statistiques')
+        parser.add_argument('--purger', action='store_true', help='Supprime les entrées expirées ou d\'une ancienne version du prompt')
+        parser.add_argument('--invalider', action='store_true', help='Vide le cache (filtrable par --niveau / --matiere)')
+        parser.add_argument('--niveau', default=None)
+        parser.add_argument('--matiere', default=None)
+
+    def handle(self, *args, **options):
+        if options['invalider']:
+            total = invalider_cache(options['niveau'], options['matiere'])
+            self.stdout.write(self.style.SUCCESS(f'🗑️ {total} réponse(s) supprimée(s) du cache'))
+        elif options['purger']:
+            total = purger_cache()
+            self.stdout.write(self.style.SUCCESS(f'🧹 {total} réponse(s) obsolète(s) supprimée(s)'))
+
+        stats = statistiques_cache(options['jours'])
+        self.stdout.write(f"📊 Cache de réponses — {options['jours']} derniers jours")
+        self.stdout.write(f"   Entrées actives      : {stats['entrees']}")
+        self.stdout.write(f"   Requêtes             : {stats['requetes']}")
+        self.stdout.write(
+            f"   Hits                 : {stats['hits']} "
+            f"(exacts {stats['hits_exacts']}, sémantiques {stats['hits_semantiques']})"
+        )
+        self.stdout.write(f"   Taux de hit          : {stats['taux_hit']:.1%}")
+        self.stdout.write(f"   Hors cache           : {stats['contournements']} (questions liées à l'échange en cours)")
+        self.stdout.write(f"   Tokens économisés    : {stats['tokens_economises']}")
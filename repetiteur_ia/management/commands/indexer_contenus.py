@@ -0,0 +1,31 @@
+# repetiteur_ia/management/commands/indexer_contenus.py
+from django.core.management.base import BaseCommand
+
+from repetiteur_ia.indexation_contenus import indexer_catalogue
+from repetiteur_ia.models import IndexationEnAttente
+
+
+class Command(BaseCommand):
+    help = 'Découpe et indexe les documents pédagogiques et les cours dans le vectorstore (seuls les chunks modifiés sont réencodés)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--source', choices=IndexationEnAttente.SOURCES_CONTENU, action='append',
+            help='Limiter à une source (répétable) : document ou cours'
+        )
+        parser.add_argument('--forcer', action='store_true', help='Réencode tous les chunks, même inchangés')
+        parser.add_argument('--taille-lot', type=int, default=None, help='Nombre de contenus par lot')
+
+    def handle(self, *args, **options):
+        self.stdout.write('🔄 Indexation des contenus pédagogiques...')
+
+        contenus, modifies = indexer_catalogue(
+            taille_lot=options['taille_lot'],
+            forcer=options['forcer'],
+            sources=options['source'],
+            sortie=self.stdout.write,
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {contenus} contenu(s) parcouru(s), {modifies} chunk(s) ajouté(s), mis à jour ou retiré(s)'
+        ))
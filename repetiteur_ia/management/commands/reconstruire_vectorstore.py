@@ -0,0 +1,18 @@
+# repetiteur_ia/management/commands/reconstruire_vectorstore.py
+from django.core.management.base import BaseCommand
+
+from repetiteur_ia.indexation import reconstruire_vectorstore_complet
+
+
+class Command(BaseCommand):
+    help = 'Reconstruit entièrement le vectorstore FAISS à partir des sessions et messages IA (opération hors ligne)'
+
+    def handle(self, *args, **options):
+        self.stdout.write('🔄 Reconstruction complète du vectorstore...')
+
+        total = reconstruire_vectorstore_complet()
+
+        if total:
+            self.stdout.write(self.style.SUCCESS(f'✅ {total} document(s) indexé(s)'))
+        else:
+            self.stdout.write(self.style.WARNING('⚠️ Aucun document indexé'))
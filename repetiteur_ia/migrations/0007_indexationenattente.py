@@ -0,0 +1,28 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('repetiteur_ia', '0006_sessionrevisionprogrammee_quiz_genere_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndexationEnAttente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type_source', models.CharField(choices=[('message', 'Message IA'), ('session', 'Session IA')], max_length=20)),
+                ('objet_id', models.PositiveBigIntegerField()),
+                ('tentatives', models.PositiveSmallIntegerField(default=0)),
+                ('derniere_erreur', models.TextField(blank=True)),
+                ('date_creation', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Indexation en attente',
+                'verbose_name_plural': 'Indexations en attente',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['tentatives', 'id'], name='repetiteur__tentati_690473_idx')],
+            },
+        ),
+    ]
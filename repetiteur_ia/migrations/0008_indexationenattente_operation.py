@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('repetiteur_ia', '0007_indexationenattente'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='indexationenattente',
+            name='operation',
+            field=models.CharField(choices=[('ajout', 'Ajout'), ('suppression', 'Suppression')], default='ajout', max_length=20),
+        ),
+    ]
@@ -0,0 +1,63 @@
+import numpy as np
+from django.db import migrations, models
+
+
+def convertir_json_en_float32(apps, schema_editor):
+    """Convertit les vecteurs JSON existants en octets float32"""
+    EmbeddingIA = apps.get_model('repetiteur_ia', 'EmbeddingIA')
+    lot = []
+    for embedding in EmbeddingIA.objects.only('id', 'vector').iterator(chunk_size=1000):
+        embedding.vecteur_binaire = np.asarray(embedding.vector, dtype=np.float32).tobytes()
+        lot.append(embedding)
+        if len(lot) >= 1000:
+            EmbeddingIA.objects.bulk_update(lot, ['vecteur_binaire'])
+            lot = []
+    if lot:
+        EmbeddingIA.objects.bulk_update(lot, ['vecteur_binaire'])
+
+
+def convertir_float32_en_json(apps, schema_editor):
+    EmbeddingIA = apps.get_model('repetiteur_ia', 'EmbeddingIA')
+    lot = []
+    for embedding in EmbeddingIA.objects.only('id', 'vecteur_binaire', 'format_vecteur', 'echelle').iterator(chunk_size=1000):
+        valeurs = np.frombuffer(embedding.vecteur_binaire, dtype=embedding.format_vecteur).astype(np.float32)
+        if embedding.format_vecteur == 'int8':
+            valeurs = valeurs * embedding.echelle
+        embedding.vector = valeurs.tolist()
+        lot.append(embedding)
+        if len(lot) >= 1000:
+            EmbeddingIA.objects.bulk_update(lot, ['vector'])
+            lot = []
+    if lot:
+        EmbeddingIA.objects.bulk_update(lot, ['vector'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('repetiteur_ia', '0008_indexationenattente_operation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='embeddingia',
+            name='vecteur_binaire',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.AddField(
+            model_name='embeddingia',
+            name='format_vecteur',
+            field=models.CharField(choices=[('float32', 'float32'), ('float16', 'float16'), ('int8', 'int8 quantifié')], default='float32', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='embeddingia',
+            name='echelle',
+            field=models.FloatField(default=1.0),
+        ),
+        migrations.AlterField(
+            model_name='embeddingia',
+            name='vector',
+            field=models.JSONField(null=True),
+        ),
+        migrations.RunPython(convertir_json_en_float32, convertir_float32_en_json),
+    ]
@@ -0,0 +1,20 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('repetiteur_ia', '0009_embeddingia_vecteur_binaire'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='embeddingia',
+            name='vector',
+        ),
+        migrations.AlterField(
+            model_name='embeddingia',
+            name='vecteur_binaire',
+            field=models.BinaryField(),
+        ),
+    ]
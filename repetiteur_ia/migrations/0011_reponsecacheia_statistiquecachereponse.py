@@ -0,0 +1,50 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('repetiteur_ia', '0010_remove_embeddingia_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReponseCacheIA',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cle', models.CharField(max_length=64, unique=True)),
+                ('version_prompt', models.CharField(max_length=16)),
+                ('niveau', models.CharField(max_length=50)),
+                ('matiere', models.CharField(blank=True, max_length=100)),
+                ('question', models.TextField()),
+                ('question_normalisee', models.TextField()),
+                ('reponse', models.TextField()),
+                ('vecteur_binaire', models.BinaryField(blank=True, null=True)),
+                ('tokens', models.PositiveIntegerField(default=0)),
+                ('nb_hits', models.PositiveIntegerField(default=0)),
+                ('date_creation', models.DateTimeField(auto_now_add=True)),
+                ('dernier_acces', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Réponse en cache',
+                'verbose_name_plural': 'Réponses en cache',
+                'indexes': [models.Index(fields=['version_prompt', 'niveau', 'matiere', 'dernier_acces'], name='repetiteur__version_310076_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StatistiqueCacheReponse',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('requetes', models.PositiveIntegerField(default=0)),
+                ('hits_exacts', models.PositiveIntegerField(default=0)),
+                ('hits_semantiques', models.PositiveIntegerField(default=0)),
+                ('tokens_economises', models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Statistique du cache de réponses',
+                'verbose_name_plural': 'Statistiques du cache de réponses',
+                'ordering': ['-date'],
+            },
+        ),
+    ]
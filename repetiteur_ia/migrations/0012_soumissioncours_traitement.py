@@ -0,0 +1,47 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('repetiteur_ia', '0011_reponsecacheia_statistiquecachereponse'),
+    ]
+
+    operations = [
+        # Les soumissions existantes ont été traitées dans la requête : 'termine'
+        migrations.AddField(
+            model_name='soumissioncours',
+            name='statut_traitement',
+            field=models.CharField(choices=[('en_attente', 'En attente'), ('en_cours', 'En cours'), ('termine', 'Terminé'), ('erreur', 'Erreur')], default='termine', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='soumissioncours',
+            name='statut_traitement',
+            field=models.CharField(choices=[('en_attente', 'En attente'), ('en_cours', 'En cours'), ('termine', 'Terminé'), ('erreur', 'Erreur')], default='en_attente', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='soumissioncours',
+            name='etape_traitement',
+            field=models.CharField(blank=True, max_length=30),
+        ),
+        migrations.AddField(
+            model_name='soumissioncours',
+            name='tache_id',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='soumissioncours',
+            name='reponse_mrkarfour',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='soumissioncours',
+            name='erreur_traitement',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='soumissioncours',
+            name='date_fin_traitement',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
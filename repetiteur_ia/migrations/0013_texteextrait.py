@@ -0,0 +1,29 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('repetiteur_ia', '0012_soumissioncours_traitement'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TexteExtrait',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('empreinte', models.CharField(max_length=64, unique=True)),
+                ('extracteur', models.CharField(max_length=20)),
+                ('texte', models.TextField(blank=True)),
+                ('nb_pages', models.PositiveIntegerField(default=0)),
+                ('tronque', models.BooleanField(default=False)),
+                ('taille_fichier', models.PositiveBigIntegerField(default=0)),
+                ('date_creation', models.DateTimeField(auto_now_add=True)),
+                ('dernier_acces', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Texte extrait',
+                'verbose_name_plural': 'Textes extraits',
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('repetiteur_ia', '0013_texteextrait'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='indexationenattente',
+            name='type_source',
+            field=models.CharField(choices=[('message', 'Message IA'), ('session', 'Session IA'), ('document', 'Document pédagogique'), ('cours', 'Cours')], max_length=20),
+        ),
+        migrations.CreateModel(
+            name='ChunkIndexe',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type_source', models.CharField(choices=[('message', 'Message IA'), ('session', 'Session IA'), ('document', 'Document pédagogique'), ('cours', 'Cours')], max_length=20)),
+                ('objet_id', models.PositiveBigIntegerField()),
+                ('position', models.PositiveIntegerField()),
+                ('partition', models.CharField(max_length=50)),
+                ('empreinte', models.CharField(max_length=64)),
+                ('nb_tokens', models.PositiveIntegerField(default=0)),
+                ('date_indexation', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Chunk indexé',
+                'verbose_name_plural': 'Chunks indexés',
+                'ordering': ['type_source', 'objet_id', 'position'],
+                'constraints': [models.UniqueConstraint(fields=('type_source', 'objet_id', 'position'), name='chunk_indexe_unique')],
+            },
+        ),
+    ]
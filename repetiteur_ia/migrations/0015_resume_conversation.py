@@ -0,0 +1,26 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('repetiteur_ia', '0014_chunkindexe'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sessionrevisionprogrammee',
+            name='resume_conversation',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='sessionrevisionprogrammee',
+            name='resume_jusqu_a',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='sessionrevisionprogrammee',
+            name='date_resume',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
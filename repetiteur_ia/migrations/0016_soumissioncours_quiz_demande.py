@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('repetiteur_ia', '0015_resume_conversation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='soumissioncours',
+            name='quiz_demande',
+            field=models.BooleanField(default=False),
+        ),
+    ]
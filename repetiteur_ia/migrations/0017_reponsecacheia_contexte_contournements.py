@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('repetiteur_ia', '0016_soumissioncours_quiz_demande'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reponsecacheia',
+            name='contexte',
+            field=models.CharField(blank=True, default='', max_length=16),
+        ),
+        migrations.AddField(
+            model_name='statistiquecachereponse',
+            name='contournements',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+from asgiref.sync import sync_to_async
+from django.contrib.auth.mixins import LoginRequiredMixin
+
+
+class AsyncLoginRequiredMixin(LoginRequiredMixin):
+    """
+    LoginRequiredMixin pour les vues dont les handlers sont async.
+
+    request.user est chargé depuis la session (requête SQL) : il est résolu
+    dans un thread avant de déléguer au handler, et le refus renvoyé reste
+    une réponse ordinaire que Django sait attendre.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        est_connecte = await sync_to_async(lambda: request.user.is_authenticated)()
+        if not est_connecte:
+            return self.handle_no_permission()
+        return await super(LoginRequiredMixin, self).dispatch(request, *args, **kwargs)
@@ -3,6 +3,7 @@ from django.conf import settings
 from utilisateurs.models import Utilisateur, Eleve
 from cours.models import EmploiDuTemps
 import uuid
+import numpy as np
 
 class SessionIA(models.Model):
     eleve = models.ForeignKey(Eleve, on_delete=models.CASCADE, related_name='sessions_ia')
@@ -27,15 +28,230 @@ class MessageIA(models.Model):
         return f"{self.role} - {self.session.titre}"
 
 class EmbeddingIA(models.Model):
+    """
+    Vecteur d'un message stocké en binaire compact (float32 par défaut,
+    float16 ou int8 quantifié selon ``EMBEDDING_STORAGE_FORMAT``).
+    La propriété ``vector`` lit et écrit un ``numpy.ndarray`` float32.
+    """
+
+    FORMAT_FLOAT32 = 'float32'
+    FORMAT_FLOAT16 = 'float16'
+    FORMAT_INT8 = 'int8'
+
+    FORMAT_CHOICES = [
+        (FORMAT_FLOAT32, 'float32'),
+        (FORMAT_FLOAT16, 'float16'),
+        (FORMAT_INT8, 'int8 quantifié'),
+    ]
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     message = models.OneToOneField(MessageIA, on_delete=models.CASCADE, related_name='embedding')
-    vector = models.JSONField()
+    vecteur_binaire = models.BinaryField()
+    format_vecteur = models.CharField(max_length=10, choices=FORMAT_CHOICES, default=FORMAT_FLOAT32)
+    echelle = models.FloatField(default=1.0)  # facteur de déquantification (int8)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"Embedding for Message {self.message.id}"
 
+    @property
+    def vector(self):
+        """Vecteur float32 ; sans copie (``numpy.frombuffer``) pour le format float32"""
+        brut = np.frombuffer(self.vecteur_binaire, dtype=self.format_vecteur)
+        if self.format_vecteur == self.FORMAT_FLOAT32:
+            return brut
+        if self.format_vecteur == self.FORMAT_INT8:
+            return brut.astype(np.float32) * np.float32(self.echelle)
+        return brut.astype(np.float32)
+
+    @vector.setter
+    def vector(self, valeurs):
+        valeurs = np.asarray(valeurs, dtype=np.float32)
+        format_vecteur = getattr(settings, 'EMBEDDING_STORAGE_FORMAT', self.FORMAT_FLOAT32)
+        echelle = 1.0
+        if format_vecteur == self.FORMAT_INT8:
+            echelle = float(np.abs(valeurs).max()) / 127.0 or 1.0
+            donnees = np.round(valeurs / echelle).astype(np.int8)
+        elif format_vecteur == self.FORMAT_FLOAT16:
+            donnees = valeurs.astype(np.float16)
+        else:
+            format_vecteur = self.FORMAT_FLOAT32
+            donnees = valeurs
+        self.vecteur_binaire = donnees.tobytes()
+        self.format_vecteur = format_vecteur
+        self.echelle = echelle
+
+
+class IndexationEnAttente(models.Model):
+    """File d'attente (outbox) des textes à encoder et à ajouter au vectorstore FAISS"""
+
+    SOURCE_MESSAGE = 'message'
+    SOURCE_SESSION = 'session'
+    SOURCE_DOCUMENT = 'document'
+    SOURCE_COURS = 'cours'
+
+    SOURCE_CHOICES = [
+        (SOURCE_MESSAGE, 'Message IA'),
+        (SOURCE_SESSION, 'Session IA'),
+        (SOURCE_DOCUMENT, 'Document pédagogique'),
+        (SOURCE_COURS, 'Cours'),
+    ]
+
+    # Sources découpées en chunks (repetiteur_ia.indexation_contenus)
+    SOURCES_CONTENU = (SOURCE_DOCUMENT, SOURCE_COURS)
+
+    OPERATION_AJOUT = 'ajout'
+    OPERATION_SUPPRESSION = 'suppression'
+
+    OPERATION_CHOICES = [
+        (OPERATION_AJOUT, 'Ajout'),
+        (OPERATION_SUPPRESSION, 'Suppression'),
+    ]
+
+    type_source = models.CharField(max_length=20, choices=SOURCE_CHOICES)
+    operation = models.CharField(max_length=20, choices=OPERATION_CHOICES, default=OPERATION_AJOUT)
+    objet_id = models.PositiveBigIntegerField()
+    tentatives = models.PositiveSmallIntegerField(default=0)
+    derniere_erreur = models.TextField(blank=True)
+    date_creation = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['tentatives', 'id']),
+        ]
+        verbose_name = "Indexation en attente"
+        verbose_name_plural = "Indexations en attente"
+
+    def __str__(self):
+        return f"{self.get_operation_display()} {self.get_type_source_display()} {self.objet_id}"
+
+    @property
+    def doc_id(self):
+        """Identifiant stable du document dans le docstore FAISS"""
+        return doc_id_vectorstore(self.type_source, self.objet_id)
+
+
+def doc_id_vectorstore(type_source, objet_id):
+    """Identifiant de document FAISS dérivé de la clé primaire en base (ex: ``message:42``)"""
+    return f"{type_source}:{objet_id}"
+
+
+class ChunkIndexe(models.Model):
+    """
+    Chunk d'un contenu pédagogique (document, cours) présent dans le
+    vectorstore ; l'empreinte permet de ne réencoder que les chunks modifiés
+    """
+    type_source = models.CharField(max_length=20, choices=IndexationEnAttente.SOURCE_CHOICES)
+    objet_id = models.PositiveBigIntegerField()
+    position = models.PositiveIntegerField()
+    partition = models.CharField(max_length=50)
+    empreinte = models.CharField(max_length=64)  # sha256 du texte indexé
+    nb_tokens = models.PositiveIntegerField(default=0)
+    date_indexation = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['type_source', 'objet_id', 'position']
+        constraints = [
+            models.UniqueConstraint(fields=['type_source', 'objet_id', 'position'], name='chunk_indexe_unique'),
+        ]
+        verbose_name = "Chunk indexé"
+        verbose_name_plural = "Chunks indexés"
+
+    def __str__(self):
+        return self.doc_id
+
+    @property
+    def doc_id(self):
+        return doc_id_chunk(self.type_source, self.objet_id, self.position)
+
+
+def doc_id_chunk(type_source, objet_id, position):
+    """Identifiant FAISS d'un chunk (ex: ``document:12:3``)"""
+    return f"{doc_id_vectorstore(type_source, objet_id)}:{position}"
+
+
+class ReponseCacheIA(models.Model):
+    """
+    Réponse du répétiteur réutilisable pour une question équivalente
+    (même niveau, même matière, mêmes contenus partagés, même version du prompt)
+    """
+    cle = models.CharField(max_length=64, unique=True)  # sha256(version|niveau|matiere|contexte|question normalisée)
+    version_prompt = models.CharField(max_length=16)
+    niveau = models.CharField(max_length=50)
+    matiere = models.CharField(max_length=100, blank=True)
+    contexte = models.CharField(max_length=16, blank=True, default='')  # empreinte des contenus partagés
+    question = models.TextField()
+    question_normalisee = models.TextField()
+    reponse = models.TextField()
+    vecteur_binaire = models.BinaryField(null=True, blank=True)  # embedding float32 normalisé
+    tokens = models.PositiveIntegerField(default=0)  # coût de la génération d'origine
+    nb_hits = models.PositiveIntegerField(default=0)
+    date_creation = models.DateTimeField(auto_now_add=True)
+    dernier_acces = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['version_prompt', 'niveau', 'matiere', 'dernier_acces']),
+        ]
+        verbose_name = "Réponse en cache"
+        verbose_name_plural = "Réponses en cache"
+
+    def __str__(self):
+        return f"{self.question[:60]} ({self.niveau} / {self.matiere or '-'})"
+
+    @property
+    def vector(self):
+        if not self.vecteur_binaire:
+            return None
+        return np.frombuffer(self.vecteur_binaire, dtype=np.float32)
+
+
+class StatistiqueCacheReponse(models.Model):
+    """Compteurs journaliers du cache de réponses (taux de hit, tokens économisés)"""
+    date = models.DateField(unique=True)
+    requetes = models.PositiveIntegerField(default=0)
+    hits_exacts = models.PositiveIntegerField(default=0)
+    hits_semantiques = models.PositiveIntegerField(default=0)
+    contournements = models.PositiveIntegerField(default=0)  # questions liées à l'échange en cours
+    tokens_economises = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-date']
+        verbose_name = "Statistique du cache de réponses"
+        verbose_name_plural = "Statistiques du cache de réponses"
+
+    def __str__(self):
+        return f"Cache réponses {self.date}"
+
+    @property
+    def hits(self):
+        return self.hits_exacts + self.hits_semantiques
+
+    @property
+    def taux_hit(self):
+        return self.hits / self.requetes if self.requetes else 0.0
+
+
+class TexteExtrait(models.Model):
+    """Texte extrait d'un fichier, mis en cache par empreinte de son contenu"""
+    empreinte = models.CharField(max_length=64, unique=True)  # sha256(version extraction + contenu)
+    extracteur = models.CharField(max_length=20)
+    texte = models.TextField(blank=True)
+    nb_pages = models.PositiveIntegerField(default=0)
+    tronque = models.BooleanField(default=False)
+    taille_fichier = models.PositiveBigIntegerField(default=0)
+    date_creation = models.DateTimeField(auto_now_add=True)
+    dernier_acces = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Texte extrait"
+        verbose_name_plural = "Textes extraits"
+
+    def __str__(self):
+        return f"{self.extracteur} {self.empreinte[:12]} ({len(self.texte)} caractères)"
+
 
 
 class HistoriqueConversation(models.Model):
@@ -128,7 +344,12 @@ class SessionRevisionProgrammee(models.Model):
     notes_preparation = models.TextField(blank=True)
     date_creation = models.DateTimeField(auto_now_add=True)
     date_modification = models.DateTimeField(auto_now=True)
-    
+    # Résumé glissant des échanges (resumes_conversation.py) : couvre les
+    # échanges jusqu'à l'id resume_jusqu_a, les suivants sont envoyés tels quels
+    resume_conversation = models.TextField(blank=True)
+    resume_jusqu_a = models.PositiveBigIntegerField(default=0)
+    date_resume = models.DateTimeField(null=True, blank=True)
+
     class Meta:
         ordering = ['date_programmation']
         verbose_name = "Session de révision programmée"
@@ -163,6 +384,18 @@ class SoumissionCours(models.Model):
         (TYPE_FICHIER, 'Fichier'),
         (TYPE_AUDIO, 'Audio'),
     ]
+
+    STATUT_EN_ATTENTE = 'en_attente'
+    STATUT_EN_COURS = 'en_cours'
+    STATUT_TERMINE = 'termine'
+    STATUT_ERREUR = 'erreur'
+
+    STATUT_TRAITEMENT_CHOICES = [
+        (STATUT_EN_ATTENTE, 'En attente'),
+        (STATUT_EN_COURS, 'En cours'),
+        (STATUT_TERMINE, 'Terminé'),
+        (STATUT_ERREUR, 'Erreur'),
+    ]
     
     session = models.ForeignKey(SessionRevisionProgrammee, on_delete=models.CASCADE, related_name='soumissions')
     quiz_associe = models.ForeignKey(
@@ -179,6 +412,17 @@ class SoumissionCours(models.Model):
     date_soumission = models.DateTimeField(auto_now_add=True)
     resume_automatique = models.TextField(blank=True)
     matiere = models.CharField(max_length=100, blank=True)  # Pour les soumissions sans session
+
+    # Traitement IA en tâche de fond (résumé, quiz, réponse de MrKarfour)
+    statut_traitement = models.CharField(
+        max_length=20, choices=STATUT_TRAITEMENT_CHOICES, default=STATUT_EN_ATTENTE
+    )
+    etape_traitement = models.CharField(max_length=30, blank=True)
+    tache_id = models.CharField(max_length=255, blank=True)
+    quiz_demande = models.BooleanField(default=False)  # relu par la reprise si le broker était indisponible
+    reponse_mrkarfour = models.TextField(blank=True)
+    erreur_traitement = models.TextField(blank=True)
+    date_fin_traitement = models.DateTimeField(null=True, blank=True)
     
     class Meta:
         ordering = ['-date_soumission']
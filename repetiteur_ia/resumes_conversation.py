@@ -0,0 +1,125 @@
+"""
+Résumé glissant des conversations d'une session de révision (SessionRevisionProgrammee).
+
+Plutôt que de renvoyer au modèle les derniers échanges complets à chaque
+question, le prompt porte le résumé de la session suivi des seuls échanges
+qu'il ne couvre pas encore. Dès que REPETITEUR_RESUME_TOUS_LES échanges sont
+sortis de la fenêtre des REPETITEUR_ECHANGES_RECENTS derniers, une tâche
+Celery (file 'resumes') les intègre au résumé : un appel au modèle sur ces
+seuls échanges, quelle que soit la longueur de la session.
+"""
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .models import HistoriqueConversation
+from .utils import resumer_conversation
+
+# Échanges intégrés au résumé par appel au modèle (rattrapage d'une longue session)
+ECHANGES_PAR_APPEL = 10
+
+
+def _parametre(nom, defaut):
+    return getattr(settings, nom, defaut)
+
+
+def echanges_recents():
+    return _parametre('REPETITEUR_ECHANGES_RECENTS', 2)
+
+
+def frequence_resume():
+    return _parametre('REPETITEUR_RESUME_TOUS_LES', 3)
+
+
+def _non_resumes(session):
+    """Échanges postérieurs au résumé, en ordre chronologique"""
+    return HistoriqueConversation.objects.filter(
+        session=session, id__gt=session.resume_jusqu_a
+    ).order_by('id')
+
+
+def _texte_echange(echange):
+    return f"Élève: {echange.question}\nMrKarfour: {echange.reponse}"
+
+
+def _cle_verrou(modele, session_id):
+    return f"resume_session:en_cours:{modele}:{session_id}"
+
+
+def derniers_echanges(session):
+    """
+    Échanges d'une session de révision que le résumé ne couvre pas encore
+    (ordre chronologique) ; bornés au seuil de déclenchement du résumé
+    """
+    limite = echanges_recents() + frequence_resume()
+    echanges = list(_non_resumes(session).order_by('-id')[:limite])
+    echanges.reverse()
+    return echanges
+
+
+def programmer_resume(session):
+    """
+    Programme la mise à jour du résumé après le commit si assez d'échanges sont
+    sortis de la fenêtre récente ; une seule tâche à la fois par session
+    """
+    if _non_resumes(session).count() < echanges_recents() + frequence_resume():
+        return False
+
+    modele = session._meta.label
+    cle = _cle_verrou(modele, session.pk)
+    if not cache.add(cle, True, timeout=600):
+        return False
+
+    def lancer():
+        from .tasks_resumes import mettre_a_jour_resume_session
+        try:
+            mettre_a_jour_resume_session.delay(modele, session.pk)
+        except Exception as e:
+            cache.delete(cle)
+            print(f"⚠️ Celery indisponible, résumé de {modele} {session.pk} reporté: {e}")
+
+    transaction.on_commit(lancer)
+    return True
+
+
+def mettre_a_jour_resume(modele, session_id):
+    """
+    Corps de la tâche : intègre au résumé les échanges sortis de la fenêtre
+    récente. Retourne le nombre d'échanges résumés.
+    """
+    classe = apps.get_model(modele)
+    try:
+        session = classe.objects.filter(pk=session_id).first()
+        if session is None:
+            return 0
+
+        echanges = list(_non_resumes(session))
+        a_resumer = echanges[:max(len(echanges) - echanges_recents(), 0)]
+        if not a_resumer:
+            return 0
+
+        resume = session.resume_conversation
+        for debut in range(0, len(a_resumer), ECHANGES_PAR_APPEL):
+            lot = a_resumer[debut:debut + ECHANGES_PAR_APPEL]
+            resume = resumer_conversation(
+                resume, "\n\n".join(_texte_echange(e) for e in lot),
+                max_tokens=_parametre('REPETITEUR_RESUME_MAX_TOKENS', 400),
+            )
+
+        # Écriture conditionnelle : un résumé plus récent n'est jamais écrasé
+        mis_a_jour = classe.objects.filter(
+            pk=session_id, resume_jusqu_a=session.resume_jusqu_a
+        ).update(
+            resume_conversation=resume,
+            resume_jusqu_a=a_resumer[-1].id,
+            date_resume=timezone.now(),
+        )
+        if not mis_a_jour:
+            return 0
+        print(f"📝 Résumé {modele} {session_id} : {len(a_resumer)} échange(s) intégré(s)")
+        return len(a_resumer)
+    finally:
+        cache.delete(_cle_verrou(modele, session_id))
+
@@ -3,4 +3,6 @@ from . import consumers
 
 websocket_urlpatterns = [
     re_path(r'ws/slots/$', consumers.SlotConsumer.as_asgi()),
+    re_path(r'ws/repetiteur/chat/$', consumers.RepetiteurChatConsumer.as_asgi()),
+    re_path(r'ws/repetiteur/soumissions/(?P<soumission_id>\d+)/$', consumers.SoumissionConsumer.as_asgi()),
 ]
\ No newline at end of file
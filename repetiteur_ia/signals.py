@@ -1,197 +1,148 @@
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import m2m_changed, post_save, post_delete, pre_save
 from django.dispatch import receiver
-from sentence_transformers import SentenceTransformer
-import numpy as np
-import os
-from django.conf import settings
 
-# Import des fonctions FAISS
-from .embeddings import get_vector_store, create_vector_store_from_texts
-from .models import MessageIA, EmbeddingIA, SessionIA
+from cours.models import Cours
+from paiement.models import Paiement
+from utilisateurs.models import Eleve, Parent
 
-# Charger le modèle une seule fois (au démarrage du serveur)
-model = SentenceTransformer("all-MiniLM-L6-v2")
+from .acces import invalider_droits, invalider_droits_eleve
+
+from .extraction import programmer_extraction
+from .indexation import mettre_en_file
+from .models import DocumentPedagogique, MessageIA, SessionIA, IndexationEnAttente
 
 @receiver(post_save, sender=MessageIA)
 def creer_embedding_et_mettre_a_jour_vectorstore(sender, instance, created, **kwargs):
     """
-    Crée un embedding local ET met à jour le vectorstore FAISS
-    à chaque nouveau message entre l'élève et le répétiteur
+    Met en file l'embedding et l'ajout au vectorstore FAISS de chaque nouveau
+    message entre l'élève et le répétiteur (traités par lots par le worker)
     """
     if created:
         try:
-            # 1. Créer l'embedding local dans la base de données
-            vector = model.encode(instance.contenu).tolist()
-            
-            EmbeddingIA.objects.create(
-                message=instance,
-                vector=vector
-            )
-            print(f"✅ Embedding local créé pour le message {instance.id}")
-
-            # 2. Mettre à jour le vectorstore FAISS avec le nouveau message
-            if instance.role == 'élève':  # Seulement les questions des élèves
-                mettre_a_jour_vectorstore_avec_message_eleve(instance)
-            else:  # Les réponses de l'IA aussi peuvent être utiles
-                mettre_a_jour_vectorstore_avec_message_ia(instance)
+            mettre_en_file(IndexationEnAttente.SOURCE_MESSAGE, instance.id)
+        except Exception as e:
+            print(f"❌ Erreur mise en file embedding/vectorstore : {e}")
 
+@receiver(post_save, sender=SessionIA)
+def initialiser_vectorstore_nouvelle_session(sender, instance, created, **kwargs):
+    """Met en file l'entrée vectorstore d'une nouvelle session IA"""
+    if created:
+        try:
+            mettre_en_file(IndexationEnAttente.SOURCE_SESSION, instance.id)
         except Exception as e:
-            print(f"❌ Erreur embedding/vectorstore : {e}")
+            print(f"❌ Erreur mise en file session vectorstore: {e}")
 
-def mettre_a_jour_vectorstore_avec_message_eleve(message_eleve):
-    """Met à jour le vectorstore FAISS avec une question d'élève"""
+@receiver(post_delete, sender=MessageIA)
+def supprimer_message_vectorstore(sender, instance, **kwargs):
+    """Met en file la suppression ciblée du message dans le vectorstore"""
     try:
-        vectorstore = get_vector_store()
-        
-        # Formater le contenu pour le vectorstore
-        eleve_nom = message_eleve.session.eleve.user.get_full_name() or message_eleve.session.eleve.user.username
-        contenu_formate = f"""
-        QUESTION ÉLÈVE: {message_eleve.contenu}
-        Élève: {eleve_nom}
-        Niveau: {message_eleve.session.eleve.get_niveau_display()}
-        Classe: {message_eleve.session.eleve.get_classe_display()}
-        Session: {message_eleve.session.titre}
-        Date: {message_eleve.date_envoi}
-        """
-        
-        # Ajouter au vectorstore existant
-        vectorstore.add_texts([contenu_formate.strip()])
-        vectorstore.save_local(settings.VECTOR_STORE_PATH)
-        
-        print(f"✅ Vectorstore mis à jour avec la question de {eleve_nom}")
-        
+        mettre_en_file(IndexationEnAttente.SOURCE_MESSAGE, instance.id, IndexationEnAttente.OPERATION_SUPPRESSION)
     except Exception as e:
-        print(f"❌ Erreur mise à jour vectorstore avec question élève: {e}")
+        print(f"❌ Erreur mise en file suppression message {instance.id}: {e}")
 
-def mettre_a_jour_vectorstore_avec_message_ia(message_ia):
-    """Met à jour le vectorstore FAISS avec une réponse de l'IA"""
+@receiver(post_delete, sender=SessionIA)
+def supprimer_session_vectorstore(sender, instance, **kwargs):
+    """Met en file la suppression ciblée de la session dans le vectorstore"""
     try:
-        vectorstore = get_vector_store()
-        
-        # Formater le contenu pour le vectorstore
-        contenu_formate = f"""
-        RÉPONSE IA: {message_ia.contenu}
-        Session: {message_ia.session.titre}
-        Date: {message_ia.date_envoi}
-        """
-        
-        # Ajouter au vectorstore existant
-        vectorstore.add_texts([contenu_formate.strip()])
-        vectorstore.save_local(settings.VECTOR_STORE_PATH)
-        
-        print(f"✅ Vectorstore mis à jour avec une réponse IA")
-        
+        mettre_en_file(IndexationEnAttente.SOURCE_SESSION, instance.id, IndexationEnAttente.OPERATION_SUPPRESSION)
     except Exception as e:
-        print(f"❌ Erreur mise à jour vectorstore avec réponse IA: {e}")
+        print(f"❌ Erreur mise en file suppression session {instance.id}: {e}")
 
-@receiver(post_save, sender=SessionIA)
-def initialiser_vectorstore_nouvelle_session(sender, instance, created, **kwargs):
-    """Ajoute une entrée pour une nouvelle session IA"""
-    if created:
+def _fichier_modifiable(update_fields):
+    return update_fields is None or 'fichier' in update_fields
+
+@receiver(pre_save, sender=DocumentPedagogique)
+@receiver(pre_save, sender=Cours)
+def memoriser_fichier_enregistre(sender, instance, update_fields=None, **kwargs):
+    """Nom du fichier en base avant l'enregistrement, comparé après pour ne pas réextraire un fichier inchangé"""
+    instance._fichier_enregistre = None
+    if instance.pk and _fichier_modifiable(update_fields):
+        instance._fichier_enregistre = sender.objects.filter(pk=instance.pk).values_list('fichier', flat=True).first()
+
+def _fichier_change(instance, update_fields):
+    if not _fichier_modifiable(update_fields) or not instance.fichier:
+        return False
+    return instance.fichier.name != getattr(instance, '_fichier_enregistre', None)
+
+@receiver(post_save, sender=DocumentPedagogique)
+def extraire_texte_document_pedagogique(sender, instance, update_fields=None, **kwargs):
+    """Extrait le texte du fichier joint (en worker) et remplit contenu_texte s'il est vide"""
+    if _fichier_change(instance, update_fields):
         try:
-            vectorstore = get_vector_store()
-            
-            contenu_formate = f"""
-            NOUVELLE SESSION: {instance.titre}
-            Élève: {instance.eleve.user.get_full_name() or instance.eleve.user.username}
-            Niveau: {instance.eleve.get_niveau_display()}
-            Classe: {instance.eleve.get_classe_display()}
-            Date: {instance.date_creation}
-            """
-            
-            vectorstore.add_texts([contenu_formate.strip()])
-            vectorstore.save_local(settings.VECTOR_STORE_PATH)
-            
-            print(f"✅ Vectorstore mis à jour avec la nouvelle session: {instance.titre}")
-            
+            programmer_extraction(instance, champ_texte='contenu_texte')
         except Exception as e:
-            print(f"❌ Erreur ajout session au vectorstore: {e}")
+            print(f"❌ Erreur programmation extraction document {instance.id}: {e}")
 
-def reconstruire_vectorstore_complet():
-    """Reconstruit le vectorstore complet avec tous les messages historiques"""
+@receiver(post_save, sender=Cours)
+def extraire_texte_cours(sender, instance, update_fields=None, **kwargs):
+    """Extrait à l'avance le texte du document support du cours, seulement si le fichier a changé"""
+    if _fichier_change(instance, update_fields):
+        try:
+            programmer_extraction(instance)
+        except Exception as e:
+            print(f"❌ Erreur programmation extraction cours {instance.id}: {e}")
+
+@receiver(post_save, sender=DocumentPedagogique)
+def indexer_document_pedagogique(sender, instance, **kwargs):
+    """Met en file la (ré)indexation des chunks du document ; seuls les chunks modifiés sont réencodés"""
     try:
-        texts = []
-        
-        # Récupérer toutes les sessions
-        sessions = SessionIA.objects.all()
-        print(f"🔍 Reconstruction vectorstore: {sessions.count()} sessions trouvées")
-        
-        for session in sessions:
-            # Ajouter la session
-            session_text = f"""
-            SESSION: {session.titre}
-            Élève: {session.eleve.user.get_full_name() or session.eleve.user.username}
-            Niveau: {session.eleve.get_niveau_display()}
-            Classe: {session.eleve.get_classe_display()}
-            Date: {session.date_creation}
-            """
-            texts.append(session_text.strip())
-            
-            # Récupérer tous les messages de cette session
-            messages = MessageIA.objects.filter(session=session).order_by('date_envoi')
-            print(f"  📝 Session '{session.titre}': {messages.count()} messages")
-            
-            for message in messages:
-                if message.role == 'élève':
-                    message_text = f"""
-                    QUESTION ÉLÈVE: {message.contenu}
-                    Élève: {session.eleve.user.get_full_name() or session.eleve.user.username}
-                    Niveau: {session.eleve.get_niveau_display()}
-                    Classe: {session.eleve.get_classe_display()}
-                    Session: {session.titre}
-                    Date: {message.date_envoi}
-                    """
-                else:
-                    message_text = f"""
-                    RÉPONSE IA: {message.contenu}
-                    Session: {session.titre}
-                    Date: {message.date_envoi}
-                    """
-                
-                texts.append(message_text.strip())
-        
-        if texts:
-            create_vector_store_from_texts(texts)
-            print(f"✅ Vectorstore reconstruit avec {len(texts)} éléments de conversation")
-            return len(texts)
-        else:
-            print("⚠️ Aucune conversation trouvée pour le vectorstore")
-            return 0
-            
+        mettre_en_file(IndexationEnAttente.SOURCE_DOCUMENT, instance.id)
     except Exception as e:
-        print(f"❌ Erreur reconstruction vectorstore: {e}")
-        return 0
+        print(f"❌ Erreur mise en file indexation document {instance.id}: {e}")
 
-def initialiser_vectorstore():
-    """Fonction pour initialiser le vectorstore au démarrage de l'application"""
+@receiver(post_save, sender=Cours)
+def indexer_cours(sender, instance, **kwargs):
+    """Met en file la (ré)indexation des chunks du cours"""
     try:
-        # Vérifier si le vectorstore existe déjà
-        if not os.path.exists(settings.VECTOR_STORE_PATH):
-            print("🔄 Initialisation du vectorstore avec les conversations existantes...")
-            count = reconstruire_vectorstore_complet()
-            if count > 0:
-                print(f"✅ Vectorstore initialisé avec {count} éléments")
-            else:
-                # Vectorstore vide avec message de bienvenue
-                create_vector_store_from_texts([
-                    "Bienvenue dans l'assistant pédagogique MrKarfour !",
-                    "Posez vos questions et le répétiteur IA vous aidera.",
-                    "Les conversations précédentes aident le répétiteur à mieux vous comprendre."
-                ])
-                print("✅ Vectorstore initialisé avec le message de bienvenue")
-        else:
-            print("✅ Vectorstore déjà initialisé")
+        mettre_en_file(IndexationEnAttente.SOURCE_COURS, instance.id)
     except Exception as e:
-        print(f"❌ Erreur initialisation vectorstore: {e}")
+        print(f"❌ Erreur mise en file indexation cours {instance.id}: {e}")
 
-@receiver(post_delete, sender=MessageIA)
-def supprimer_message_vectorstore(sender, instance, **kwargs):
-    """Déclenche une reconstruction quand un message est supprimé"""
-    print(f"🔄 Reconstruction vectorstore suite à suppression message {instance.id}")
-    reconstruire_vectorstore_complet()
+@receiver(post_delete, sender=DocumentPedagogique)
+def supprimer_document_vectorstore(sender, instance, **kwargs):
+    """Met en file la suppression des chunks du document"""
+    try:
+        mettre_en_file(IndexationEnAttente.SOURCE_DOCUMENT, instance.id, IndexationEnAttente.OPERATION_SUPPRESSION)
+    except Exception as e:
+        print(f"❌ Erreur mise en file suppression document {instance.id}: {e}")
 
-@receiver(post_delete, sender=SessionIA)
-def supprimer_session_vectorstore(sender, instance, **kwargs):
-    """Déclenche une reconstruction quand une session est supprimée"""
-    print(f"🔄 Reconstruction vectorstore suite à suppression session {instance.id}")
-    reconstruire_vectorstore_complet()
\ No newline at end of file
+@receiver(post_delete, sender=Cours)
+def supprimer_cours_vectorstore(sender, instance, **kwargs):
+    """Met en file la suppression des chunks du cours"""
+    try:
+        mettre_en_file(IndexationEnAttente.SOURCE_COURS, instance.id, IndexationEnAttente.OPERATION_SUPPRESSION)
+    except Exception as e:
+        print(f"❌ Erreur mise en file suppression cours {instance.id}: {e}")
+
+@receiver(post_save, sender=Paiement)
+@receiver(post_delete, sender=Paiement)
+def invalider_droits_paiement(sender, instance, **kwargs):
+    """Un paiement change les droits d'accès au répétiteur de l'élève et de ses parents"""
+    try:
+        invalider_droits_eleve(instance.eleve_id)
+    except Exception as e:
+        print(f"❌ Erreur invalidation droits (paiement {instance.id}): {e}")
+
+@receiver(post_save, sender=Eleve)
+def invalider_droits_abonnement(sender, instance, **kwargs):
+    """abonnement_actif et date_fin_abonnement entrent dans le calcul des droits"""
+    try:
+        invalider_droits_eleve(instance.id)
+    except Exception as e:
+        print(f"❌ Erreur invalidation droits (élève {instance.id}): {e}")
+
+@receiver(m2m_changed, sender=Parent.eleves.through)
+def invalider_droits_parent(sender, instance, action, pk_set=None, **kwargs):
+    """Un enfant ajouté ou retiré change les élèves pour lesquels le parent a accès"""
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    try:
+        if isinstance(instance, Parent):
+            invalider_droits(instance.user_id)
+        else:
+            # Côté élève, pk_set désigne les parents ajoutés ou retirés
+            invalider_droits_eleve(instance.id)
+            if pk_set:
+                invalider_droits(*Parent.objects.filter(pk__in=pk_set).values_list('user_id', flat=True))
+    except Exception as e:
+        print(f"❌ Erreur invalidation droits parent: {e}")
@@ -0,0 +1,285 @@
+"""
+Traitement IA des cours soumis par les élèves, hors de la requête HTTP.
+
+La vue enregistre la soumission et rend la main tout de suite ; le résumé et
+le quiz sont générés en parallèle par des tâches Celery, puis une tâche finale
+rédige la réponse de MrKarfour. Chaque étape met à jour la soumission et
+pousse l'état sur le groupe WebSocket ``soumission_<id>`` ; le même état est
+disponible en polling via la vue de statut.
+
+Si le broker est indisponible, la soumission reste « en attente » sans tâche :
+rien n'est exécuté dans la requête, la tâche périodique de reprise programme
+le pipeline dès que le broker répond.
+"""
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+from django.urls import reverse
+from django.utils import timezone
+
+from .extraction import texte_fichier
+from .models import HistoriqueConversation, SoumissionCours
+from .utils import generer_quiz_ia, rediger_reponse_soumission, resumer_soumission
+
+RESUME_SECOURS = (
+    "Je vais analyser votre contenu et vous proposer des exercices adaptés. "
+    "En attendant, n'hésitez pas à me poser des questions sur ce cours !"
+)
+
+
+def groupe_soumission(soumission_id):
+    return f"soumission_{soumission_id}"
+
+
+def _charger(soumission_id):
+    return SoumissionCours.objects.select_related(
+        'session__emploi_temps', 'session__eleve__user', 'quiz_associe'
+    ).get(id=soumission_id)
+
+
+def etat_traitement(soumission):
+    """État sérialisable du traitement, envoyé par WebSocket et par la vue de statut"""
+    quiz = soumission.quiz_associe
+    return {
+        'soumission_id': soumission.id,
+        'session_id': soumission.session_id,
+        'job_id': soumission.tache_id,
+        'statut': soumission.statut_traitement,
+        'etape': soumission.etape_traitement,
+        'resume_pret': bool(soumission.resume_automatique),
+        'quiz_pret': quiz is not None,
+        'resume_automatique': soumission.resume_automatique,
+        'reponse_mrkarfour': soumission.reponse_mrkarfour,
+        'quiz_id': quiz.id if quiz else None,
+        'quiz_titre': quiz.titre if quiz else None,
+        'quiz_url': reverse('cours:quiz_detail', kwargs={'pk': quiz.id}) if quiz else None,
+        'erreur': soumission.erreur_traitement,
+    }
+
+
+def publier_progression(soumission_id):
+    """Pousse l'état courant aux navigateurs abonnés (sans effet si Channels est indisponible)"""
+    try:
+        channel_layer = get_channel_layer()
+        if channel_layer is None:
+            return
+        async_to_sync(channel_layer.group_send)(
+            groupe_soumission(soumission_id),
+            {'type': 'soumission.progression', 'etat': etat_traitement(_charger(soumission_id))},
+        )
+    except Exception as e:
+        print(f"⚠️ Progression soumission {soumission_id} non publiée: {e}")
+
+
+def _mettre_a_jour(soumission_id, **champs):
+    SoumissionCours.objects.filter(id=soumission_id).update(**champs)
+    publier_progression(soumission_id)
+
+
+def contenu_soumission(soumission):
+    if soumission.type_soumission == SoumissionCours.TYPE_TEXTE:
+        return soumission.contenu_texte
+    if soumission.type_soumission == SoumissionCours.TYPE_FICHIER and soumission.fichier:
+        # Exécuté dans le worker : l'extraction ne pèse pas sur la requête
+        return texte_fichier(soumission.fichier) or f"Fichier soumis: {soumission.fichier.name}"
+    return ""
+
+
+def demarrer_analyse(soumission_id):
+    SoumissionCours.objects.filter(
+        id=soumission_id, statut_traitement=SoumissionCours.STATUT_EN_ATTENTE
+    ).update(statut_traitement=SoumissionCours.STATUT_EN_COURS, etape_traitement='analyse')
+
+
+def generer_resume(soumission_id):
+    """Étape 1a : résumé IA du cours (lève en cas d'échec de l'API pour permettre un réessai)"""
+    demarrer_analyse(soumission_id)
+    soumission = _charger(soumission_id)
+    contenu = contenu_soumission(soumission)
+    resume = resumer_soumission(contenu) if contenu else "Aucun contenu à analyser."
+    _mettre_a_jour(soumission_id, resume_automatique=resume)
+    return resume
+
+
+def enregistrer_resume_secours(soumission_id):
+    _mettre_a_jour(soumission_id, resume_automatique=RESUME_SECOURS)
+    return RESUME_SECOURS
+
+
+def generer_quiz(soumission_id):
+    """Étape 1b : quiz à partir du cours ; retourne l'id du quiz ou None"""
+    demarrer_analyse(soumission_id)
+    soumission = _charger(soumission_id)
+
+    # Objet cours temporaire pour la génération
+    class CoursTemp:
+        def __init__(self, titre, matiere, contenu):
+            self.titre = titre
+            self.matiere = matiere
+            self.contenu = contenu
+
+    titre = f"Quiz - {soumission.session.titre or 'Révision'}"
+    matiere = soumission.matiere or 'Général'
+    contenu = contenu_soumission(soumission)
+
+    questions_ia = generer_quiz_ia(CoursTemp(titre, matiere, contenu))
+    if not questions_ia:
+        print("❌ Aucune question générée par l'IA")
+        return None
+
+    quiz = enregistrer_quiz(soumission, titre, questions_ia)
+    print(f"✅ Quiz généré avec succès: {quiz.titre} ({len(questions_ia)} questions)")
+    publier_progression(soumission_id)
+    return quiz.id
+
+
+@transaction.atomic
+def enregistrer_quiz(soumission, titre, questions_ia):
+    """Crée le quiz, ses questions et ses choix, puis l'associe à la soumission"""
+    from cours.models import Choice, Question, Quiz
+
+    quiz = Quiz.objects.create(
+        titre=titre,
+        description=f"Quiz généré automatiquement à partir de la soumission: {soumission.session.titre}",
+        created_by=soumission.session.eleve.user,
+        created_by_ai=True,
+        duree=15,  # Durée par défaut
+        est_actif=True
+    )
+
+    for i, q_data in enumerate(questions_ia):
+        if isinstance(q_data, dict) and 'question' in q_data and 'options' in q_data:
+            question = Question.objects.create(
+                quiz=quiz,
+                texte=q_data['question'],
+                ordre=i + 1
+            )
+            for j, option_text in enumerate(q_data['options']):
+                Choice.objects.create(
+                    question=question,
+                    texte=option_text,
+                    est_correcte=(option_text == q_data.get('reponse_correcte')),
+                    ordre=j + 1
+                )
+
+    SoumissionCours.objects.filter(id=soumission.id).update(quiz_associe=quiz)
+    return quiz
+
+
+def finaliser(soumission_id, resultats):
+    """
+    Étape 2 : réponse de MrKarfour à partir du résumé et du quiz, enregistrée
+    dans l'historique du chat. ``resultats`` vient du groupe : [résumé, id du quiz?]
+    """
+    _mettre_a_jour(soumission_id, etape_traitement='reponse')
+    soumission = _charger(soumission_id)
+    session = soumission.session
+    eleve = session.eleve
+    matiere = session.emploi_temps.matiere if session.emploi_temps else "cette matière"
+    resume = resultats[0] if resultats else soumission.resume_automatique
+
+    try:
+        reponse = rediger_reponse_soumission(
+            eleve.user.first_name or eleve.user.username, matiere,
+            soumission.type_soumission, soumission.quiz_associe, resume
+        )
+    except Exception as e:
+        print(f"Erreur génération réponse MrKarfour: {e}")
+        reponse = f"🎉 Bravo {eleve.user.first_name or 'cher élève'} ! J'ai bien reçu ton cours de {matiere}. Je suis là pour t'aider à le réviser et répondre à toutes tes questions. N'hésite pas à me demander des explications ou des exercices ! 📚✨"
+
+    HistoriqueConversation.objects.create(
+        utilisateur=eleve.user,
+        session=session,
+        type_conversation='soumission_cours',
+        question=f"Soumission de cours: {soumission.type_soumission}",
+        reponse=reponse,
+        contexte_utilise={
+            'soumission_id': soumission.id,
+            'matiere': session.emploi_temps.matiere if session.emploi_temps else 'Non spécifiée',
+            'type_soumission': soumission.type_soumission,
+            'timestamp': timezone.now().isoformat()
+        }
+    )
+    _mettre_a_jour(
+        soumission_id,
+        reponse_mrkarfour=reponse,
+        statut_traitement=SoumissionCours.STATUT_TERMINE,
+        etape_traitement='termine',
+        date_fin_traitement=timezone.now(),
+    )
+    return reponse
+
+
+def marquer_erreur(soumission_id, erreur):
+    _mettre_a_jour(
+        soumission_id,
+        statut_traitement=SoumissionCours.STATUT_ERREUR,
+        erreur_traitement=str(erreur)[:1000],
+        date_fin_traitement=timezone.now(),
+    )
+
+
+def _programmer_pipeline(soumission_id, quiz_demande):
+    """Programme chord(résumé | quiz) → réponse de MrKarfour ; lève si le broker est indisponible"""
+    from celery import chord
+
+    from .tasks_soumissions import (
+        finaliser_soumission_tache, generer_quiz_soumission_tache, resumer_soumission_tache,
+    )
+
+    etapes = [resumer_soumission_tache.s(soumission_id)]
+    if quiz_demande:
+        etapes.append(generer_quiz_soumission_tache.s(soumission_id))
+    return chord(etapes)(finaliser_soumission_tache.s(soumission_id)).id
+
+
+def lancer_traitement(soumission):
+    """
+    Programme le pipeline Celery de la soumission. Retourne l'identifiant de
+    tâche servant de job ID, ou None si le broker est indisponible : la
+    soumission reste alors en attente et sera reprise périodiquement.
+    """
+    try:
+        tache_id = _programmer_pipeline(soumission.id, soumission.quiz_demande)
+    except Exception as e:
+        print(f"⚠️ Celery indisponible, soumission {soumission.id} laissée en attente (reprise périodique): {e}")
+        return None
+
+    soumission.tache_id = tache_id
+    SoumissionCours.objects.filter(id=soumission.id).update(tache_id=tache_id)
+    return tache_id
+
+
+TACHE_REPRISE = 'reprise'
+
+
+def reprendre_soumissions_en_attente(limite=50):
+    """
+    Programme les soumissions restées en attente sans tâche (broker indisponible
+    lors de l'envoi). Retourne le nombre de pipelines programmés.
+    """
+    delai = getattr(settings, 'SOUMISSION_DELAI_REPRISE', 60)
+    en_attente = list(
+        SoumissionCours.objects.filter(
+            statut_traitement=SoumissionCours.STATUT_EN_ATTENTE, tache_id='',
+            date_soumission__lte=timezone.now() - timedelta(seconds=delai),
+        ).order_by('date_soumission').values_list('id', 'quiz_demande')[:limite]
+    )
+    programmes = 0
+    for soumission_id, quiz_demande in en_attente:
+        # Réservation : une seule reprise par soumission, même avec plusieurs workers
+        if not SoumissionCours.objects.filter(id=soumission_id, tache_id='').update(tache_id=TACHE_REPRISE):
+            continue
+        try:
+            tache_id = _programmer_pipeline(soumission_id, quiz_demande)
+        except Exception as e:
+            SoumissionCours.objects.filter(id=soumission_id, tache_id=TACHE_REPRISE).update(tache_id='')
+            print(f"⚠️ Reprise des soumissions interrompue (broker indisponible): {e}")
+            break
+        SoumissionCours.objects.filter(id=soumission_id).update(tache_id=tache_id)
+        publier_progression(soumission_id)
+        programmes += 1
+    return programmes
@@ -0,0 +1,24 @@
+# repetiteur_ia/tasks_audio.py
+from celery import shared_task
+from django.core.cache import cache
+import logging
+
+logger = logging.getLogger(__name__)
+
+@shared_task(name='repetiteur_ia.synthetiser_audio', bind=True, max_retries=2, default_retry_delay=5)
+def synthetiser_audio(self, texte):
+    """Synthèse TTS différée d'une réponse du répétiteur dans le stockage adressé par contenu"""
+    from repetiteur_ia.audio_tts import empreinte_audio, synthetiser
+
+    empreinte = empreinte_audio(texte)
+    try:
+        synthetiser(texte)
+        cache.delete(f"tts:en_cours:{empreinte}")
+        return {"status": "success", "empreinte": empreinte}
+
+    except Exception as e:
+        logger.error(f"Erreur synthèse audio {empreinte[:12]}: {e}")
+        if self.request.retries < self.max_retries:
+            raise self.retry(exc=e)
+        cache.delete(f"tts:en_cours:{empreinte}")
+        return {"status": "error", "message": str(e)}
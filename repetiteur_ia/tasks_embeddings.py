@@ -0,0 +1,22 @@
+# repetiteur_ia/tasks_embeddings.py
+from celery import shared_task
+import logging
+
+logger = logging.getLogger(__name__)
+
+@shared_task(name='repetiteur_ia.traiter_file_indexation')
+def traiter_file_indexation():
+    """
+    Draine la file d'indexation (IndexationEnAttente) par lots :
+    encodage groupé, ajout en bloc à FAISS, une sauvegarde par lot
+    """
+    try:
+        from repetiteur_ia.indexation import traiter_file_indexation as drainer
+
+        total = drainer()
+        logger.info(f"{total} élément(s) ajouté(s) au vectorstore")
+        return {"status": "success", "indexes": total}
+
+    except Exception as e:
+        logger.error(f"Erreur drainage de la file d'indexation: {e}")
+        return {"status": "error", "message": str(e)}
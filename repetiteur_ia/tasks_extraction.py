@@ -0,0 +1,20 @@
+# repetiteur_ia/tasks_extraction.py
+from celery import shared_task
+import logging
+
+logger = logging.getLogger(__name__)
+
+@shared_task(name='repetiteur_ia.extraire_texte_objet', bind=True, max_retries=2, default_retry_delay=30)
+def extraire_texte_objet(self, modele, objet_id, champ='fichier', champ_texte=None):
+    """Extraction du texte d'un fichier attaché à un objet, hors de la requête HTTP"""
+    from repetiteur_ia.extraction import extraire_texte_objet as extraire
+
+    try:
+        caracteres = extraire(modele, objet_id, champ, champ_texte)
+        return {"status": "success", "modele": modele, "objet_id": objet_id, "caracteres": caracteres}
+
+    except Exception as e:
+        logger.error(f"Erreur extraction texte {modele} {objet_id}: {e}")
+        if self.request.retries < self.max_retries:
+            raise self.retry(exc=e)
+        return {"status": "error", "message": str(e)}
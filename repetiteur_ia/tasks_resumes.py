@@ -0,0 +1,20 @@
+# repetiteur_ia/tasks_resumes.py
+from celery import shared_task
+import logging
+
+logger = logging.getLogger(__name__)
+
+@shared_task(name='repetiteur_ia.mettre_a_jour_resume_session', bind=True, max_retries=2, default_retry_delay=30)
+def mettre_a_jour_resume_session(self, modele, session_id):
+    """Intègre au résumé glissant d'une session les échanges sortis de la fenêtre récente"""
+    from repetiteur_ia.resumes_conversation import mettre_a_jour_resume
+
+    try:
+        resumes = mettre_a_jour_resume(modele, session_id)
+        return {"status": "success", "modele": modele, "session_id": session_id, "resumes": resumes}
+
+    except Exception as e:
+        logger.error(f"Erreur résumé session {modele} {session_id}: {e}")
+        if self.request.retries < self.max_retries:
+            raise self.retry(exc=e)
+        return {"status": "error", "message": str(e)}
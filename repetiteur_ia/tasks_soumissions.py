@@ -0,0 +1,63 @@
+# repetiteur_ia/tasks_soumissions.py
+from celery import shared_task
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Les tâches du groupe (résumé, quiz) ne doivent jamais échouer : une erreur
+# dans le groupe empêcherait la tâche finale du chord de s'exécuter.
+
+@shared_task(name='repetiteur_ia.resumer_soumission', bind=True, max_retries=2, default_retry_delay=10)
+def resumer_soumission_tache(self, soumission_id):
+    """Résumé IA d'une soumission de cours, avec réessais puis résumé de secours"""
+    from repetiteur_ia.soumissions import enregistrer_resume_secours, generer_resume
+
+    try:
+        return generer_resume(soumission_id)
+
+    except Exception as e:
+        logger.error(f"Erreur résumé soumission {soumission_id}: {e}")
+        if self.request.retries < self.max_retries:
+            raise self.retry(exc=e)
+        return enregistrer_resume_secours(soumission_id)
+
+@shared_task(name='repetiteur_ia.generer_quiz_soumission')
+def generer_quiz_soumission_tache(soumission_id):
+    """Quiz automatique d'une soumission de cours ; retourne l'id du quiz ou None"""
+    from repetiteur_ia.soumissions import generer_quiz
+
+    try:
+        return generer_quiz(soumission_id)
+
+    except Exception as e:
+        logger.error(f"Erreur génération quiz soumission {soumission_id}: {e}")
+        return None
+
+@shared_task(name='repetiteur_ia.reprendre_soumissions_en_attente')
+def reprendre_soumissions_en_attente_tache():
+    """Filet de sécurité : programme les soumissions restées en attente (broker indisponible à l'envoi)"""
+    from repetiteur_ia.soumissions import reprendre_soumissions_en_attente
+
+    try:
+        programmes = reprendre_soumissions_en_attente()
+        if programmes:
+            logger.info(f"{programmes} soumission(s) en attente reprise(s)")
+        return {"status": "success", "reprises": programmes}
+
+    except Exception as e:
+        logger.error(f"Erreur reprise des soumissions en attente: {e}")
+        return {"status": "error", "message": str(e)}
+
+@shared_task(name='repetiteur_ia.finaliser_soumission')
+def finaliser_soumission_tache(resultats, soumission_id):
+    """Réponse de MrKarfour une fois le résumé et le quiz prêts"""
+    from repetiteur_ia.soumissions import finaliser, marquer_erreur
+
+    try:
+        finaliser(soumission_id, resultats)
+        return {"status": "success", "soumission_id": soumission_id}
+
+    except Exception as e:
+        logger.error(f"Erreur finalisation soumission {soumission_id}: {e}")
+        marquer_erreur(soumission_id, e)
+        return {"status": "error", "message": str(e)}
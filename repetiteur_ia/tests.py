@@ -1,3 +1,416 @@
-from django.test import TestCase
+import io
+import zipfile
+from unittest import mock
 
-# Create your tests here.
+import faiss
+import numpy as np
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from . import cache_reponses
+from .budget_prompt import MARQUE_TRONCATURE, BudgetPrompt, tronquer_tokens
+from .embeddings import DOC_SUPPRIME, optimiser_index, supprimer_ids_index
+from .extraction import EXTRACTEURS, TEXT_NS, W_NS, extraire_texte
+from .indexation import MAX_TENTATIVES, traiter_file_indexation
+from .indexation_contenus import decouper_en_chunks, indexer_contenus
+from .models import (
+    ChunkIndexe, DocumentPedagogique, IndexationEnAttente, ReponseCacheIA,
+    StatistiqueCacheReponse, TexteExtrait,
+)
+
+DIMENSION = 8
+
+
+class EncodageCaracteres:
+    """Encodage de test hors ligne : un token par caractère"""
+
+    def encode(self, texte):
+        return [ord(caractere) for caractere in texte]
+
+    def decode(self, tokens):
+        return ''.join(chr(token) for token in tokens)
+
+
+def encodage_caracteres(modele=None):
+    return EncodageCaracteres()
+
+
+class EmbeddingsFactices(Embeddings):
+    """Vecteurs déterministes dérivés du texte, sans modèle"""
+
+    def embed_documents(self, texts):
+        return [self.embed_query(texte) for texte in texts]
+
+    def embed_query(self, text):
+        graine = sum(ord(caractere) for caractere in text)
+        return np.random.default_rng(graine).random(DIMENSION).astype(np.float32).tolist()
+
+
+def vecteurs_aleatoires(nombre, graine=0):
+    return np.random.default_rng(graine).random((nombre, DIMENSION)).astype(np.float32)
+
+
+def store_depuis_index(index, vecteurs):
+    """Store LangChain au-dessus d'un index FAISS brut, documents ``d0``..``dN``"""
+    index.add(vecteurs)
+    doc_ids = [f"d{position}" for position in range(len(vecteurs))]
+    return FAISS(
+        embedding_function=EmbeddingsFactices(),
+        index=index,
+        docstore=InMemoryDocstore({doc_id: Document(page_content=doc_id) for doc_id in doc_ids}),
+        index_to_docstore_id=dict(enumerate(doc_ids)),
+    )
+
+
+def premier_resultat(store, vecteur, **kwargs):
+    return store.similarity_search_by_vector(vecteur.tolist(), k=1, **kwargs)[0].page_content
+
+
+class SuppressionIndexTests(SimpleTestCase):
+    """supprimer_ids_index / optimiser_index sur IVF (renumérotation) et HNSW (marqueurs)"""
+
+    def store_ivf(self, vecteurs):
+        quantifieur = faiss.IndexFlatL2(DIMENSION)
+        index = faiss.IndexIVFFlat(quantifieur, DIMENSION, 2)
+        index.train(vecteurs)
+        index.nprobe = 2  # recherche exhaustive : résultats déterministes
+        store = store_depuis_index(index, vecteurs)
+        store._quantifieur = quantifieur  # garde le quantifieur en vie
+        return store
+
+    def store_hnsw(self, vecteurs):
+        return store_depuis_index(faiss.IndexHNSWFlat(DIMENSION, 16), vecteurs)
+
+    def test_ivf_renumerote_les_labels(self):
+        vecteurs = vecteurs_aleatoires(80)
+        store = self.store_ivf(vecteurs)
+
+        supprimer_ids_index(store, ['d3', 'd7'])
+
+        restants = [f"d{i}" for i in range(80) if i not in (3, 7)]
+        self.assertEqual(store.index.ntotal, 78)
+        self.assertEqual(store.index_to_docstore_id, dict(enumerate(restants)))
+        self.assertEqual(premier_resultat(store, vecteurs[10]), 'd10')
+        self.assertEqual(premier_resultat(store, vecteurs[79]), 'd79')
+
+    def test_ivf_ajout_apres_suppression_sans_collision(self):
+        vecteurs = vecteurs_aleatoires(80)
+        store = self.store_ivf(vecteurs)
+        supprimer_ids_index(store, ['d0'])
+
+        nouveau = vecteurs_aleatoires(1, graine=1)[0]
+        store.add_embeddings([('nouveau', nouveau.tolist())], ids=['nouveau'])
+
+        self.assertEqual(premier_resultat(store, nouveau), 'nouveau')
+        self.assertEqual(premier_resultat(store, vecteurs[79]), 'd79')
+
+    def test_hnsw_marque_les_positions_supprimees(self):
+        vecteurs = vecteurs_aleatoires(20)
+        store = self.store_hnsw(vecteurs)
+
+        supprimer_ids_index(store, ['d2'])
+
+        self.assertEqual(store.index.ntotal, 20)
+        self.assertEqual(store.index_to_docstore_id[2], DOC_SUPPRIME)
+        self.assertNotEqual(premier_resultat(store, vecteurs[2], filter={'supprime': [None]}), DOC_SUPPRIME)
+
+    @override_settings(VECTOR_INDEX_TYPE='hnsw', VECTOR_INDEX_TAUX_SUPPRIMES=0.2)
+    def test_hnsw_compacte_au_dela_du_taux(self):
+        vecteurs = vecteurs_aleatoires(20)
+        store = self.store_hnsw(vecteurs)
+
+        supprimer_ids_index(store, ['d1'])
+        self.assertFalse(optimiser_index(store))  # 1/20 : sous le seuil
+
+        supprimer_ids_index(store, ['d4', 'd5', 'd6'])
+        self.assertTrue(optimiser_index(store))  # 4/20 : compactage
+        self.assertEqual(store.index.ntotal, 16)
+        self.assertNotIn(DOC_SUPPRIME, store.index_to_docstore_id.values())
+        self.assertEqual(premier_resultat(store, vecteurs[19]), 'd19')
+
+
+@mock.patch('repetiteur_ia.budget_prompt.encodage_tokens', encodage_caracteres)
+class BudgetPromptTests(SimpleTestCase):
+
+    def test_parties_allouees_en_dernier_tronquees_d_abord(self):
+        budget = BudgetPrompt(40)
+        budget.reserver('consignes', 'c' * 10)
+        question = budget.allouer('question', 'q' * 10, plafond=100)
+        contexte = budget.allouer('contexte', 'x' * 30, plafond=100)
+        historique = budget.allouer('historique', 'h' * 30, plafond=100)
+
+        self.assertEqual(question, 'q' * 10)
+        self.assertTrue(contexte.endswith(MARQUE_TRONCATURE))
+        self.assertLessEqual(len(contexte), 20)
+        self.assertEqual(historique, '')
+        self.assertGreaterEqual(budget.restant, 0)
+
+    def test_plafond_de_la_partie(self):
+        budget = BudgetPrompt(1000)
+        self.assertEqual(len(budget.allouer('session', 's' * 100, plafond=20)), 20)
+
+    def test_historique_garde_la_fin(self):
+        texte = tronquer_tokens('ancien ' * 10 + 'recent', 12, garder='fin')
+        self.assertTrue(texte.endswith('recent'))
+        self.assertTrue(texte.startswith(MARQUE_TRONCATURE.strip()))
+
+    def test_liste_abandonne_les_moins_pertinents(self):
+        budget = BudgetPrompt(1000)
+        gardes = budget.allouer_liste('contexte', ['a' * 4, 'b' * 4, 'c' * 4], plafond=9)
+        self.assertEqual(gardes, ['a' * 4, 'b' * 4])
+        self.assertEqual(budget.comptes['contexte'], 8)
+
+
+class CacheReponsesTests(TestCase):
+
+    def setUp(self):
+        patcher = mock.patch('repetiteur_ia.budget_prompt.encodage_tokens', encodage_caracteres)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        cache_reponses.version_prompt.cache_clear()
+        self.addCleanup(cache_reponses.version_prompt.cache_clear)
+        self.vecteur = np.ones(DIMENSION, dtype=np.float32) / np.sqrt(DIMENSION)
+        patcher = mock.patch.object(cache_reponses, '_vecteur_question', return_value=self.vecteur)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def statistiques(self):
+        return StatistiqueCacheReponse.objects.get()
+
+    def test_cle_normalisee_et_dependante_du_contexte(self):
+        cle = cache_reponses._cle('Collège', 'maths', cache_reponses.normaliser_question("Qu'est-ce qu'une FRACTION ?"), 'a')
+        self.assertEqual(cle, cache_reponses._cle('Collège', 'maths', 'qu est ce qu une fraction', 'a'))
+        self.assertNotEqual(cle, cache_reponses._cle('Collège', 'maths', 'qu est ce qu une fraction', 'b'))
+        self.assertNotEqual(cle, cache_reponses._cle('Lycée', 'maths', 'qu est ce qu une fraction', 'a'))
+        self.assertNotEqual(cle, cache_reponses._cle('Collège', 'physique', 'qu est ce qu une fraction', 'a'))
+
+    def test_contexte_partage_sans_rien_de_personnel(self):
+        partage = cache_reponses.contexte_partage(
+            "Explique-moi le théorème de Pythagore",
+            {'contenus_similaires': ['mon cours', 'cours commun'], 'contenus_partages': ['cours commun']},
+            {'matiere': 'maths', 'objectifs': 'réviser', 'nb_soumissions': 2},
+            historique_conversation="Q: ... R: ...",
+            resume_conversation="résumé",
+        )
+        self.assertEqual(partage['contexte_pedagogique'], {'contenus_similaires': ['cours commun']})
+        self.assertEqual(partage['contexte_session'], {'matiere': 'maths'})
+        self.assertEqual(partage['empreinte'], cache_reponses.empreinte_contexte(['cours commun']))
+
+    def test_question_de_suite_contourne_le_cache(self):
+        self.assertIsNone(cache_reponses.contexte_partage("Et pourquoi ?", {}, None, "Q: ... R: ..."))
+        self.assertIsNone(cache_reponses.contexte_partage("Je n'ai pas compris ça", {}, None, "Q: ... R: ..."))
+        # Sans historique, la même question est partageable
+        self.assertIsNotNone(cache_reponses.contexte_partage("Et pourquoi ?", {}, None, ""))
+
+    def test_contournement_compte(self):
+        entree, vecteur = cache_reponses.chercher_reponse("Et pourquoi ?", 'Collège', 'maths', None)
+        self.assertIsNone(entree)
+        self.assertIsNone(vecteur)
+        statistiques = self.statistiques()
+        self.assertEqual((statistiques.requetes, statistiques.contournements), (1, 1))
+        self.assertEqual(cache_reponses.statistiques_cache()['taux_hit'], 0.0)
+
+    @override_settings(REPONSE_CACHE_ACTIF=False)
+    def test_cache_desactive(self):
+        self.assertIsNone(cache_reponses.contexte_partage("Explique-moi les fractions", {}, None))
+        self.assertEqual(cache_reponses.chercher_reponse("Explique-moi les fractions", 'Collège'), (None, None))
+        self.assertFalse(StatistiqueCacheReponse.objects.exists())
+
+    def test_hit_exact_puis_semantique_filtre_par_contexte(self):
+        cache_reponses.enregistrer_reponse(
+            "Comment additionner deux fractions ?", 'Collège', 'maths', "Réponse", tokens=120, contexte='a'
+        )
+
+        entree, _ = cache_reponses.chercher_reponse("comment additionner deux fractions", 'Collège', 'maths', 'a')
+        self.assertEqual(entree.reponse, "Réponse")
+
+        # Même vecteur (question proche) : servie seulement avec la même empreinte de contexte
+        entree, _ = cache_reponses.chercher_reponse("Additionner deux fractions, comment ?", 'Collège', 'maths', 'b')
+        self.assertIsNone(entree)
+        entree, _ = cache_reponses.chercher_reponse("Additionner deux fractions, comment ?", 'Collège', 'maths', 'a')
+        self.assertEqual(entree.reponse, "Réponse")
+
+        statistiques = self.statistiques()
+        self.assertEqual(
+            (statistiques.requetes, statistiques.hits_exacts, statistiques.hits_semantiques,
+             statistiques.contournements, statistiques.tokens_economises),
+            (3, 1, 1, 0, 240),
+        )
+
+    def test_pas_d_enregistrement_sans_contexte_partageable(self):
+        self.assertIsNone(cache_reponses.enregistrer_reponse("Et pourquoi ?", 'Collège', 'maths', "R", contexte=None))
+        self.assertFalse(ReponseCacheIA.objects.exists())
+
+
+class FileIndexationTests(TestCase):
+    """Drainage de la file : réessais isolés sur les entrées fautives, puis mise à l'écart"""
+
+    def entree(self, objet_id, tentatives=0):
+        return IndexationEnAttente.objects.create(
+            type_source=IndexationEnAttente.SOURCE_MESSAGE, objet_id=objet_id, tentatives=tentatives
+        )
+
+    def traiter_sauf(self, *fautifs):
+        def _traiter_lot(lot):
+            if any(entree.objet_id in fautifs for entree in lot):
+                raise RuntimeError("encodage impossible")
+            return len(lot)
+        return mock.patch('repetiteur_ia.indexation._traiter_lot', side_effect=_traiter_lot)
+
+    def test_seule_l_entree_fautive_consomme_une_tentative(self):
+        saines = [self.entree(objet_id) for objet_id in (1, 2, 4, 5)]
+        fautive = self.entree(3)
+
+        with self.traiter_sauf(3):
+            total = traiter_file_indexation(taille_lot=10)
+
+        self.assertEqual(total, 4)
+        self.assertFalse(IndexationEnAttente.objects.filter(id__in=[e.id for e in saines]).exists())
+        fautive.refresh_from_db()
+        self.assertEqual(fautive.tentatives, 1)
+        self.assertIn("encodage impossible", fautive.derniere_erreur)
+
+    def test_entree_ecartee_apres_max_tentatives(self):
+        fautive = self.entree(3, tentatives=MAX_TENTATIVES - 1)
+
+        with self.traiter_sauf(3):
+            traiter_file_indexation(taille_lot=10)
+        fautive.refresh_from_db()
+        self.assertEqual(fautive.tentatives, MAX_TENTATIVES)
+
+        # Entrée écartée : plus jamais reprise, les suivantes passent
+        saine = self.entree(6)
+        with self.traiter_sauf(3) as traiter:
+            self.assertEqual(traiter_file_indexation(taille_lot=10), 1)
+        self.assertEqual([e.objet_id for e in traiter.call_args.args[0]], [6])
+        self.assertFalse(IndexationEnAttente.objects.filter(id=saine.id).exists())
+        self.assertTrue(IndexationEnAttente.objects.filter(id=fautive.id).exists())
+
+
+class GestionnaireMemoire:
+    """Sous-index en mémoire à la place d'un VectorStoreManager"""
+
+    def __init__(self):
+        self.store = FAISS(
+            embedding_function=EmbeddingsFactices(),
+            index=faiss.IndexFlatL2(DIMENSION),
+            docstore=InMemoryDocstore(),
+            index_to_docstore_id={},
+        )
+
+    def get(self):
+        return self.store
+
+    def update(self, mutation):
+        return mutation(self.store)
+
+
+@mock.patch('repetiteur_ia.indexation_contenus.encodage_tokens', encodage_caracteres)
+class ChunksContenusTests(TestCase):
+
+    def test_decoupage_avec_chevauchement(self):
+        chunks = decouper_en_chunks('abcdefghij', taille=4, chevauchement=1)
+        self.assertEqual(chunks, [('abcd', 4), ('defg', 4), ('ghij', 4)])
+        self.assertEqual(decouper_en_chunks('   '), [])
+        self.assertEqual(decouper_en_chunks('abc', taille=4, chevauchement=1), [('abc', 3)])
+
+    def test_seuls_les_chunks_modifies_sont_reencodes(self):
+        # 500 caractères : fenêtres de 200 avançant de 160 -> 3 chunks
+        texte = ''.join(chr(ord('a') + i % 26) for i in range(500))
+        document = DocumentPedagogique.objects.create(
+            titre="Fractions", type_document=DocumentPedagogique.TYPE_COURS,
+            matiere="maths", niveau="collège", contenu_texte=texte, est_public=True,
+        )
+        gestionnaire = GestionnaireMemoire()
+        embeddings = mock.Mock(wraps=EmbeddingsFactices())
+        source = IndexationEnAttente.SOURCE_DOCUMENT
+
+        with mock.patch('repetiteur_ia.indexation_contenus.embeddings', embeddings), \
+                mock.patch('repetiteur_ia.indexation_contenus.get_vector_store_manager', return_value=gestionnaire):
+            self.assertEqual(indexer_contenus(source, [document.id]), 3)
+            self.assertEqual(len(embeddings.embed_documents.call_args.args[0]), 3)
+
+            # Contenu inchangé : aucun encodage
+            embeddings.embed_documents.reset_mock()
+            self.assertEqual(indexer_contenus(source, [document.id]), 0)
+            embeddings.embed_documents.assert_not_called()
+
+            # Fin du texte modifiée : seul le dernier chunk est réencodé
+            DocumentPedagogique.objects.filter(id=document.id).update(contenu_texte=texte[:-10] + 'z' * 10)
+            indexer_contenus(source, [document.id])
+            self.assertEqual(len(embeddings.embed_documents.call_args.args[0]), 1)
+
+        self.assertEqual(ChunkIndexe.objects.filter(type_source=source, objet_id=document.id).count(), 3)
+        self.assertEqual(gestionnaire.store.index.ntotal, 3)
+
+
+def archive(membre, xml):
+    tampon = io.BytesIO()
+    with zipfile.ZipFile(tampon, 'w') as zip_fichier:
+        zip_fichier.writestr(membre, xml)
+    tampon.seek(0)
+    return tampon
+
+
+class ExtractionTests(TestCase):
+
+    def test_texte_brut(self):
+        fichier = SimpleUploadedFile('notes.txt', "Les fractions\nsont des nombres".encode('utf-8'))
+        self.assertEqual(extraire_texte(fichier), "Les fractions\nsont des nombres")
+        self.assertEqual(TexteExtrait.objects.get().extracteur, 'texte')
+
+    def test_docx(self):
+        xml = (
+            f'<w:document xmlns:w="{W_NS[1:-1]}"><w:body>'
+            '<w:p><w:r><w:t>Premier </w:t></w:r><w:r><w:t>paragraphe</w:t></w:r></w:p>'
+            '<w:p><w:r><w:t>Second</w:t></w:r></w:p>'
+            '</w:body></w:document>'
+        )
+        self.assertEqual(
+            extraire_texte(archive('word/document.xml', xml), 'cours.docx'),
+            "Premier paragraphe\nSecond",
+        )
+
+    def test_odt(self):
+        xml = (
+            f'<office:document-content xmlns:office="urn:oasis:names:tc:opendocument:xmlns:office:1.0" '
+            f'xmlns:text="{TEXT_NS[1:-1]}"><office:body><office:text>'
+            '<text:h>Titre</text:h><text:p>Corps du <text:span>cours</text:span></text:p>'
+            '</office:text></office:body></office:document-content>'
+        )
+        self.assertEqual(extraire_texte(archive('content.xml', xml), 'cours.odt'), "Titre\nCorps du cours")
+
+    def test_pdf_page_par_page(self):
+        pages = [mock.Mock(**{'extract_text.return_value': texte}) for texte in ("Page 1", "Page 2")]
+        with mock.patch('pypdf.PdfReader', return_value=mock.Mock(pages=pages)):
+            texte = extraire_texte(io.BytesIO(b'%PDF-1.4 factice'), 'cours.pdf')
+        self.assertEqual(texte, "Page 1\n\nPage 2")
+        self.assertEqual(TexteExtrait.objects.get().nb_pages, 2)
+
+    def test_image_ocr(self):
+        from PIL import Image
+
+        tampon = io.BytesIO()
+        Image.new('RGB', (40, 20), 'white').save(tampon, format='PNG')
+        tampon.seek(0)
+        with mock.patch('pytesseract.image_to_string', return_value="Texte scanné") as ocr:
+            self.assertEqual(extraire_texte(tampon, 'photo.png'), "Texte scanné")
+        self.assertEqual(ocr.call_args.args[0].mode, 'L')
+
+    def test_format_non_pris_en_charge(self):
+        self.assertIsNone(extraire_texte(io.BytesIO(b'...'), 'video.mp4'))
+
+    def test_plafond_et_cache_par_empreinte(self):
+        contenu = ("x" * 100).encode('utf-8')
+        self.assertEqual(extraire_texte(io.BytesIO(contenu), 'long.txt', max_caracteres=30), "x" * 30)
+        self.assertTrue(TexteExtrait.objects.get().tronque)
+
+        # Même contenu : servi depuis le cache, sans repasser par l'extracteur
+        echec = mock.Mock(side_effect=AssertionError("extracteur appelé"))
+        with mock.patch.dict(EXTRACTEURS, {'.txt': ('texte', echec)}):
+            self.assertEqual(extraire_texte(io.BytesIO(contenu), 'copie.txt'), "x" * 30)
+        echec.assert_not_called()
@@ -1,4 +1,4 @@
-from django.urls import path
+from django.urls import path, re_path
 from .views import (
     AccueilView, ListeNotificationsView, MarquerNotificationLueView,
     SupprimerNotificationView, GestionEmploiDuTempsView, AjouterEmploiDuTempsView,
@@ -7,6 +7,7 @@ from .views import (
     TestRepetiteurView, fonctionnalitesView, comment_ca_marcheView, a_proposView,
     contactView, RepetiteurChatView, RepetiteurChatSendView, SoumettreCoursView,
     DemarrerSessionView, TerminerSessionView, TableauSessionsView, ProgrammerSessionsView,
+    MetriquesOpenAIView, AudioTTSView, StatutSoumissionView,
 )
 from .views_rappels import (
     RappelsListView, envoyer_rappel_manuel, rappels_enfant_detail, tester_envoi_rappels
@@ -30,9 +31,12 @@ urlpatterns = [
     path('repetiteur/chat/', RepetiteurChatView.as_view(), name='repetiteur_chat'), 
     path('repetiteur/chat/send/', RepetiteurChatSendView.as_view(), name='repetiteur_chat_send'),
     path('repetiteur/test-repetiteur/', TestRepetiteurView.as_view(), name='test_repetiteur'),
+    path('repetiteur/metriques/openai/', MetriquesOpenAIView.as_view(), name='metriques_openai'),
+    re_path(r'^repetiteur/audio/(?P<empreinte>[0-9a-f]{64})\.mp3$', AudioTTSView.as_view(), name='audio_tts'),
 
     # --- Gestion des sessions ---
     path('repetiteur/soumettre-cours/', SoumettreCoursView.as_view(), name='soumettre_cours'),
+    path('repetiteur/soumissions/<int:pk>/statut/', StatutSoumissionView.as_view(), name='statut_soumission'),
     path('repetiteur/sessions/', TableauSessionsView.as_view(), name='tableau_sessions'),
     path('programmer-sessions/', ProgrammerSessionsView.as_view(), name='programmer_sessions'),
     path('repetiteur/session/<int:session_id>/demarrer/', DemarrerSessionView.as_view(), name='demarrer_session'),
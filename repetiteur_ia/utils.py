@@ -1,15 +1,27 @@
-import openai
 from django.conf import settings
 import os
 from datetime import datetime
 import json
-import tempfile
 from django.core.files.storage import FileSystemStorage
 
+from asgiref.sync import sync_to_async
+
+from . import audio_tts
+from .budget_prompt import BudgetPrompt, budget_repetiteur
+from .cache_reponses import chercher_reponse, contexte_partage, enregistrer_reponse
+from .clients_openai import delai_openai, get_client_openai, get_client_openai_async
+
 # Configuration du client OpenAI
 def get_openai_client():
-    """Retourne le client OpenAI configuré"""
-    return openai.OpenAI(api_key=settings.OPENAI_API_KEY)
+    """Retourne le client OpenAI partagé du processus (pool de connexions réutilisé)"""
+    return get_client_openai()
+
+def get_async_openai_client():
+    """
+    Retourne le client OpenAI asynchrone : utilisé par les vues async et les
+    consumers, il libère la boucle d'événements pendant la génération
+    """
+    return get_client_openai_async()
 
 def generer_contenu_ia(titre, matiere, eleve):
     """
@@ -97,42 +109,37 @@ def generer_salutation_eleve(eleve):
         import random
         return random.choice(salutations_fallback)
 
-def repondre_au_repetiteur(question, contexte_pedagogique=None, contexte_session=None, 
-                          niveau_eleve="secondaire", historique_conversation=""):
-    """
-    Version améliorée avec contexte de session, historique et fallback robuste
-    """
-    try:
-        if not getattr(settings, 'OPENAI_API_KEY', None):
-            raise RuntimeError("API key non configurée")
+# Paramètres de complétion communs aux réponses complètes et streamées
+PARAMETRES_REPETITEUR = {
+    'model': "gpt-3.5-turbo",
+    'max_tokens': 1000,
+    'temperature': 0.7,
+}
 
-        # Construction du contexte pédagogique
-        contexte_text = ""
-        if contexte_pedagogique and contexte_pedagogique.get('contenus_similaires'):
-            contexte_text = "CONTEXTE PÉDAGOGIQUE DISPONIBLE:\n"
-            for i, contenu in enumerate(contexte_pedagogique['contenus_similaires'][:3], 1):  # Limiter à 3 contenus
-                contexte_text += f"{i}. {contenu}\n\n"
-        
-        # Construction du contexte de session
-        contexte_session_text = ""
-        if contexte_session:
-            matiere = contexte_session.get('matiere', 'Non spécifiée')
-            objectifs = contexte_session.get('objectifs', 'Aucun objectif spécifique')
-            soumissions_count = len(contexte_session.get('soumissions', []))
-            
-            contexte_session_text = f"""
+SYSTEME_REPETITEUR = """Tu es MrKarfour, un répétiteur pédagogique exceptionnel. 
+            Tes qualités: bienveillant, patient, clair, encourageant.
+            Tu adaptes toujours tes explications au niveau de l'élève.
+            Tu es spécialisé dans l'aide aux révisions et l'explication des concepts difficiles.
+            Tu gardes en mémoire l'historique des conversations pour fournir des réponses cohérentes
+            et éviter les répétitions tout en approfondissant les sujets."""
+
+SECTION_CONTEXTE_PEDAGOGIQUE = "CONTEXTE PÉDAGOGIQUE DISPONIBLE:\n{contenus}"
+
+SECTION_SESSION = """
 CONTEXTE DE SESSION:
 - Matière en cours: {matiere}
 - Objectifs: {objectifs}
-- Documents soumis: {soumissions_count}
+- Documents soumis: {nb_soumissions}
 """
-        
-        # Construction du contexte historique
-        contexte_historique_text = ""
-        if historique_conversation:
-            contexte_historique_text = f"""
+
+SECTION_RESUME = """
+RÉSUMÉ DES ÉCHANGES PRÉCÉDENTS DE LA SESSION:
+{resume}
+"""
+
+SECTION_HISTORIQUE = """
 HISTORIQUE RÉCENT DE LA CONVERSATION:
-{historique_conversation}
+{historique}
 
 CONSIGNES POUR L'HISTORIQUE:
 - Prends en compte cet historique pour maintenir la cohérence
@@ -141,16 +148,15 @@ CONSIGNES POUR L'HISTORIQUE:
 - Si l'élève revient sur un point déjà discuté, approfondis ou donne une nouvelle perspective
 - Utilise l'historique pour mieux comprendre le niveau et les besoins de l'élève
 """
-        
-        # Construction du prompt amélioré
-        prompt = f"""
+
+PROMPT_REPETITEUR = """
 Tu es MrKarfour, un répétiteur pédagogique bienveillant pour des élèves de {niveau_eleve}.
 
-{contexte_historique_text}
+{historique}
 
-{contexte_session_text}
+{session}
 
-{contexte_text}
+{contexte}
 
 QUESTION ACTUELLE DE L'ÉLÈVE:
 "{question}"
@@ -171,43 +177,241 @@ TA MISSION:
 
 RÉPONSE (en français, naturelle et conversationnelle, en maintenant une continuité avec l'historique):
 """
-        
+
+def construire_messages_repetiteur(question, contexte_pedagogique=None, contexte_session=None,
+                                   niveau_eleve="secondaire", historique_conversation="",
+                                   resume_conversation="", journaliser=True):
+    """
+    Construit les messages (system + prompt enrichi) envoyés au modèle du répétiteur
+    dans le budget REPETITEUR_BUDGET_TOKENS. Priorités : question, session, contenus
+    pédagogiques (les moins pertinents abandonnés d'abord), résumé de la session,
+    puis derniers échanges (les plus anciens coupés d'abord).
+    """
+    total, plafonds = budget_repetiteur()
+    budget = BudgetPrompt(total, PARAMETRES_REPETITEUR['model'])
+    budget.reserver('consignes', SYSTEME_REPETITEUR)
+    budget.reserver('consignes', PROMPT_REPETITEUR.format(
+        niveau_eleve=niveau_eleve, historique='', session='', contexte='', question=''
+    ))
+
+    question = budget.allouer('question', question, plafonds['question'])
+
+    # Construction du contexte de session
+    contexte_session_text = ""
+    if contexte_session:
+        matiere = contexte_session.get('matiere', 'Non spécifiée')
+        nb_soumissions = contexte_session.get('nb_soumissions', len(contexte_session.get('soumissions', [])))
+        budget.reserver('session', SECTION_SESSION.format(
+            matiere=matiere, objectifs='', nb_soumissions=nb_soumissions
+        ))
+        objectifs = budget.allouer(
+            'session', contexte_session.get('objectifs') or 'Aucun objectif spécifique', plafonds['session']
+        )
+        contexte_session_text = SECTION_SESSION.format(
+            matiere=matiere, objectifs=objectifs, nb_soumissions=nb_soumissions
+        )
+
+    # Construction du contexte pédagogique (contenus classés par similarité)
+    contexte_text = ""
+    if contexte_pedagogique and contexte_pedagogique.get('contenus_similaires'):
+        budget.reserver('contexte', SECTION_CONTEXTE_PEDAGOGIQUE.format(contenus=''))
+        contenus = budget.allouer_liste(
+            'contexte', contexte_pedagogique['contenus_similaires'][:3],  # Limiter à 3 contenus
+            plafond=plafonds['contexte'], plafond_element=plafonds['contenu']
+        )
+        if contenus:
+            contexte_text = SECTION_CONTEXTE_PEDAGOGIQUE.format(
+                contenus=''.join(f"{i}. {contenu}\n\n" for i, contenu in enumerate(contenus, 1))
+            )
+
+    # Résumé glissant de la session, puis derniers échanges bruts dont la fin est conservée
+    contexte_historique_text = ""
+    if resume_conversation:
+        budget.reserver('resume', SECTION_RESUME.format(resume=''))
+        resume = budget.allouer('resume', resume_conversation, plafonds['resume'])
+        if resume:
+            contexte_historique_text = SECTION_RESUME.format(resume=resume)
+    if historique_conversation:
+        budget.reserver('historique', SECTION_HISTORIQUE.format(historique=''))
+        historique = budget.allouer('historique', historique_conversation, plafonds['historique'], garder='fin')
+        if historique:
+            contexte_historique_text += SECTION_HISTORIQUE.format(historique=historique)
+
+    prompt = PROMPT_REPETITEUR.format(
+        niveau_eleve=niveau_eleve,
+        historique=contexte_historique_text,
+        session=contexte_session_text,
+        contexte=contexte_text,
+        question=question,
+    )
+    if journaliser:
+        print(f"🧮 Prompt répétiteur : {budget.resume()}")
+
+    return [
+        {
+            "role": "system", 
+            "content": SYSTEME_REPETITEUR
+        },
+        {
+            "role": "user", 
+            "content": prompt
+        }
+    ]
+
+def reponse_repetiteur_fallback(question, contexte_session=None, historique_conversation=""):
+    """Réponse de secours quand le modèle est indisponible"""
+    if contexte_session and contexte_session.get('matiere'):
+        matiere = contexte_session['matiere']
+        return f"Bonjour ! Je suis MrKarfour. Pour votre question sur {matiere}, je suis actuellement en cours de configuration. En attendant, n'hésitez pas à explorer vos documents de cours pour {matiere} !"
+    else:
+        # Essayer de personnaliser même en fallback
+        if historique_conversation:
+            return f"Bonjour ! Je vois que nous avons déjà échangé. Pour votre question '{question[:50]}...', je suis temporairement en maintenance. Je me souviens de notre conversation précédente et serai bientôt de retour pour poursuivre !"
+        else:
+            return f"Bonjour ! Je suis MrKarfour, votre répétiteur IA. Pour votre question '{question[:50]}...', je suis actuellement en cours de configuration. En attendant, n'hésitez pas à explorer vos cours et exercices !"
+
+def _matiere_session(contexte_session):
+    return (contexte_session or {}).get('matiere') or ''
+
+def _tokens_utilises(usage):
+    return getattr(usage, 'total_tokens', 0) or 0
+
+def _messages_repetiteur(question, partage, contexte_pedagogique, contexte_session, niveau_eleve,
+                         historique_conversation, resume_conversation):
+    """
+    Prompt générique, construit sans rien de propre à l'élève, pour une réponse
+    partageable (voir contexte_partage) ; prompt personnalisé complet sinon
+    """
+    if partage:
+        return construire_messages_repetiteur(
+            question, partage['contexte_pedagogique'], partage['contexte_session'], niveau_eleve
+        )
+    return construire_messages_repetiteur(
+        question, contexte_pedagogique, contexte_session, niveau_eleve,
+        historique_conversation, resume_conversation
+    )
+
+def repondre_au_repetiteur(question, contexte_pedagogique=None, contexte_session=None, 
+                          niveau_eleve="secondaire", historique_conversation="", resume_conversation=""):
+    """
+    Version améliorée avec contexte de session, historique et fallback robuste.
+    Une question qui se comprend seule reçoit la réponse partageable (question,
+    niveau, matière et contenus communs), servie depuis le cache de réponses
+    quand une question équivalente a déjà été traitée ; une question qui
+    renvoie à l'échange en cours reçoit une réponse personnalisée hors cache.
+    """
+    matiere = _matiere_session(contexte_session)
+    partage = contexte_partage(question, contexte_pedagogique, contexte_session, historique_conversation, resume_conversation)
+    contexte = partage['empreinte'] if partage else None
+    entree, vecteur = chercher_reponse(question, niveau_eleve, matiere, contexte)
+    if entree:
+        return entree.reponse
+
+    try:
+        if not getattr(settings, 'OPENAI_API_KEY', None):
+            raise RuntimeError("API key non configurée")
+
         response = get_openai_client().chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {
-                    "role": "system", 
-                    "content": """Tu es MrKarfour, un répétiteur pédagogique exceptionnel. 
-                    Tes qualités: bienveillant, patient, clair, encourageant.
-                    Tu adaptes toujours tes explications au niveau de l'élève.
-                    Tu es spécialisé dans l'aide aux révisions et l'explication des concepts difficiles.
-                    Tu gardes en mémoire l'historique des conversations pour fournir des réponses cohérentes
-                    et éviter les répétitions tout en approfondissant les sujets."""
-                },
-                {
-                    "role": "user", 
-                    "content": prompt
-                }
-            ],
-            max_tokens=1000,
-            temperature=0.7
+            messages=_messages_repetiteur(
+                question, partage, contexte_pedagogique, contexte_session, niveau_eleve,
+                historique_conversation, resume_conversation
+            ),
+            **PARAMETRES_REPETITEUR
         )
 
         reponse = response.choices[0].message.content.strip()
+        enregistrer_reponse(
+            question, niveau_eleve, matiere, reponse, _tokens_utilises(response.usage), vecteur, contexte
+        )
         return reponse
 
     except Exception as e:
         print(f"[ERREUR IA Répétiteur]: {e}")
-        # Réponse de fallback contextuelle avec prise en compte de l'historique
-        if contexte_session and contexte_session.get('matiere'):
-            matiere = contexte_session['matiere']
-            return f"Bonjour ! Je suis MrKarfour. Pour votre question sur {matiere}, je suis actuellement en cours de configuration. En attendant, n'hésitez pas à explorer vos documents de cours pour {matiere} !"
-        else:
-            # Essayer de personnaliser même en fallback
-            if historique_conversation:
-                return f"Bonjour ! Je vois que nous avons déjà échangé. Pour votre question '{question[:50]}...', je suis temporairement en maintenance. Je me souviens de notre conversation précédente et serai bientôt de retour pour poursuivre !"
-            else:
-                return f"Bonjour ! Je suis MrKarfour, votre répétiteur IA. Pour votre question '{question[:50]}...', je suis actuellement en cours de configuration. En attendant, n'hésitez pas à explorer vos cours et exercices !"
+        return reponse_repetiteur_fallback(question, contexte_session, historique_conversation or resume_conversation)
+
+async def repondre_au_repetiteur_async(question, contexte_pedagogique=None, contexte_session=None,
+                                       niveau_eleve="secondaire", historique_conversation="",
+                                       resume_conversation=""):
+    """Variante async de repondre_au_repetiteur"""
+    matiere = _matiere_session(contexte_session)
+    partage = contexte_partage(question, contexte_pedagogique, contexte_session, historique_conversation, resume_conversation)
+    contexte = partage['empreinte'] if partage else None
+    entree, vecteur = await sync_to_async(chercher_reponse)(question, niveau_eleve, matiere, contexte)
+    if entree:
+        return entree.reponse
+
+    try:
+        if not getattr(settings, 'OPENAI_API_KEY', None):
+            raise RuntimeError("API key non configurée")
+
+        response = await get_async_openai_client().chat.completions.create(
+            messages=_messages_repetiteur(
+                question, partage, contexte_pedagogique, contexte_session, niveau_eleve,
+                historique_conversation, resume_conversation
+            ),
+            **PARAMETRES_REPETITEUR
+        )
+        reponse = response.choices[0].message.content.strip()
+        await sync_to_async(enregistrer_reponse)(
+            question, niveau_eleve, matiere, reponse, _tokens_utilises(response.usage), vecteur, contexte
+        )
+        return reponse
+
+    except Exception as e:
+        print(f"[ERREUR IA Répétiteur]: {e}")
+        return reponse_repetiteur_fallback(question, contexte_session, historique_conversation or resume_conversation)
+
+async def repondre_au_repetiteur_stream(question, contexte_pedagogique=None, contexte_session=None,
+                                        niveau_eleve="secondaire", historique_conversation="",
+                                        resume_conversation=""):
+    """
+    Variante streamée de repondre_au_repetiteur : générateur asynchrone qui
+    produit les fragments de texte au fur et à mesure que le modèle les émet.
+    Si le modèle échoue avant le premier fragment, produit la réponse de secours.
+    Une réponse trouvée dans le cache est produite d'un seul fragment.
+    """
+    matiere = _matiere_session(contexte_session)
+    partage = contexte_partage(question, contexte_pedagogique, contexte_session, historique_conversation, resume_conversation)
+    contexte = partage['empreinte'] if partage else None
+    entree, vecteur = await sync_to_async(chercher_reponse)(question, niveau_eleve, matiere, contexte)
+    if entree:
+        yield entree.reponse
+        return
+
+    fragments = []
+    tokens = 0
+    try:
+        if not getattr(settings, 'OPENAI_API_KEY', None):
+            raise RuntimeError("API key non configurée")
+
+        stream = await get_async_openai_client().chat.completions.create(
+            messages=_messages_repetiteur(
+                question, partage, contexte_pedagogique, contexte_session, niveau_eleve,
+                historique_conversation, resume_conversation
+            ),
+            stream=True,
+            stream_options={"include_usage": True},
+            **PARAMETRES_REPETITEUR
+        )
+        async for chunk in stream:
+            if chunk.usage:
+                tokens = _tokens_utilises(chunk.usage)
+            if not chunk.choices:
+                continue
+            fragment = chunk.choices[0].delta.content
+            if fragment:
+                fragments.append(fragment)
+                yield fragment
+
+    except Exception as e:
+        print(f"[ERREUR IA Répétiteur stream]: {e}")
+        if not fragments:
+            yield reponse_repetiteur_fallback(question, contexte_session, historique_conversation or resume_conversation)
+        return
+
+    await sync_to_async(enregistrer_reponse)(
+        question, niveau_eleve, matiere, ''.join(fragments).strip(), tokens, vecteur, contexte
+    )
 
 def transcrire_audio(fichier_audio):
     """
@@ -228,7 +432,8 @@ def transcrire_audio(fichier_audio):
                 model="whisper-1",
                 file=audio_file,
                 response_format="text",
-                language="fr"  # Spécifier le français pour de meilleurs résultats
+                language="fr",  # Spécifier le français pour de meilleurs résultats
+                timeout=delai_openai('transcription')
             )
         
         # Nettoyer le fichier temporaire
@@ -240,33 +445,59 @@ def transcrire_audio(fichier_audio):
         print(f"[ERREUR TRANSCRIPTION]: {e}")
         return "Je n'ai pas compris la question audio. Pouvez-vous répéter ou écrire votre question ?"
 
+async def transcrire_audio_async(fichier_audio):
+    """Variante async de transcrire_audio : le fichier est envoyé depuis la mémoire"""
+    try:
+        if not getattr(settings, 'OPENAI_API_KEY', None) or settings.OPENAI_API_KEY.startswith('sk-proj-'):
+            return "Fonctionnalité audio temporairement indisponible. Veuillez taper votre question."
+
+        transcript = await get_async_openai_client().audio.transcriptions.create(
+            model="whisper-1",
+            file=(fichier_audio.name, fichier_audio.read()),
+            response_format="text",
+            language="fr",
+            timeout=delai_openai('transcription')
+        )
+        return transcript.strip()
+
+    except Exception as e:
+        print(f"[ERREUR TRANSCRIPTION]: {e}")
+        return "Je n'ai pas compris la question audio. Pouvez-vous répéter ou écrire votre question ?"
+
+def _tts_disponible():
+    return getattr(settings, 'OPENAI_API_KEY', None) and not settings.OPENAI_API_KEY.startswith('sk-proj-')
+
 def generer_audio(texte):
     """
-    Transforme la réponse texte en audio via TTS
+    Transforme la réponse texte en audio via TTS et retourne l'URL servable
+    du fichier (stockage adressé par contenu : un texte déjà synthétisé
+    n'est pas regénéré)
     """
     try:
-        if not getattr(settings, 'OPENAI_API_KEY', None) or settings.OPENAI_API_KEY.startswith('sk-proj-'):
+        if not _tts_disponible():
             return ""  # Retourner une chaîne vide si pas d'API fonctionnelle
-        
-        if not texte or len(texte.strip()) < 10:
-            return ""
-            
-        # Conversion du texte en parole
-        response = get_openai_client().audio.speech.create(
-            model="tts-1",
-            voice="alloy",
-            input=texte[:1000]  # Limiter la longueur
-        )
-        
-        # Sauvegarder dans un fichier temporaire
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as tmp_file:
-            response.stream_to_file(tmp_file.name)
-            return tmp_file.name
+
+        empreinte = audio_tts.synthetiser(texte)
+        return audio_tts.url_audio(empreinte) if empreinte else ""
 
     except Exception as e:
         print(f"[ERREUR AUDIO]: {e}")
         return ""
 
+def programmer_audio(texte):
+    """
+    Audio d'une réponse du chat : ``{'url', 'pret'}`` ou None. Selon
+    AUDIO_TTS_DIFFERE, la synthèse est faite tout de suite ou confiée à Celery.
+    """
+    try:
+        if not _tts_disponible():
+            return None
+        return audio_tts.programmer_audio(texte)
+
+    except Exception as e:
+        print(f"[ERREUR AUDIO]: {e}")
+        return None
+
 def generer_quiz_ia(cours):
     """
     Version réelle avec l'API OpenAI pour générer un quiz
@@ -361,6 +592,66 @@ def analyser_contenu_soumission(contenu_texte, matiere, niveau_eleve):
         print(f"Erreur analyse contenu: {e}")
         return "Analyse automatique temporairement indisponible."
 
+def resumer_soumission(contenu):
+    """Résumé structuré d'un cours soumis par l'élève (lève en cas d'échec)"""
+    prompt = f"""
+    En tant qu'assistant pédagogique MrKarfour, analyse ce contenu de cours et génère un résumé structuré :
+    
+    CONTENU À ANALYSER:
+    {contenu[:4000]}
+    
+    STRUCTURE TA RÉPONSE AVEC:
+    1. 📝 **Points clés** (les concepts les plus importants)
+    2. 🎯 **Objectifs d'apprentissage** (ce que l'élève devrait maîtriser)
+    3. 💡 **Conseils de révision** (méthodes pour bien retenir)
+    4. ❓ **Questions de réflexion** (pour tester la compréhension)
+    
+    Sois encourageant et pédagogique !
+    """
+
+    response = get_openai_client().chat.completions.create(
+        model="gpt-4o-mini",
+        messages=[{"role": "user", "content": prompt}],
+        max_tokens=1000,
+        temperature=0.7
+    )
+    return response.choices[0].message.content.strip()
+
+def rediger_reponse_soumission(nom_eleve, matiere, type_soumission, quiz_genere, resume_automatique):
+    """Message d'accueil de MrKarfour après une soumission (lève en cas d'échec)"""
+    prompt = f"""
+    Tu es MrKarfour, un répétiteur pédagogique bienveillant et encourageant.
+    
+    CONTEXTE:
+    - Élève: {nom_eleve}
+    - Matière: {matiere}
+    - Type de soumission: {type_soumission}
+    - Quiz généré: {"Oui" if quiz_genere else "Non"}
+    
+    RÉSUMÉ GÉNÉRÉ:
+    {resume_automatique[:1000]}
+    
+    TÂCHE:
+    Écris une réponse chaleureuse et motivante pour accueillir la soumission de l'élève.
+    
+    TON MESSAGE DOIT:
+    1. 🎉 Féliciter l'élève pour sa démarche proactive
+    2. 📚 Résumer brièvement ce que tu as compris du contenu
+    3. 🎯 Proposer des pistes de révision ou des questions à explorer
+    4. 💬 Inviter l'élève à interagir avec toi
+    5. 🔍 Mentionner le quiz si il a été généré
+    
+    Sois naturel, amical et pédagogique. Utilise des émojis avec modération.
+    """
+
+    response = get_openai_client().chat.completions.create(
+        model="gpt-4o-mini",
+        messages=[{"role": "user", "content": prompt}],
+        max_tokens=800,
+        temperature=0.8
+    )
+    return response.choices[0].message.content.strip()
+
 def generer_plan_revision_session(session, soumissions):
     """
     Génère un plan de révision personnalisé basé sur la session et les soumissions
@@ -524,6 +815,36 @@ def nettoyer_reponse_ia(reponse):
     
     return reponse
 
+def resumer_conversation(resume_precedent, echanges, max_tokens=400):
+    """Résumé glissant d'une session complété par de nouveaux échanges (lève en cas d'échec)"""
+    prompt = f"""
+    Tu tiens à jour le résumé d'une session de révision entre un élève et son répétiteur MrKarfour.
+    
+    RÉSUMÉ ACTUEL:
+    {resume_precedent or "Aucun (début de session)."}
+    
+    NOUVEAUX ÉCHANGES:
+    {echanges}
+    
+    Réécris le résumé en y intégrant les nouveaux échanges :
+    1. Les notions abordées et les explications déjà données
+    2. Les difficultés et erreurs de l'élève
+    3. Les questions restées ouvertes
+    
+    Garde ce qui reste utile du résumé actuel. Sois concis (quelques puces), en français.
+    """
+
+    response = get_openai_client().chat.completions.create(
+        model="gpt-4o-mini",
+        messages=[
+            {"role": "system", "content": "Tu es un expert en synthèse pédagogique."},
+            {"role": "user", "content": prompt}
+        ],
+        max_tokens=max_tokens,
+        temperature=0.3
+    )
+    return response.choices[0].message.content.strip()
+
 # Nouvelle fonction pour analyser l'historique et en extraire le contexte
 def analyser_historique_conversation(historique_conversations):
     """
@@ -620,22 +941,12 @@ def generer_resume_session(historique_conversations, objectifs_session):
 
 def extraire_texte_fichier(chemin_fichier):
     """
-    Extrait le texte d'un fichier (PDF, DOCX, etc.)
-    À implémenter selon vos besoins
+    Extrait le texte d'un fichier (PDF, DOCX, ODT, texte, image par OCR)
+    via les extracteurs de extraction.py, avec cache par empreinte
     """
-    try:
-        # Exemple basique pour les fichiers texte
-        if chemin_fichier.endswith('.txt'):
-            with open(chemin_fichier, 'r', encoding='utf-8') as f:
-                return f.read()
-        
-        # Pour d'autres formats, vous pouvez utiliser des bibliothèques comme:
-        # - PyPDF2 pour les PDF
-        # - python-docx pour les DOCX
-        # - etc.
-        
-        return f"Contenu du fichier: {os.path.basename(chemin_fichier)}"
-        
-    except Exception as e:
-        print(f"Erreur extraction texte fichier: {e}")
-        return f"Fichier: {os.path.basename(chemin_fichier)}"
\ No newline at end of file
+    from .extraction import texte_fichier
+
+    texte = texte_fichier(chemin_fichier)
+    if texte:
+        return texte
+    return f"Contenu du fichier: {os.path.basename(str(chemin_fichier))}"
\ No newline at end of file
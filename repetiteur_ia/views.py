@@ -5,7 +5,7 @@ from django.views.decorators.http import require_POST
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.messages.views import SuccessMessageMixin
 from django.shortcuts import redirect, get_object_or_404, render
-from django.http import JsonResponse
+from django.http import JsonResponse, FileResponse, HttpResponse, StreamingHttpResponse, Http404
 from django.utils.decorators import method_decorator
 from django.contrib import messages
 from django.db import transaction, IntegrityError
@@ -16,9 +16,10 @@ import json
 from django.core.management import call_command
 from io import StringIO
 import sys
+from asgiref.sync import sync_to_async
 
 from .embeddings import search_similar_content, create_vector_store_from_texts
-from openai import OpenAI
+from .clients_openai import metriques_openai
 from django.conf import settings
 
 from utilisateurs.models import Eleve, Parent
@@ -27,12 +28,23 @@ from repetiteur_ia.models import Notification, SessionRevisionProgrammee, Soumis
 from repetiteur_ia.forms import EmploiDuTempsForm, SoumissionCoursForm
 from cours.models import EmploiDuTemps
 from paiement.models import Paiement 
-from .utils import generer_audio, generer_salutation_eleve, repondre_au_repetiteur, transcrire_audio, generer_contenu_ia
-
-
-
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
-
+from .utils import (
+    generer_salutation_eleve, repondre_au_repetiteur, transcrire_audio, generer_contenu_ia,
+    get_openai_client, programmer_audio,
+    repondre_au_repetiteur_async, transcrire_audio_async,
+)
+from core.cache_pages import cache_page_anonyme, donnees_en_cache
+from .acces import acces_repetiteur_requis, droits_repetiteur, invalider_droits, oublier_droits
+from .mixins import AsyncLoginRequiredMixin
+from . import audio_tts, soumissions
+from .conversation import (
+    contexte_utilise, echange_en_dict, get_eleve_context, get_historique_recent, preparer_contexte_question,
+    sauvegarder_conversation, verifier_acces_repetiteur,
+)
+
+
+
+@method_decorator(cache_page_anonyme(), name='dispatch')
 class AccueilView(TemplateView):
     template_name = 'index.html'
     
@@ -46,9 +58,12 @@ class AccueilView(TemplateView):
                     context['eleve'] = eleve
                     
                     #  Cours récents : utiliser la table intermédiaire
-                    context['cours_recents'] = Cours.objects.filter(
-                        eleves_inscrits__eleve=eleve
-                    ).order_by('-date_creation')[:5]
+                    context['cours_recents'] = donnees_en_cache(
+                        ['cours', f'eleve:{eleve.id}'], ('accueil_cours_recents', eleve.id),
+                        lambda: list(Cours.objects.filter(
+                            eleves_inscrits__eleve=eleve
+                        ).order_by('-date_creation')[:5])
+                    )
                     
                     #  Notifications non lues
                     context['notifications'] = Notification.objects.filter(
@@ -58,11 +73,14 @@ class AccueilView(TemplateView):
                     
                     #  Emploi du temps : comme il est lié directement à l'élève, c’est correct
                     jour_actuel = timezone.now().strftime('%A').lower()
-                    context['emploi_du_temps_aujourdhui'] = EmploiDuTemps.objects.filter(
-                        eleve=eleve, 
-                        jour_semaine=jour_actuel,
-                        actif=True
-                    ).order_by('heure_debut')
+                    context['emploi_du_temps_aujourdhui'] = donnees_en_cache(
+                        f'eleve:{eleve.id}', ('accueil_emploi_du_temps', eleve.id, jour_actuel),
+                        lambda: list(EmploiDuTemps.objects.filter(
+                            eleve=eleve, 
+                            jour_semaine=jour_actuel,
+                            actif=True
+                        ).order_by('heure_debut'))
+                    )
                     
                 except Eleve.DoesNotExist:
                     pass
@@ -99,7 +117,7 @@ class TableauDeBordView(LoginRequiredMixin, TemplateView):
         if request.user.type_utilisateur == 'élève':
             try:
                 eleve = Eleve.objects.get(user=request.user)
-                self._mettre_a_jour_abonnement(eleve)
+                self._mettre_a_jour_abonnement(eleve, request.user)
 
                 if eleve.abonnement_actif:
                     # Programmer automatiquement les sessions si nécessaire
@@ -118,28 +136,16 @@ class TableauDeBordView(LoginRequiredMixin, TemplateView):
 
         return redirect('accueil')
 
-    def _mettre_a_jour_abonnement(self, eleve):
-        maintenant = timezone.now().date()
-
-        paiement_actif = (
-            Paiement.objects.filter(eleve=eleve, statut=Paiement.STATUT_COMPLET)
-            .order_by('-date_paiement')
-            .first()
-        )
-
-        if paiement_actif:
-            if paiement_actif.date_debut_abonnement <= maintenant <= paiement_actif.date_fin_abonnement:
-                if not eleve.abonnement_actif:
-                    eleve.abonnement_actif = True
-                    eleve.save()
-            else:
-                if eleve.abonnement_actif:
-                    eleve.abonnement_actif = False
-                    eleve.save()
-        else:
-            if eleve.abonnement_actif:
-                eleve.abonnement_actif = False
-                eleve.save()
+    def _mettre_a_jour_abonnement(self, eleve, user):
+        """Aligne abonnement_actif sur l'existence d'un paiement en cours (sans requête Paiement)"""
+        paiement_en_cours = droits_repetiteur(user).paiement_en_cours(eleve.id)
+        if eleve.abonnement_actif != paiement_en_cours:
+            eleve.abonnement_actif = paiement_en_cours
+            eleve.save()
+            # Droits résolus avant la mise à jour : ni la mémoire de la requête
+            # ni l'entrée du jour ne doivent survivre à la sauvegarde
+            oublier_droits(user)
+            invalider_droits(user.pk)
 
     def _programmer_sessions_automatiques(self, eleve):
         """Programme automatiquement les sessions si l'élève n'en a pas pour la semaine"""
@@ -222,18 +228,23 @@ class TableauDeBordView(LoginRequiredMixin, TemplateView):
                 eleve = Eleve.objects.get(user=self.request.user)
                 context['eleve'] = eleve
 
-                # Statistiques complètes
-                context['statistiques'] = {
-                    'cours_crees': Cours.objects.filter(eleves=eleve).count(),
-                    'quiz_completes': Quiz.objects.filter(cours__eleves=eleve).count(),
-                    'sessions_programmees': SessionRevisionProgrammee.objects.filter(eleve=eleve).count(),
-                    'sessions_terminees': SessionRevisionProgrammee.objects.filter(eleve=eleve, statut='terminee').count(),
-                    'sessions_en_cours': SessionRevisionProgrammee.objects.filter(eleve=eleve, statut='en_cours').count(),
-                    'prochaines_sessions': SessionRevisionProgrammee.objects.filter(
-                        eleve=eleve, 
-                        date_programmation__gte=timezone.now()
-                    ).count(),
-                }
+                # Statistiques complètes (cache invalidé par les signaux cours / sessions)
+                context['statistiques'] = donnees_en_cache(
+                    ['cours', f'eleve:{eleve.id}'], ('tableau_de_bord_stats', eleve.id),
+                    lambda: {
+                        'cours_crees': Cours.objects.filter(eleves=eleve).count(),
+                        'quiz_completes': Quiz.objects.filter(cours__eleves=eleve).count(),
+                        'sessions_programmees': SessionRevisionProgrammee.objects.filter(eleve=eleve).count(),
+                        'sessions_terminees': SessionRevisionProgrammee.objects.filter(eleve=eleve, statut='terminee').count(),
+                        'sessions_en_cours': SessionRevisionProgrammee.objects.filter(eleve=eleve, statut='en_cours').count(),
+                        'prochaines_sessions': SessionRevisionProgrammee.objects.filter(
+                            eleve=eleve, 
+                            date_programmation__gte=timezone.now()
+                        ).count(),
+                    },
+                    # prochaines_sessions dépend de l'heure : durée courte
+                    duree=300,
+                )
 
                 # Emploi du temps personnel
                 context['emploi_du_temps'] = EmploiDuTemps.objects.filter(
@@ -273,7 +284,7 @@ class TableauDeBordView(LoginRequiredMixin, TemplateView):
                 context['paiement_actif'] = paiement_actif
 
                 # Accès répétiteur IA
-                if getattr(eleve, 'abonnement_actif', False):
+                if droits_repetiteur(self.request.user).autorise:
                     context['repetiteur_access'] = True
                     try:
                         context['salutation_repetiteur'] = generer_salutation_eleve(eleve)
@@ -282,7 +293,10 @@ class TableauDeBordView(LoginRequiredMixin, TemplateView):
 
                 # Informations pour le template
                 context['aujourdhui'] = timezone.now().strftime('%A %d %B %Y')
-                context['semaine_progression'] = self._calculer_progression_semaine(eleve)
+                context['semaine_progression'] = donnees_en_cache(
+                    f'eleve:{eleve.id}', ('progression_semaine', eleve.id, timezone.now().date()),
+                    lambda: self._calculer_progression_semaine(eleve)
+                )
 
             except Eleve.DoesNotExist:
                 messages.error(self.request, "Profil élève introuvable.")
@@ -310,7 +324,8 @@ class TableauDeBordView(LoginRequiredMixin, TemplateView):
                     context['enfants_avec_statistiques'].append(stats_enfant)
 
                 # Vérifie si au moins un enfant a un abonnement actif
-                actif_enfant = next((e for e in enfants if getattr(e, 'abonnement_actif', False)), None)
+                droits = droits_repetiteur(self.request.user)
+                actif_enfant = next((e for e in enfants if droits.autorise_pour(e.id)), None)
                 if actif_enfant:
                     context['repetiteur_access'] = True
                     try:
@@ -355,123 +370,32 @@ class TableauDeBordView(LoginRequiredMixin, TemplateView):
             return {'pourcentage': 0, 'terminees': 0, 'total': 0}
         
         
-class RepetiteurChatView(LoginRequiredMixin, View):
+@method_decorator(acces_repetiteur_requis, name='dispatch')
+class RepetiteurChatView(AsyncLoginRequiredMixin, View):
+    """
+    Chat du répétiteur. Les handlers sont async : pendant la génération OpenAI
+    le worker ASGI continue de servir les autres requêtes, seules les parties
+    ORM passent par sync_to_async.
+    """
     template_name = 'repetiteur_ia/chat.html'
 
-    def dispatch(self, request, *args, **kwargs):
-        user = request.user
-
-        # Vérification pour élève
-        if getattr(user, 'type_utilisateur', None) == 'élève':
-            try:
-                eleve = Eleve.objects.get(user=user)
-                if getattr(eleve, 'abonnement_actif', False):
-                    return super().dispatch(request, *args, **kwargs)
-                # Vérification des paiements
-                dernier_paiement = Paiement.objects.filter(eleve=eleve, statut=Paiement.STATUT_COMPLET).order_by('-date_paiement').first()
-                if dernier_paiement:
-                    return super().dispatch(request, *args, **kwargs)
-                messages.info(request, "Souscrivez pour accéder au répétiteur IA.")
-                return redirect('abonnements')
-            except Eleve.DoesNotExist:
-                messages.error(request, "Profil élève introuvable.")
-                return redirect('profil')
-
-        # Vérification pour parent
-        if getattr(user, 'type_utilisateur', None) == 'parent':
-            try:
-                parent = user.parent
-                enfants = parent.eleves.all()
-                if any(getattr(e, 'abonnement_actif', False) for e in enfants):
-                    return super().dispatch(request, *args, **kwargs)
-            except:
-                pass
-            messages.info(request, "Aucun enfant avec abonnement actif.")
-            return redirect('profil')
-
-        messages.error(request, "Accès non autorisé.")
-        return redirect('accueil')
-
     def _sauvegarder_conversation(self, utilisateur, session, question, reponse, contexte=None):
         """Sauvegarde l'échange dans l'historique"""
-        from .models import HistoriqueConversation
-        
-        type_conv = 'session' if session else 'libre'
-        
-        HistoriqueConversation.objects.create(
-            utilisateur=utilisateur,
-            session=session,
-            type_conversation=type_conv,
-            question=question,
-            reponse=reponse,
-            contexte_utilise=contexte or {}
-        )
+        return sauvegarder_conversation(utilisateur, session, question, reponse, contexte)
 
     def _get_historique_recent(self, utilisateur, session=None, limit=10):
         """Récupère l'historique récent pour le contexte"""
-        from .models import HistoriqueConversation
-        
-        queryset = HistoriqueConversation.objects.filter(
-            utilisateur=utilisateur
-        ).order_by('-date_creation')
-        
-        if session:
-            queryset = queryset.filter(session=session)
-            
-        historique = list(queryset[:limit])
-        historique.reverse()  # Pour avoir l'ordre chronologique
-        
-        return [
-            {
-                'id': conv.id,
-                'question': conv.question,
-                'reponse': conv.reponse,
-                'date': conv.date_creation,
-                'session': conv.session_id,
-                'type_conversation': conv.type_conversation
-            }
-            for conv in historique
-        ]
+        return get_historique_recent(utilisateur, session, limit)
 
     def _get_eleve_context(self, request):
         """Récupère et structure les informations de l'élève"""
-        user = request.user
-        
-        if user.type_utilisateur == 'élève':
-            try:
-                eleve = Eleve.objects.select_related('user').get(user=user)
-                return {
-                    'eleve': eleve,
-                    'niveau': eleve.get_niveau_display(),
-                    'classe': eleve.get_classe_display(),
-                    'nom_complet': eleve.user.get_full_name() or eleve.user.username
-                }
-            except Eleve.DoesNotExist:
-                return None
-                
-        elif user.type_utilisateur == 'parent':
-            try:
-                parent = user.parent
-                enfants_actifs = [
-                    e for e in parent.eleves.all() 
-                    if getattr(e, 'abonnement_actif', False)
-                ]
-                if enfants_actifs:
-                    eleve = enfants_actifs[0]
-                    return {
-                        'eleve': eleve,
-                        'niveau': eleve.get_niveau_display(),
-                        'classe': eleve.get_classe_display(),
-                        'nom_complet': eleve.user.get_full_name() or eleve.user.username,
-                        'est_parent': True
-                    }
-            except Parent.DoesNotExist:
-                pass
-                
-        return None
+        return get_eleve_context(request.user)
 
-    def get(self, request):
+    async def get(self, request):
         """Affiche la page du chat avec sessions programmées et historique"""
+        return await sync_to_async(self._afficher_chat)(request)
+
+    def _afficher_chat(self, request):
         context = self.get_context_data()
         
         # Récupérer la session active si spécifiée
@@ -562,18 +486,11 @@ class RepetiteurChatView(LoginRequiredMixin, View):
                 ).values_list('matiere', flat=True).distinct()
                 
             else:
-                # Cas parent
-                parent = self.request.user.parent
-                actif = next((e for e in parent.eleves.all() if getattr(e, 'abonnement_actif', False)), None)
-                if actif:
-                    ctx['salutation'] = generer_salutation_eleve(actif)
-                    ctx['eleve_info'] = {
-                        'eleve': actif,
-                        'niveau': actif.get_niveau_display(),
-                        'classe': actif.get_classe_display(),
-                        'nom_complet': actif.user.get_full_name() or actif.user.username,
-                        'est_parent': True
-                    }
+                # Cas parent : premier enfant autorisé d'après les droits déjà résolus
+                eleve_info = get_eleve_context(self.request.user)
+                if eleve_info:
+                    ctx['salutation'] = generer_salutation_eleve(eleve_info['eleve'])
+                    ctx['eleve_info'] = eleve_info
                 else:
                     ctx['salutation'] = "Bonjour, bienvenue sur Mrkarfour."
                     
@@ -584,87 +501,21 @@ class RepetiteurChatView(LoginRequiredMixin, View):
         ctx['niveau_eleve'] = ctx.get('eleve_info', {}).get('niveau', 'secondaire')
         return ctx
 
-    def post(self, request):
+    async def post(self, request):
         """Gère l'interaction avec le répétiteur IA avec contexte de session et historique"""
         try:
             # Vérification d'accès
-            user = request.user
-            if getattr(user, 'type_utilisateur', None) == 'élève':
-                try:
-                    eleve = Eleve.objects.get(user=user)
-                    if not getattr(eleve, 'abonnement_actif', False):
-                        dernier_paiement = Paiement.objects.filter(eleve=eleve, statut=Paiement.STATUT_COMPLET).order_by('-date_paiement').first()
-                        if not dernier_paiement:
-                            return JsonResponse({
-                                "status": "error",
-                                "error": "Accès au répétiteur non autorisé. Vérifiez votre abonnement."
-                            }, status=403)
-                except Eleve.DoesNotExist:
-                    return JsonResponse({
-                        "status": "error",
-                        "error": "Profil élève introuvable."
-                    }, status=403)
-            
-            elif getattr(user, 'type_utilisateur', None) == 'parent':
-                try:
-                    parent = user.parent
-                    if not any(getattr(e, 'abonnement_actif', False) for e in parent.eleves.all()):
-                        return JsonResponse({
-                            "status": "error",
-                            "error": "Aucun enfant avec abonnement actif."
-                        }, status=403)
-                except:
-                    return JsonResponse({
-                        "status": "error",
-                        "error": "Profil parent introuvable."
-                    }, status=403)
-            else:
-                return JsonResponse({
-                    "status": "error",
-                    "error": "Type d'utilisateur non reconnu."
-                }, status=403)
+            erreur_acces = await sync_to_async(verifier_acces_repetiteur)(request.user)
+            if erreur_acces:
+                return JsonResponse({"status": "error", "error": erreur_acces}, status=403)
 
-            # Récupération des informations élève et session
-            eleve_info = self._get_eleve_context(request)
             session_id = request.POST.get('session_id')
-            session_context = None
-            session_obj = None
-            
-            if session_id:
-                try:
-                    session_obj = SessionRevisionProgrammee.objects.get(
-                        id=session_id, 
-                        eleve=request.user.eleve
-                    )
-                    session_context = {
-                        'matiere': session_obj.emploi_temps.matiere,
-                        'objectifs': session_obj.objectifs,
-                        'soumissions': list(session_obj.soumissions.values_list('contenu_texte', flat=True))
-                    }
-                except SessionRevisionProgrammee.DoesNotExist:
-                    pass
-            
-            # Récupérer l'historique récent pour le contexte
-            historique = self._get_historique_recent(
-                request.user, 
-                session_obj, 
-                limit=5  # Derniers 5 échanges
-            )
-            
-            # Construire le contexte avec l'historique
-            contexte_historique = ""
-            if historique:
-                contexte_historique = "CONTEXTE DES ÉCHANGES PRÉCÉDENTS:\n"
-                for i, conv in enumerate(historique, 1):
-                    contexte_historique += f"\nÉchange {i}:\n"
-                    contexte_historique += f"Question: {conv['question']}\n"
-                    contexte_historique += f"Réponse: {conv['reponse']}\n"
-            
+
             # Traitement de la question
             question = ""
             if "audio" in request.FILES:
                 try:
-                    question = transcrire_audio(request.FILES["audio"])
+                    question = await transcrire_audio_async(request.FILES["audio"])
                     if not question or question == "Je n'ai pas compris la question.":
                         return JsonResponse({
                             "status": "error",
@@ -683,76 +534,40 @@ class RepetiteurChatView(LoginRequiredMixin, View):
                         "error": "Veuillez poser une question."
                     }, status=400)
 
-            # Recherche de contenu similaire dans le vectorstore
-            try:
-                contenus_similaires = search_similar_content(question)
-                contexte_pedagogique = {
-                    "contenus_similaires": contenus_similaires,
-                    "nombre_resultats": len(contenus_similaires),
-                    "historique_conversation": contexte_historique
-                }
-                print(f"🔍 Vectorstore: {len(contenus_similaires)} contenus similaires trouvés")
-            except Exception as e:
-                print(f"⚠️ Erreur vectorstore: {e}")
-                contexte_pedagogique = {
-                    "contenus_similaires": [],
-                    "nombre_resultats": 0,
-                    "historique_conversation": contexte_historique
-                }
-
-            # Niveau par défaut si non spécifié
-            niveau_eleve = "secondaire"
-            if eleve_info and 'niveau' in eleve_info:
-                niveau_eleve = eleve_info['niveau']
+            contexte = await sync_to_async(preparer_contexte_question)(request.user, question, session_id)
+            session_obj = contexte['session']
+            niveau_eleve = contexte['niveau_eleve']
 
             # Génération de la réponse IA avec contexte enrichi
             try:
-                reponse_texte = repondre_au_repetiteur(
-                    question=question,
-                    contexte_pedagogique=contexte_pedagogique,
-                    contexte_session=session_context,
-                    niveau_eleve=niveau_eleve,
-                    historique_conversation=contexte_historique
-                )
+                reponse_texte = await repondre_au_repetiteur_async(**contexte['arguments'])
             except Exception as e:
                 print(f"Erreur génération réponse IA: {e}")
                 reponse_texte = f"Je suis MrKarfour. Pour votre question '{question}', je rencontre actuellement un problème technique. Veuillez réessayer dans quelques instants."
 
             # Sauvegarder la conversation dans l'historique
-            self._sauvegarder_conversation(
+            conversation = await sync_to_async(self._sauvegarder_conversation)(
                 utilisateur=request.user,
                 session=session_obj,
                 question=question,
                 reponse=reponse_texte,
-                contexte={
-                    'niveau_eleve': niveau_eleve,
-                    'session_id': session_id,
-                    'contenus_trouves': contexte_pedagogique["nombre_resultats"],
-                    'historique_utilise': len(historique)
-                }
+                contexte=contexte_utilise(contexte, session_id)
             )
 
-            # Génération de la version audio
-            chemin_audio = ""
-            try:
-                chemin_audio = generer_audio(reponse_texte)
-            except Exception as e:
-                print(f"Génération audio échouée: {e}")
+            # Audio : URL immédiate, synthèse éventuellement différée (Celery)
+            audio = await sync_to_async(programmer_audio)(reponse_texte)
 
-            # Récupérer le nouvel historique mis à jour
-            nouvel_historique = self._get_historique_recent(
-                request.user, 
-                session_obj, 
-                limit=10
-            )
+            # Historique du contexte complété par l'échange enregistré, sans nouvelle requête
+            nouvel_historique = contexte['historique'] + [echange_en_dict(conversation)]
 
             return JsonResponse({
                 "status": "success",
                 "question": question,
                 "reponse": reponse_texte,
-                "audio_url": chemin_audio,
+                "audio_url": audio['url'] if audio else "",
+                "audio_pret": bool(audio and audio['pret']),
                 "niveau_adapte": niveau_eleve,
-                "contenus_trouves": contexte_pedagogique["nombre_resultats"],
+                "contenus_trouves": contexte['arguments']['contexte_pedagogique']["nombre_resultats"],
                 "session_active": bool(session_id),
                 "historique_count": len(nouvel_historique),
                 "historique_recent": nouvel_historique[-5:] if len(nouvel_historique) > 5 else nouvel_historique
@@ -787,7 +602,7 @@ class RepetiteurChatSendView(LoginRequiredMixin, View):
         Réponds de façon claire, adaptée au niveau de l'élève.
         """
 
-        response = client.chat.completions.create(
+        response = get_openai_client().chat.completions.create(
             model="gpt-4o-mini",
             messages=[{"role": "user", "content": prompt}]
         )
@@ -805,6 +620,89 @@ class RepetiteurChatSendView(LoginRequiredMixin, View):
 
 
 
+class AudioTTSView(LoginRequiredMixin, View):
+    """
+    Sert un audio TTS du stockage adressé par contenu, avec prise en charge
+    des requêtes Range (lecture progressive et déplacement dans le lecteur).
+    404 tant que la synthèse différée n'est pas terminée.
+    """
+    TAILLE_BLOC = 64 * 1024
+
+    def get(self, request, empreinte):
+        chemin = audio_tts.chemin_audio(empreinte)
+        if not chemin.is_file():
+            raise Http404("Audio indisponible")
+        audio_tts.marquer_utilisation(chemin)
+
+        taille = chemin.stat().st_size
+        plage = self._lire_plage(request.headers.get('Range', ''), taille)
+        if plage is None:
+            response = FileResponse(open(chemin, 'rb'), content_type='audio/mpeg')
+        elif plage is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{taille}'
+            return response
+        else:
+            debut, fin = plage
+            response = StreamingHttpResponse(
+                self._lire_morceaux(chemin, debut, fin), status=206, content_type='audio/mpeg'
+            )
+            response['Content-Length'] = str(fin - debut + 1)
+            response['Content-Range'] = f'bytes {debut}-{fin}/{taille}'
+
+        response['Accept-Ranges'] = 'bytes'
+        # Contenu immuable : l'URL change avec le texte
+        response['Cache-Control'] = 'private, max-age=31536000, immutable'
+        return response
+
+    def head(self, request, empreinte):
+        if not audio_tts.chemin_audio(empreinte).is_file():
+            raise Http404("Audio indisponible")
+        response = HttpResponse(content_type='audio/mpeg')
+        response['Accept-Ranges'] = 'bytes'
+        return response
+
+    @staticmethod
+    def _lire_plage(entete, taille):
+        """(debut, fin) inclusifs, None sans Range exploitable, False si non satisfiable"""
+        if not entete.startswith('bytes=') or ',' in entete:
+            return None
+        debut_txt, _, fin_txt = entete[len('bytes='):].strip().partition('-')
+        try:
+            if debut_txt:
+                debut = int(debut_txt)
+                fin = int(fin_txt) if fin_txt else taille - 1
+            else:
+                # suffixe : les N derniers octets
+                debut = max(taille - int(fin_txt), 0)
+                fin = taille - 1
+        except ValueError:
+            return None
+        fin = min(fin, taille - 1)
+        if debut > fin:
+            return False
+        return debut, fin
+
+    def _lire_morceaux(self, chemin, debut, fin):
+        with open(chemin, 'rb') as fichier:
+            fichier.seek(debut)
+            restant = fin - debut + 1
+            while restant > 0:
+                morceau = fichier.read(min(self.TAILLE_BLOC, restant))
+                if not morceau:
+                    break
+                restant -= len(morceau)
+                yield morceau
+
+
+class MetriquesOpenAIView(LoginRequiredMixin, View):
+    """Métriques du client OpenAI partagé (processus qui sert la requête) : file d'attente, pool, réessais"""
+    def get(self, request):
+        if not request.user.is_superuser:
+            return JsonResponse({'status': 'error', 'message': 'Accès non autorisé'}, status=403)
+        return JsonResponse({'status': 'success', 'metriques': metriques_openai()})
+
+
 class TestRepetiteurView(View):
     """Vue temporaire pour tester le répétiteur IA"""
     template_name = 'repetiteur_ia/test_repetiteur.html'
@@ -891,11 +789,18 @@ class MarquerToutesNotificationsLuesView(LoginRequiredMixin, View):
         return redirect('notifications')
 
 
-class SoumettreCoursView(LoginRequiredMixin, View):
-    """Vue pour soumettre un cours (texte ou fichier) avec génération automatique de quiz"""
+class SoumettreCoursView(AsyncLoginRequiredMixin, View):
+    """
+    Vue pour soumettre un cours (texte ou fichier) avec génération automatique de quiz.
+    La soumission est enregistrée puis traitée en tâche de fond (voir soumissions.py) :
+    la réponse contient un job ID et les URL de suivi (WebSocket et polling).
+    """
     
-    def get(self, request):
+    async def get(self, request):
         """Affiche le formulaire de soumission de cours"""
+        return await sync_to_async(self._afficher_formulaire)(request)
+
+    def _afficher_formulaire(self, request):
         try:
             # Récupérer les sessions disponibles pour l'élève
             sessions = SessionRevisionProgrammee.objects.filter(
@@ -921,93 +826,39 @@ class SoumettreCoursView(LoginRequiredMixin, View):
             messages.error(request, "Erreur lors du chargement du formulaire.")
             return redirect('tableau_sessions')
     
-    def post(self, request):
-        """Traite la soumission du cours"""
+    async def post(self, request):
+        """Enregistre la soumission et programme son traitement IA"""
         try:
-            session_id = request.POST.get('session_id')
-            type_soumission = request.POST.get('type_soumission')
-            matiere = request.POST.get('matiere')
-            matiere_autre = request.POST.get('matiere_autre', '')
-            contenu_texte = request.POST.get('contenu_texte', '')
-            fichier = request.FILES.get('fichier')
             generer_quiz_auto = request.POST.get('generer_quiz_auto') == 'true'
-            
-            eleve = request.user.eleve
-            
-            # Utiliser la matière "autre" si spécifiée
-            if matiere == 'autre' and matiere_autre:
-                matiere = matiere_autre
-            
-            # Créer ou récupérer la session
-            session = None
-            if session_id:
-                try:
-                    session = SessionRevisionProgrammee.objects.get(id=session_id, eleve=eleve)
-                except SessionRevisionProgrammee.DoesNotExist:
-                    pass
-            
-            # Si pas de session, créer une soumission générale
-            if not session:
-                # Trouver ou créer un emploi du temps pour cette matière
-                emploi_temps = self._get_or_create_emploi_temps(eleve, matiere)
-                
-                # Créer une session ad-hoc
-                session = SessionRevisionProgrammee.objects.create(
-                    eleve=eleve,
-                    emploi_temps=emploi_temps,
-                    titre=f"Soumission {matiere}",
-                    date_programmation=timezone.now(),
-                    duree_prevue=30,
-                    objectifs=f"Révision du cours de {matiere}",
-                    statut='en_cours'
-                )
-            
-            # Créer la soumission
-            soumission = SoumissionCours.objects.create(
-                session=session,
-                type_soumission=type_soumission,
-                contenu_texte=contenu_texte,
-                fichier=fichier
+
+            soumission, session, _ = await sync_to_async(self._creer_soumission)(request, generer_quiz_auto)
+            job_id = await sync_to_async(soumissions.lancer_traitement)(soumission)
+            # Broker indisponible : la soumission reste en attente et sera reprise automatiquement
+            message = (
+                'Cours reçu ! MrKarfour est en train de l\'analyser.' if job_id
+                else 'Cours reçu ! Il est en file d\'attente et sera analysé dans quelques minutes.'
             )
             
-            # Traiter la soumission avec IA pour générer un résumé
-            resume_automatique = self._traiter_soumission_ia(soumission)
-            
-            # Générer automatiquement un quiz si demandé
-            quiz_genere = None
-            if generer_quiz_auto:
-                quiz_genere = self._generer_quiz_automatique(soumission, eleve)
-            
-            # Générer la réponse automatique de MrKarfour
-            reponse_mrkarfour = self._generer_reponse_mrkarfour(soumission, resume_automatique, quiz_genere, eleve)
-            
-            # Sauvegarder la réponse dans l'historique des conversations
-            self._sauvegarder_reponse_mrkarfour(request.user, session, reponse_mrkarfour, soumission)
-            
             # Si c'est une requête AJAX, retourner JSON
             if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-                response_data = {
+                return JsonResponse({
                     'status': 'success',
-                    'message': 'Cours soumis avec succès ! MrKarfour va vous aider à le réviser.',
+                    'message': message,
+                    'statut': soumission.statut_traitement,
                     'session_id': session.id,
                     'soumission_id': soumission.id,
-                    'quiz_genere': bool(quiz_genere),
-                    'reponse_mrkarfour': reponse_mrkarfour,
-                    'resume_automatique': resume_automatique
-                }
-                
-                # Ajouter les infos du quiz si généré
-                if quiz_genere:
-                    response_data.update({
-                        'quiz_id': quiz_genere.id,
-                        'quiz_titre': quiz_genere.titre,
-                        'quiz_url': reverse('cours:quiz_detail', kwargs={'pk': quiz_genere.id})
-                    })
-                
-                return JsonResponse(response_data)
+                    'job_id': job_id,
+                    'quiz_demande': generer_quiz_auto,
+                    'statut_url': reverse('statut_soumission', kwargs={'pk': soumission.id}),
+                    'ws_url': f"/ws/repetiteur/soumissions/{soumission.id}/",
+                }, status=202)
             else:
-                # Si c'est une soumission normale, rediriger vers le chat avec la session
-                messages.success(request, 'Cours soumis avec succès ! MrKarfour a analysé votre contenu.')
+                # La réponse de MrKarfour arrivera dans l'historique du chat
+                messages.success(
+                    request,
+                    'Cours soumis avec succès ! MrKarfour analyse votre contenu.' if job_id
+                    else 'Cours soumis avec succès ! Il est en file d\'attente et sera analysé dans quelques minutes.'
+                )
                 return redirect(f"{reverse('repetiteur_ia')}?session={session.id}")
             
         except Exception as e:
@@ -1022,6 +873,54 @@ class SoumettreCoursView(LoginRequiredMixin, View):
                 messages.error(request, 'Erreur lors de la soumission du cours.')
                 return redirect('soumettre_cours')
 
+    def _creer_soumission(self, request, generer_quiz_auto=False):
+        """Crée (ou rattache) la session et enregistre la soumission"""
+        session_id = request.POST.get('session_id')
+        type_soumission = request.POST.get('type_soumission')
+        matiere = request.POST.get('matiere')
+        matiere_autre = request.POST.get('matiere_autre', '')
+        contenu_texte = request.POST.get('contenu_texte', '')
+        fichier = request.FILES.get('fichier')
+
+        eleve = Eleve.objects.select_related('user').get(user=request.user)
+
+        # Utiliser la matière "autre" si spécifiée
+        if matiere == 'autre' and matiere_autre:
+            matiere = matiere_autre
+
+        # Créer ou récupérer la session
+        session = None
+        if session_id:
+            session = SessionRevisionProgrammee.objects.select_related('emploi_temps').filter(
+                id=session_id, eleve=eleve
+            ).first()
+
+        # Si pas de session, créer une soumission générale
+        if not session:
+            # Trouver ou créer un emploi du temps pour cette matière
+            emploi_temps = self._get_or_create_emploi_temps(eleve, matiere)
+
+            # Créer une session ad-hoc
+            session = SessionRevisionProgrammee.objects.create(
+                eleve=eleve,
+                emploi_temps=emploi_temps,
+                titre=f"Soumission {matiere}",
+                date_programmation=timezone.now(),
+                duree_prevue=30,
+                objectifs=f"Révision du cours de {matiere}",
+                statut='en_cours'
+            )
+
+        # Créer la soumission
+        soumission = SoumissionCours.objects.create(
+            session=session,
+            type_soumission=type_soumission,
+            contenu_texte=contenu_texte,
+            fichier=fichier,
+            quiz_demande=generer_quiz_auto,
+        )
+        return soumission, session, eleve
+
     def _get_or_create_emploi_temps(self, eleve, matiere):
         """Trouve ou crée un emploi du temps pour l'élève et la matière"""
         try:
@@ -1073,190 +972,16 @@ class SoumettreCoursView(LoginRequiredMixin, View):
                 actif=True
             )
 
-    def _traiter_soumission_ia(self, soumission):
-        """Utilise l'IA pour analyser la soumission et générer un résumé"""
-        try:
-            contenu = ""
-            if soumission.type_soumission == 'texte':
-                contenu = soumission.contenu_texte
-            elif soumission.type_soumission == 'fichier' and soumission.fichier:
-                # Pour l'instant, on utilise juste le nom du fichier
-                contenu = f"Fichier soumis: {soumission.fichier.name}"
-            
-            if not contenu:
-                return "Aucun contenu à analyser."
-            
-            # Générer le résumé avec l'IA
-            prompt = f"""
-            En tant qu'assistant pédagogique MrKarfour, analyse ce contenu de cours et génère un résumé structuré :
-            
-            CONTENU À ANALYSER:
-            {contenu[:4000]}
-            
-            STRUCTURE TA RÉPONSE AVEC:
-            1. 📝 **Points clés** (les concepts les plus importants)
-            2. 🎯 **Objectifs d'apprentissage** (ce que l'élève devrait maîtriser)
-            3. 💡 **Conseils de révision** (méthodes pour bien retenir)
-            4. ❓ **Questions de réflexion** (pour tester la compréhension)
-            
-            Sois encourageant et pédagogique !
-            """
-            
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=1000,
-                temperature=0.7
-            )
-            
-            resume = response.choices[0].message.content.strip()
-            soumission.resume_automatique = resume
-            soumission.save()
-            
-            return resume
-            
-        except Exception as e:
-            print(f"Erreur traitement IA soumission: {e}")
-            resume_erreur = "Je vais analyser votre contenu et vous proposer des exercices adaptés. En attendant, n'hésitez pas à me poser des questions sur ce cours !"
-            soumission.resume_automatique = resume_erreur
-            soumission.save()
-            return resume_erreur
-
-    def _generer_reponse_mrkarfour(self, soumission, resume_automatique, quiz_genere, eleve):
-        """Génère une réponse personnalisée de MrKarfour après soumission"""
-        try:
-            nom_eleve = eleve.user.first_name or eleve.user.username
-            matiere = soumission.session.emploi_temps.matiere if soumission.session.emploi_temps else "cette matière"
-            
-            prompt = f"""
-            Tu es MrKarfour, un répétiteur pédagogique bienveillant et encourageant.
-            
-            CONTEXTE:
-            - Élève: {nom_eleve}
-            - Matière: {matiere}
-            - Type de soumission: {soumission.type_soumission}
-            - Quiz généré: {"Oui" if quiz_genere else "Non"}
-            
-            RÉSUMÉ GÉNÉRÉ:
-            {resume_automatique[:1000]}
-            
-            TÂCHE:
-            Écris une réponse chaleureuse et motivante pour accueillir la soumission de l'élève.
-            
-            TON MESSAGE DOIT:
-            1. 🎉 Féliciter l'élève pour sa démarche proactive
-            2. 📚 Résumer brièvement ce que tu as compris du contenu
-            3. 🎯 Proposer des pistes de révision ou des questions à explorer
-            4. 💬 Inviter l'élève à interagir avec toi
-            5. 🔍 Mentionner le quiz si il a été généré
-            
-            Sois naturel, amical et pédagogique. Utilise des émojis avec modération.
-            """
-            
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=800,
-                temperature=0.8
-            )
-            
-            return response.choices[0].message.content.strip()
-            
-        except Exception as e:
-            print(f"Erreur génération réponse MrKarfour: {e}")
-            return f"🎉 Bravo {eleve.user.first_name or 'cher élève'} ! J'ai bien reçu ton cours de {soumission.session.emploi_temps.matiere if soumission.session.emploi_temps else 'cette matière'}. Je suis là pour t'aider à le réviser et répondre à toutes tes questions. N'hésite pas à me demander des explications ou des exercices ! 📚✨"
-
-    def _sauvegarder_reponse_mrkarfour(self, utilisateur, session, reponse, soumission):
-        """Sauvegarde la réponse de MrKarfour dans l'historique des conversations"""
-        try:
-            from .models import HistoriqueConversation
-            
-            HistoriqueConversation.objects.create(
-                utilisateur=utilisateur,
-                session=session,
-                type_conversation='soumission_cours',
-                question=f"Soumission de cours: {soumission.type_soumission}",
-                reponse=reponse,
-                contexte_utilise={
-                    'soumission_id': soumission.id,
-                    'matiere': session.emploi_temps.matiere if session.emploi_temps else 'Non spécifiée',
-                    'type_soumission': soumission.type_soumission,
-                    'timestamp': timezone.now().isoformat()
-                }
-            )
-        except Exception as e:
-            print(f"Erreur sauvegarde historique MrKarfour: {e}")
-
-    def _generer_quiz_automatique(self, soumission, eleve):
-        """Génère automatiquement un quiz à partir de la soumission"""
-        try:
-            from cours.models import Quiz
-            from repetiteur_ia.utils import generer_quiz_ia
-            
-            # Créer un objet cours temporaire pour la génération
-            class CoursTemp:
-                def __init__(self, titre, matiere, contenu):
-                    self.titre = titre
-                    self.matiere = matiere
-                    self.contenu = contenu
-            
-            # Déterminer le titre et la matière du cours
-            titre = f"Quiz - {soumission.titre or 'Révision'}"
-            matiere = soumission.matiere or 'Général'
-            contenu = soumission.contenu_texte or str(soumission.fichier.name) if soumission.fichier else ''
-            
-            cours_temp = CoursTemp(titre, matiere, contenu)
-            
-            # Générer les questions avec l'IA
-            questions_ia = generer_quiz_ia(cours_temp)
-            
-            if not questions_ia:
-                print("❌ Aucune question générée par l'IA")
-                return None
-            
-            # Créer le quiz
-            quiz = Quiz.objects.create(
-                titre=titre,
-                description=f"Quiz généré automatiquement à partir de la soumission: {soumission.titre}",
-                matiere=matiere,
-                created_by=eleve.user,
-                duree_minutes=15,  # Durée par défaut
-                est_actif=True
-            )
-            
-            # Ajouter les questions au quiz
-            from cours.models import Question
-            for i, q_data in enumerate(questions_ia):
-                if isinstance(q_data, dict) and 'question' in q_data and 'options' in q_data:
-                    question = Question.objects.create(
-                        quiz=quiz,
-                        texte=q_data['question'],
-                        ordre=i + 1,
-                        type_question='qcm'
-                    )
-                    
-                    # Ajouter les options
-                    for j, option_text in enumerate(q_data['options']):
-                        from cours.models import Option
-                        Option.objects.create(
-                            question=question,
-                            texte=option_text,
-                            est_correcte=(option_text == q_data.get('reponse_correcte')),
-                            ordre=j + 1
-                        )
-            
-            # Associer le quiz à la soumission
-            soumission.quiz_associe = quiz
-            soumission.save()
-            
-            print(f"✅ Quiz généré avec succès: {quiz.titre} ({quiz.questions.count()} questions)")
-            return quiz
-            
-        except Exception as e:
-            print(f"❌ Erreur génération quiz automatique: {e}")
-            return None
 
+class StatutSoumissionView(LoginRequiredMixin, View):
+    """État du traitement IA d'une soumission, pour le polling côté navigateur"""
 
+    def get(self, request, pk):
+        soumission = get_object_or_404(
+            SoumissionCours.objects.select_related('quiz_associe'),
+            pk=pk, session__eleve__user=request.user
+        )
+        return JsonResponse(soumissions.etat_traitement(soumission))
 
 
 class DemarrerSessionView(LoginRequiredMixin, View):
@@ -1457,77 +1182,16 @@ class TableauSessionsView(LoginRequiredMixin, ListView):
     
 
 
+@method_decorator(acces_repetiteur_requis, name='dispatch')
 class GestionEmploiDuTempsView(LoginRequiredMixin, ListView):
     model = EmploiDuTemps
     template_name = 'gestionnaire/emploi_du_temps.html'
     context_object_name = 'emplois'
 
-    def dispatch(self, request, *args, **kwargs):
-        user = request.user
-
-        # Vérification d'accès pour les élèves
-        if getattr(user, 'type_utilisateur', None) == 'élève':
-            try:
-                eleve = Eleve.objects.get(user=user)
-                paiement_actif = (
-                    Paiement.objects.filter(eleve=eleve, statut=Paiement.STATUT_COMPLET)
-                    .order_by('-date_paiement')
-                    .first()
-                )
-
-                abonnement_valide = (
-                    paiement_actif and
-                    paiement_actif.date_debut_abonnement <= timezone.now().date() <= paiement_actif.date_fin_abonnement
-                )
-
-                if not abonnement_valide:
-                    messages.warning(request, "Votre abonnement est expiré ou inactif. Veuillez souscrire pour accéder à votre emploi du temps.")
-                    return redirect('abonnements')
-
-            except Eleve.DoesNotExist:
-                messages.error(request, "Profil élève introuvable.")
-                return redirect('profil')
-
-        # Vérification pour les parents
-        elif getattr(user, 'type_utilisateur', None) == 'parent':
-            try:
-                parent = Parent.objects.get(user=user)
-                enfants = parent.eleves.all()
-
-                abonnement_valide = any(
-                    Paiement.objects.filter(
-                        eleve=e, statut=Paiement.STATUT_COMPLET,
-                        date_debut_abonnement__lte=timezone.now().date(),
-                        date_fin_abonnement__gte=timezone.now().date()
-                    ).exists()
-                    for e in enfants
-                )
-
-                if not abonnement_valide:
-                    messages.warning(request, "Aucun enfant avec abonnement actif. Veuillez souscrire pour accéder à l'emploi du temps.")
-                    return redirect('abonnements')
-
-            except Parent.DoesNotExist:
-                messages.error(request, "Profil parent introuvable.")
-                return redirect('profil')
-
-        return super().dispatch(request, *args, **kwargs)
-
     def get_queryset(self):
-        user = self.request.user
-        if getattr(user, 'type_utilisateur', None) == 'parent':
-            try:
-                parent = Parent.objects.get(user=user)
-                enfants = parent.eleves.all()
-                return EmploiDuTemps.objects.filter(eleve__in=enfants).order_by('jour_semaine', 'heure_debut')
-            except Parent.DoesNotExist:
-                return EmploiDuTemps.objects.none()
-        else:
-            try:
-                eleve = Eleve.objects.get(user=user)
-                return EmploiDuTemps.objects.filter(eleve=eleve).order_by('jour_semaine', 'heure_debut')
-            except Eleve.DoesNotExist:
-                return EmploiDuTemps.objects.none()
+        # Élèves rattachés (l'élève lui-même ou les enfants du parent), déjà résolus par les droits
+        eleves_ids = droits_repetiteur(self.request.user).eleves_ids
+        return EmploiDuTemps.objects.filter(eleve_id__in=eleves_ids).order_by('jour_semaine', 'heure_debut')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -1720,6 +1384,7 @@ class a_proposView(TemplateView):
         context = super().get_context_data(**kwargs)
         return context
 
+@method_decorator(acces_repetiteur_requis, name='dispatch')
 class contactView(TemplateView):
     template_name = 'contact.html'
     def get_context_data(self, **kwargs):
@@ -1729,54 +1394,15 @@ class contactView(TemplateView):
 
     template_name = 'repetiteur_ia/chat.html'
 
-    def dispatch(self, request, *args, **kwargs):
-        user = request.user
-
-        # élève avec abonnement actif
-        if getattr(user, 'type_utilisateur', None) == 'élève':
-            try:
-                eleve = Eleve.objects.get(user=user)
-                if getattr(eleve, 'abonnement_actif', False):
-                    return super().dispatch(request, *args, **kwargs)
-                # fallback : vérifier paiements réussis récents
-                dernier_paiement = Paiement.objects.filter(eleve=eleve, statut=Paiement.STATUT_COMPLET).order_by('-date_paiement').first()
-                if dernier_paiement:
-                    return super().dispatch(request, *args, **kwargs)
-                messages.info(request, "Souscrivez pour accéder au répétiteur IA.")
-                return redirect('abonnements')
-            except Eleve.DoesNotExist:
-                messages.error(request, "Profil élève introuvable.")
-                return redirect('profil')
-
-        # parent : si au moins un enfant actif -> ok
-        if getattr(user, 'type_utilisateur', None) == 'parent':
-            try:
-                parent = user.parent
-                enfants = parent.eleves.all()
-                if any(getattr(e, 'abonnement_actif', False) for e in enfants):
-                    return super().dispatch(request, *args, **kwargs)
-            except:
-                pass
-            messages.info(request, "Aucun enfant avec abonnement actif.")
-            return redirect('profil')
-
-        messages.error(request, "Accès non autorisé.")
-        return redirect('accueil')
-
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
         # tenter salutation (pour élève ou premier enfant actif du parent)
         try:
-            if getattr(self.request.user, 'type_utilisateur', None) == 'élève':
-                eleve = Eleve.objects.get(user=self.request.user)
-                ctx['salutation'] = generer_salutation_eleve(eleve)
+            eleve_info = get_eleve_context(self.request.user)
+            if eleve_info:
+                ctx['salutation'] = generer_salutation_eleve(eleve_info['eleve'])
             else:
-                parent = self.request.user.parent
-                actif = next((e for e in parent.eleves.all() if getattr(e, 'abonnement_actif', False)), None)
-                if actif:
-                    ctx['salutation'] = generer_salutation_eleve(actif)
-                else:
-                    ctx['salutation'] = "Bonjour, bienvenue sur Mrkarfour."
+                ctx['salutation'] = "Bonjour, bienvenue sur Mrkarfour."
         except Exception:
             ctx['salutation'] = "Bonjour, bienvenue sur Mrkarfour."
         return ctx
\ No newline at end of file
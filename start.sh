@@ -79,9 +79,17 @@ END
 # =========================
 echo "🚀 Démarrage de Gunicorn sur $HOST:$PORT..."
 # Note : --keep-alive est le bon argument
-exec gunicorn mykarfour_app.wsgi:application \
+# EMBEDDING_PRELOAD=true : modèle chargé dans le master puis partagé par les workers
+PRELOAD_ARGS=""
+if [ "${EMBEDDING_PRELOAD:-false}" = "true" ]; then
+    PRELOAD_ARGS="--preload"
+fi
+# Application ASGI (workers uvicorn) : sert aussi les WebSockets du chat streamé
+exec gunicorn mykarfour_app.asgi:application \
+    --worker-class uvicorn.workers.UvicornWorker \
     --bind "$HOST:$PORT" \
     --workers $WORKERS \
+    $PRELOAD_ARGS \
     --timeout 120 \
     --keep-alive 5 \
     --access-logfile - \
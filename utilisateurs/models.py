@@ -130,26 +130,24 @@ class Eleve(models.Model):
     def get_quiz_completed_count(self):
         """Retourne le nombre de quiz complétés"""
         try:
-            from cours.models import QuizAttempt
-            return QuizAttempt.objects.filter(eleve=self, statut='termine').count()
+            from cours.models import EleveStats
+            return EleveStats.pour(self).quiz_termines
         except (ImportError, Exception):
             return 0
     
     def get_average_quiz_score(self):
         """Retourne la moyenne des scores aux quiz"""
         try:
-            from cours.models import QuizAttempt
-            avg = QuizAttempt.objects.filter(eleve=self, statut='termine').aggregate(Avg('score'))['score__avg']
-            return round(avg, 2) if avg else 0
+            from cours.models import EleveStats
+            return EleveStats.pour(self).score_moyen
         except (ImportError, Exception):
             return 0
     
     def get_total_quiz_points(self):
         """Retourne le total des points obtenus"""
         try:
-            from cours.models import QuizAttempt
-            from django.db.models import Sum
-            return QuizAttempt.objects.filter(eleve=self, statut='termine').aggregate(Sum('points_obtenus'))['points_obtenus__sum'] or 0
+            from cours.models import EleveStats
+            return EleveStats.pour(self).points_total
         except (ImportError, Exception):
             return 0
     
@@ -0,0 +1,190 @@
+"""
+Rapport de suivi des enfants d'un parent (profil parent, tableau de bord parent).
+
+Toutes les métriques par enfant (moyennes, compteurs, activité récente,
+bilan de la semaine) sont calculées en un nombre fixe de requêtes groupées
+par élève, quel que soit le nombre d'enfants : la liste des enfants, un
+agrégat par table (Evaluation, QuizAttempt, CoursCoursEleves), les dernières
+évaluations et les derniers quiz de chaque enfant (ROW_NUMBER par élève) et
+le nombre de rappels envoyés.
+"""
+from datetime import timedelta
+
+from django.db.models import Avg, Count, F, Max, Q, Sum, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from cours.models import CoursCoursEleves, Evaluation, QuizAttempt
+from repetiteur_ia.models import RappelRevision
+
+SCORE_REUSSITE = 70
+ACTIVITES_PAR_ENFANT = 3
+
+
+def _par_eleve(requete):
+    return {ligne['eleve_id']: ligne for ligne in requete}
+
+
+def _derniers_par_eleve(requete, champ_date, limite):
+    """Les `limite` lignes les plus récentes de chaque élève, en une requête"""
+    rang = Window(
+        RowNumber(),
+        partition_by=[F('eleve_id')],
+        order_by=[F(champ_date).desc(), F('id').desc()],
+    )
+    lignes = {}
+    for objet in requete.annotate(rang=rang).filter(rang__lte=limite).order_by('eleve_id', 'rang'):
+        lignes.setdefault(objet.eleve_id, []).append(objet)
+    return lignes
+
+
+def _arrondi(valeur, chiffres=1):
+    return round(valeur, chiffres) if valeur else 0
+
+
+def rapport_parent(parent, jours=7, recents=5):
+    """
+    Métriques de suivi de tous les enfants du parent :
+    {'enfants', 'enfants_data', 'stats', 'activites', 'rapport_hebdo',
+    'evaluations_recentes', 'quiz_recents'}
+    """
+    maintenant = timezone.now()
+    debut_semaine = maintenant - timedelta(days=jours)
+
+    enfants = list(parent.eleves.select_related('user').order_by('id'))
+    ids = [eleve.id for eleve in enfants]
+
+    if ids:
+        evaluations = _par_eleve(
+            Evaluation.objects.filter(eleve_id__in=ids)
+            .values('eleve_id')
+            .annotate(
+                total=Count('id'),
+                somme=Sum('note'),
+                moyenne=Avg('note'),
+                semaine=Count('id', filter=Q(date_creation__gte=debut_semaine)),
+                meilleure_semaine=Max('note', filter=Q(date_creation__gte=debut_semaine)),
+            )
+        )
+        quiz = _par_eleve(
+            QuizAttempt.objects.filter(eleve_id__in=ids, statut='termine')
+            .values('eleve_id')
+            .annotate(
+                total=Count('id'),
+                reussis=Count('id', filter=Q(score__gte=SCORE_REUSSITE)),
+                semaine=Count('id', filter=Q(date_debut__gte=debut_semaine)),
+                moyenne_semaine=Avg('score', filter=Q(date_debut__gte=debut_semaine)),
+                duree_semaine=Sum('duree_secondes', filter=Q(date_debut__gte=debut_semaine)),
+            )
+        )
+        cours = _par_eleve(
+            CoursCoursEleves.objects.filter(eleve_id__in=ids)
+            .values('eleve_id')
+            .annotate(total=Count('id'))
+        )
+        dernieres_evaluations = _derniers_par_eleve(
+            Evaluation.objects.filter(eleve_id__in=ids).select_related('cours'),
+            'date_creation', recents,
+        )
+        derniers_quiz = _derniers_par_eleve(
+            QuizAttempt.objects.filter(eleve_id__in=ids, statut='termine').select_related('quiz'),
+            'date_debut', recents,
+        )
+        rappels_total = RappelRevision.objects.filter(eleve_id__in=ids, envoye=True).count()
+    else:
+        evaluations = quiz = cours = dernieres_evaluations = derniers_quiz = {}
+        rappels_total = 0
+
+    enfants_data = []
+    rapport_enfants = []
+    activites = []
+    for eleve in enfants:
+        ev = evaluations.get(eleve.id, {})
+        qz = quiz.get(eleve.id, {})
+        evaluations_recentes = dernieres_evaluations.get(eleve.id, [])
+        quiz_recents = derniers_quiz.get(eleve.id, [])
+
+        # Les objets chargés portent l'élève déjà en mémoire (nom complet sans requête)
+        for objet in evaluations_recentes + quiz_recents:
+            objet.eleve = eleve
+
+        enfants_data.append({
+            'eleve': eleve,
+            'evaluations_count': ev.get('total', 0),
+            'quiz_count': qz.get('total', 0),
+            'cours_count': cours.get(eleve.id, {}).get('total', 0),
+            'moyenne': _arrondi(ev.get('moyenne')),
+            'quiz_reussis': qz.get('reussis', 0),
+            'derniere_evaluation': evaluations_recentes[0] if evaluations_recentes else None,
+            'dernier_quiz': quiz_recents[0] if quiz_recents else None,
+            'evaluations_recentes': evaluations_recentes,
+            'quiz_recents': quiz_recents,
+        })
+
+        duree = qz.get('duree_semaine') or 0
+        rapport_enfants.append({
+            'eleve': eleve,
+            'evaluations_count': ev.get('semaine', 0),
+            'quiz_count': qz.get('semaine', 0),
+            'heures_etude': round(duree / 3600, 1) if duree else 0,
+            'meilleure_note': ev.get('meilleure_semaine'),
+            'quiz_moyen': qz.get('moyenne_semaine'),
+        })
+
+        # Activité de la semaine : les plus récentes de chaque enfant
+        nom = eleve.user.get_full_name()
+        for evaluation in [e for e in evaluations_recentes if e.date_creation >= debut_semaine][:ACTIVITES_PAR_ENFANT]:
+            activites.append({
+                'type': 'evaluation',
+                'date': evaluation.date_creation,
+                'eleve': eleve,
+                'titre': f"Nouvelle évaluation: {evaluation.cours.titre}",
+                'description': f"{nom} a reçu {evaluation.note}/5",
+                'note': evaluation.note,
+            })
+        for tentative in [q for q in quiz_recents if q.date_debut >= debut_semaine][:ACTIVITES_PAR_ENFANT]:
+            activites.append({
+                'type': 'quiz',
+                'date': tentative.date_debut,
+                'eleve': eleve,
+                'titre': f"Quiz réalisé: {tentative.quiz.titre}",
+                'description': f"{nom} a obtenu {tentative.score}%",
+                'score': tentative.score,
+            })
+
+    total_evaluations = sum(ligne['total'] for ligne in evaluations.values())
+    somme_notes = sum(ligne['somme'] or 0 for ligne in evaluations.values())
+    total_quiz = sum(ligne['total'] for ligne in quiz.values())
+    quiz_reussis = sum(ligne['reussis'] for ligne in quiz.values())
+
+    stats = {
+        'total_enfants': len(enfants),
+        'moyenne_generale': _arrondi(somme_notes / total_evaluations if total_evaluations else 0),
+        'total_evaluations': total_evaluations,
+        'total_quiz': total_quiz,
+        'total_cours': sum(ligne['total'] for ligne in cours.values()),
+        'quiz_reussis': quiz_reussis,
+        'taux_reussite': _arrondi(quiz_reussis / total_quiz * 100 if total_quiz else 0),
+        'rappels_total': rappels_total,
+    }
+
+    activites.sort(key=lambda activite: activite['date'], reverse=True)
+
+    return {
+        'enfants': enfants,
+        'enfants_data': enfants_data,
+        'stats': stats,
+        'activites': activites[:10],
+        'rapport_hebdo': {
+            'periode': f"Du {debut_semaine.strftime('%d/%m/%Y')} au {maintenant.strftime('%d/%m/%Y')}",
+            'enfants': rapport_enfants,
+        },
+        'evaluations_recentes': sorted(
+            (e for data in enfants_data for e in data['evaluations_recentes']),
+            key=lambda e: e.date_creation, reverse=True,
+        )[:10],
+        'quiz_recents': sorted(
+            (q for data in enfants_data for q in data['quiz_recents']),
+            key=lambda q: q.date_debut, reverse=True,
+        )[:10],
+    }
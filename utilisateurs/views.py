@@ -6,6 +6,8 @@ from django.urls import reverse_lazy
 from django.shortcuts import redirect, render, get_object_or_404
 from django.http import JsonResponse, HttpResponseForbidden
 from django.views.decorators.http import require_GET
+from django.views.decorators.cache import cache_control
+from django.views.decorators.vary import vary_on_cookie
 from django.utils.decorators import method_decorator
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
@@ -17,8 +19,9 @@ from django.utils import timezone
 from django.db.models import Avg, Sum, Max, Min, Count
 
 from cours.models import CoursCoursEleves, Evaluation, QuizAttempt, Cours, Quiz
+from cours.statistiques import attacher_statistiques, statistiques_professeur
 from utilisateurs.models import Utilisateur, Eleve, Parent, Professeur
-from repetiteur_ia.models import RappelRevision
+from utilisateurs.rapports import rapport_parent
 from utilisateurs.forms import InscriptionForm, ConnexionForm, EleveProfilForm, ParentProfilForm, ProfesseurProfilForm, LienParentEleveForm, ParentNotificationsForm
 
 
@@ -163,67 +166,19 @@ class ProfilView(LoginRequiredMixin, View):
                 form = form or ParentProfilForm(instance=profil)
                 lien_form = lien_form or LienParentEleveForm(parent=profil)
                 notifications_form = notifications_form or ParentNotificationsForm(instance=profil)
-                enfants = profil.eleves.all()
-                
-                # Récupérer les données de suivi des enfants
-                enfants_data = []
-                for eleve in enfants:
-                    # Évaluations de l'élève
-                    evaluations = Evaluation.objects.filter(eleve=eleve).select_related('cours')
-                    
-                    # Tous les quiz réalisés (pour les statistiques)
-                    quiz_total = QuizAttempt.objects.filter(
-                        eleve=eleve, 
-                        statut='termine'
-                    )
-                    
-                    # Quiz réussis (score >= 70)
-                    quiz_reussis_count = quiz_total.filter(score__gte=70).count()
-                    
-                    # Quiz récents pour l'affichage (5 derniers)
-                    quiz_recents = quiz_total.select_related('quiz').order_by('-date_debut')[:5]
-                    
-                    # Cours suivis
-                    cours_suivis = CoursCoursEleves.objects.filter(eleve=eleve).select_related('cours')
-                    
-                    # Moyenne générale
-                    moyenne = evaluations.aggregate(avg_note=Avg('note'))['avg_note'] if evaluations.exists() else 0
-                    
-                    # Dernière activité
-                    derniere_evaluation = evaluations.order_by('-date_creation').first()
-                    dernier_quiz = quiz_total.order_by('-date_debut').first()
-                    
-                    enfants_data.append({
-                        'eleve': eleve,
-                        'evaluations_count': evaluations.count(),
-                        'quiz_count': quiz_total.count(),  # Total des quiz
-                        'cours_count': cours_suivis.count(),
-                        'moyenne': round(moyenne, 1) if moyenne else 0,
-                        'derniere_evaluation': derniere_evaluation,
-                        'dernier_quiz': dernier_quiz,
-                        'quiz_reussis': quiz_reussis_count,
-                        'quiz_recents': list(quiz_recents),  # Convertir en liste pour éviter les problèmes de queryset
-                    })
-                
-                # Statistiques globales
-                stats_parent = self._calculer_statistiques_parent(profil)
-                
-                # Dernières activités (évaluations et quiz récents)
-                dernieres_activites = self._get_dernieres_activites_parent(profil)
-                
-                # Rapport hebdomadaire
-                rapport_hebdo = self._get_rapport_hebdomadaire_parent(profil)
+                # Suivi des enfants : nombre de requêtes constant quel que soit le nombre d'enfants
+                rapport = rapport_parent(profil)
                 
                 context.update({
                     'profil': profil,
                     'form': form,
                     'lien_form': lien_form,
                     'notifications_form': notifications_form,
-                    'enfants': enfants,
-                    'enfants_data': enfants_data,
-                    'stats_parent': stats_parent,
-                    'dernieres_activites': dernieres_activites,
-                    'rapport_hebdo': rapport_hebdo,
+                    'enfants': rapport['enfants'],
+                    'enfants_data': rapport['enfants_data'],
+                    'stats_parent': rapport['stats'],
+                    'dernieres_activites': rapport['activites'],
+                    'rapport_hebdo': rapport['rapport_hebdo'],
                 })
             
             elif user.type_utilisateur == 'professeur':
@@ -231,17 +186,18 @@ class ProfilView(LoginRequiredMixin, View):
                 form = form or ProfesseurProfilForm(instance=profil)
                 
                 # RÉCUPÉRATION DES COURS RÉELS DU PROFESSEUR
-                cours_professeur = Cours.objects.filter(professeur=profil).order_by('-date_creation')
+                cours_professeur = list(Cours.objects.filter(professeur=profil).order_by('-date_creation'))
                 
-                # CALCUL DES STATISTIQUES RÉELLES
-                stats = self._calculer_statistiques_professeur(profil, cours_professeur)
+                # STATISTIQUES PAR COURS ET TOTAUX (requêtes groupées, en cache)
+                statistiques = statistiques_professeur(profil)
+                attacher_statistiques(cours_professeur, statistiques['cours'])
                 
                 context.update({
                     'form': form,
                     'profil': profil,
-                    'stats': stats,
+                    'stats': statistiques['totaux'],
                     'cours_professeur': cours_professeur,
-                    'cours_count': cours_professeur.count()
+                    'cours_count': len(cours_professeur)
                 })
 
         except (Eleve.DoesNotExist, Parent.DoesNotExist, Professeur.DoesNotExist):
@@ -263,179 +219,6 @@ class ProfilView(LoginRequiredMixin, View):
 
         return context
 
-    def _calculer_statistiques_professeur(self, professeur, cours_professeur):
-        """
-        Calcule les statistiques réelles du professeur
-        """
-        from django.db.models import Avg
-        
-        # Nombre de cours actifs
-        cours_actifs = cours_professeur.count()
-        
-        # Nombre total d'élèves inscrits à tous les cours
-        total_eleves = 0
-        for cours in cours_professeur:
-            total_eleves += CoursCoursEleves.objects.filter(cours=cours).count()
-        
-        # Sessions ce mois (approximation basée sur les cours)
-        debut_mois = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        sessions_mois = cours_professeur.filter(date_creation__gte=debut_mois).count()
-        
-        # Note moyenne (basée sur les évaluations données par le professeur)
-        try:
-            evaluations = Evaluation.objects.filter(cours__professeur=professeur)
-            if evaluations.exists():
-                note_moyenne = round(evaluations.aggregate(avg_note=Avg('note'))['avg_note'] or 0, 1)
-            else:
-                note_moyenne = "0.0"
-        except Exception as e:
-            print(f"Erreur calcul note moyenne: {e}")
-            note_moyenne = "0.0"
-        
-        return {
-            'cours_actifs': cours_actifs,
-            'eleves_total': total_eleves,
-            'sessions_mois': sessions_mois,
-            'note_moyenne': note_moyenne
-        }
-    
-    def _calculer_statistiques_parent(self, parent):
-        """
-        Calcule les statistiques pour le parent
-        """
-        enfants = parent.eleves.all()
-        
-        if not enfants.exists():
-            return {
-                'total_enfants': 0,
-                'moyenne_generale': 0,
-                'total_evaluations': 0,
-                'total_quiz': 0,
-                'total_cours': 0,
-                'quiz_reussis': 0,
-                'taux_reussite': 0,
-            }
-        
-        # Récupérer toutes les évaluations des enfants
-        evaluations = Evaluation.objects.filter(eleve__in=enfants)
-        
-        # Récupérer tous les quiz des enfants
-        quiz_attempts = QuizAttempt.objects.filter(eleve__in=enfants, statut='termine')
-        
-        # Cours suivis par les enfants
-        cours_suivis = CoursCoursEleves.objects.filter(eleve__in=enfants)
-        
-        # Moyenne générale de tous les enfants
-        moyenne_generale = evaluations.aggregate(avg=Avg('note'))['avg'] or 0
-        
-        # Taux de réussite aux quiz
-        quiz_reussis = quiz_attempts.filter(score__gte=70).count()
-        taux_reussite = (quiz_reussis / quiz_attempts.count() * 100) if quiz_attempts.count() > 0 else 0
-        
-        return {
-            'total_enfants': enfants.count(),
-            'moyenne_generale': round(moyenne_generale, 1),
-            'total_evaluations': evaluations.count(),
-            'total_quiz': quiz_attempts.count(),
-            'total_cours': cours_suivis.count(),
-            'quiz_reussis': quiz_reussis,
-            'taux_reussite': round(taux_reussite, 1),
-        }
-    
-    def _get_dernieres_activites_parent(self, parent):
-        """
-        Récupère les dernières activités de tous les enfants du parent
-        """
-        from datetime import timedelta
-        
-        derniere_semaine = timezone.now() - timedelta(days=7)
-        activites = []
-        
-        for eleve in parent.eleves.all():
-            # Évaluations récentes
-            evaluations = Evaluation.objects.filter(
-                eleve=eleve,
-                date_creation__gte=derniere_semaine
-            ).select_related('cours')[:3]
-            
-            for eval in evaluations:
-                activites.append({
-                    'type': 'evaluation',
-                    'date': eval.date_creation,
-                    'eleve': eleve,
-                    'titre': f"Nouvelle évaluation: {eval.cours.titre}",
-                    'description': f"{eval.eleve.user.get_full_name()} a reçu {eval.note}/5",
-                    'note': eval.note,
-                })
-            
-            # Quiz récents
-            quiz = QuizAttempt.objects.filter(
-                eleve=eleve,
-                date_debut__gte=derniere_semaine,
-                statut='termine'
-            ).select_related('quiz')[:3]
-            
-            for attempt in quiz:
-                activites.append({
-                    'type': 'quiz',
-                    'date': attempt.date_debut,
-                    'eleve': eleve,
-                    'titre': f"Quiz réalisé: {attempt.quiz.titre}",
-                    'description': f"{attempt.eleve.user.get_full_name()} a obtenu {attempt.score}%",
-                    'score': attempt.score,
-                })
-        
-        # Trier par date (plus récent d'abord)
-        activites.sort(key=lambda x: x['date'], reverse=True)
-        return activites[:10]
-    
-    def _get_rapport_hebdomadaire_parent(self, parent):
-        """Génère un rapport hebdomadaire pour tous les enfants"""
-        from datetime import timedelta
-        
-        debut_semaine = timezone.now() - timedelta(days=7)
-        rapport = {
-            'periode': f"Du {debut_semaine.strftime('%d/%m/%Y')} au {timezone.now().strftime('%d/%m/%Y')}",
-            'enfants': []
-        }
-        
-        for eleve in parent.eleves.all():
-            # Évaluations de la semaine
-            evaluations_semaine = Evaluation.objects.filter(
-                eleve=eleve,
-                date_creation__gte=debut_semaine
-            ).select_related('cours')
-            
-            # Quiz de la semaine
-            quiz_semaine = QuizAttempt.objects.filter(
-                eleve=eleve,
-                date_debut__gte=debut_semaine,
-                statut='termine'
-            )
-            
-            # Temps d'étude (approximatif)
-            temps_etude = quiz_semaine.aggregate(
-                total_temps=Sum('duree_secondes')
-            )['total_temps'] or 0
-            heures_etude = round(temps_etude / 3600, 1) if temps_etude else 0
-            
-            # Meilleure note de la semaine
-            meilleure_note = evaluations_semaine.aggregate(max_note=Max('note'))['max_note'] if evaluations_semaine.exists() else None
-            
-            # Score moyen des quiz de la semaine
-            quiz_moyen = quiz_semaine.aggregate(avg_score=Avg('score'))['avg_score'] if quiz_semaine.exists() else None
-            
-            rapport['enfants'].append({
-                'eleve': eleve,
-                'evaluations_count': evaluations_semaine.count(),
-                'quiz_count': quiz_semaine.count(),
-                'heures_etude': heures_etude,
-                'meilleure_note': meilleure_note,
-                'quiz_moyen': quiz_moyen,
-            })
-        
-        return rapport
-
 
 # =====================================
 # VUES POUR LE PARENT
@@ -451,68 +234,29 @@ class ParentDashboardView(LoginRequiredMixin, View):
         try:
             parent = Parent.objects.get(user=request.user)
             
-            # Récupérer les données de progression des enfants
-            enfants_data = []
-            for eleve in parent.eleves.all():
-                # Évaluations de l'élève
-                evaluations = Evaluation.objects.filter(eleve=eleve).select_related('cours')
-                
-                # Quiz réalisés
-                quiz_total = QuizAttempt.objects.filter(eleve=eleve, statut='termine')
-                quiz_recent = quiz_total.select_related('quiz').order_by('-date_debut')[:10]
-                
-                # Cours suivis
-                cours_suivis = CoursCoursEleves.objects.filter(eleve=eleve).select_related('cours')
-                
-                # Moyenne générale
-                moyenne = evaluations.aggregate(avg_note=Avg('note'))['avg_note'] if evaluations.exists() else 0
-                
-                enfants_data.append({
-                    'eleve': eleve,
-                    'evaluations': evaluations,
-                    'quiz_attempts': list(quiz_recent),
-                    'cours_suivis': cours_suivis,
-                    'moyenne': round(moyenne, 1) if moyenne else 0,
-                    'total_quiz': quiz_total.count(),
-                    'total_cours': cours_suivis.count(),
-                })
+            rapport = rapport_parent(parent)
+            enfants_data = [
+                dict(data, total_quiz=data['quiz_count'], total_cours=data['cours_count'])
+                for data in rapport['enfants_data']
+            ]
             
             # Statistiques globales
             stats = {
-                'total_enfants': parent.eleves.count(),
-                'total_evaluations': sum(len(data['evaluations']) for data in enfants_data),
-                'total_quiz_realises': sum(data['total_quiz'] for data in enfants_data),
-                'moyenne_generale': round(sum(data['moyenne'] for data in enfants_data) / len(enfants_data), 1) if enfants_data else 0,
-                'evaluations_total': Evaluation.objects.filter(eleve__in=parent.eleves.all()).count(),
-                'quiz_total': QuizAttempt.objects.filter(eleve__in=parent.eleves.all(), statut='termine').count(),
-                'rappels_total': RappelRevision.objects.filter(eleve__in=parent.eleves.all(), envoye=True).count(),
+                'total_enfants': rapport['stats']['total_enfants'],
+                'total_evaluations': rapport['stats']['total_evaluations'],
+                'total_quiz_realises': rapport['stats']['total_quiz'],
+                'moyenne_generale': rapport['stats']['moyenne_generale'],
+                'evaluations_total': rapport['stats']['total_evaluations'],
+                'quiz_total': rapport['stats']['total_quiz'],
+                'rappels_total': rapport['stats']['rappels_total'],
             }
             
-            # Dernières activités
-            toutes_evaluations = []
-            tous_quiz = []
-            
-            for eleve in parent.eleves.all():
-                evaluations = Evaluation.objects.filter(
-                    eleve=eleve
-                ).select_related('cours').order_by('-date_creation')[:5]
-                toutes_evaluations.extend(evaluations)
-                
-                quiz = QuizAttempt.objects.filter(
-                    eleve=eleve,
-                    statut='termine'
-                ).select_related('quiz').order_by('-date_debut')[:5]
-                tous_quiz.extend(quiz)
-            
-            toutes_evaluations.sort(key=lambda x: x.date_creation, reverse=True)
-            tous_quiz.sort(key=lambda x: x.date_debut, reverse=True)
-            
             context = {
                 'parent': parent,
-                'enfants': parent.eleves.all(),
+                'enfants': rapport['enfants'],
                 'enfants_data': enfants_data,
-                'evaluations_recentes': toutes_evaluations[:10],
-                'quiz_recents': tous_quiz[:10],
+                'evaluations_recentes': rapport['evaluations_recentes'],
+                'quiz_recents': rapport['quiz_recents'],
                 'stats': stats,
             }
             
@@ -882,7 +626,10 @@ class LierEnfantView(LoginRequiredMixin, SuccessMessageMixin, View):
         return render(request, self.template_name, {'form': form})
 
 
+# Réponse constante pour un niveau donné : gardée une heure par le navigateur
 @method_decorator(require_GET, name='dispatch')
+@method_decorator(cache_control(private=True, max_age=3600), name='dispatch')
+@method_decorator(vary_on_cookie, name='dispatch')
 class ChargerClassesView(View):
     def get(self, request):
         niveau = request.GET.get('niveau')